@@ -5,10 +5,42 @@ import os
 import json
 from datetime import datetime
 
+from analysis.batch import analyze_batch
+from analysis.blobs import SPOT_MIN_AREA, LESION_MIN_AREA, LESION_CLOSE_SIZE, scaled_min_area, scaled_close_size
+from analysis.context import as_feature_context
+from analysis.image_io import decode_image
+from analysis.lbp import lbp_codes, lbp_histogram
+from analysis.live_gate import FrameQualityGate, DEFAULT_PRE_GATE
+from analysis.profiling import NULL_TIMINGS, start_timings
+from analysis.pyramid import DEFAULT_ANALYSIS_RESOLUTIONS, AnalysisPyramid
+from analysis.registry import DEFAULT_REGISTRY, ANALYSIS_STAGES, COCONUT_ANALYSIS_FEATURES, as_pyramid
+from analysis.sharpness import laplacian_variance, scaled_sharpness_threshold
+from analysis.tflite_model import TFLiteModel
+from analysis.tiled import analyze_tiled, open_tile_source
+from database.analysis_cache import AnalysisCache, hash_file, hash_image_bytes
+from database.analysis_log import AnalysisLog
+
+# Bump when analysis behaviour changes so cached results are not reused
+ANALYZER_VERSION = "2.6"
+
+# A near-duplicate scan's saved analysis is reused only within this many
+# dHash bits, and only if the leaf colour ratios agree this closely; the
+# grayscale hash cannot tell a green leaf from a brown one in the same pose
+REUSE_MAX_DISTANCE = 2
+REUSE_MAX_COLOR_DIFFERENCE = 0.05
+REUSE_COLOR_KEYS = ('healthy_green_ratio', 'yellowing_ratio', 'browning_ratio', 'necrosis_ratio')
+
 class LeafAnalyzer:
     """AI-powered coconut leaf disease detection and analysis"""
     
-    def __init__(self):
+    def __init__(self, analysis_resolutions=None, model_path="model/model.tflite", num_threads=None, cache=None,
+                 pre_gate=None, segment_leaf=True, analysis_log=None):
+        # Resolution each classical extractor runs at (see analysis/pyramid.py)
+        self.analysis_resolutions = {name: dict(spec) for name, spec in DEFAULT_ANALYSIS_RESOLUTIONS.items()}
+        if analysis_resolutions:
+            for name, spec in analysis_resolutions.items():
+                self.analysis_resolutions.setdefault(name, {}).update(spec)
+        
         # Focus on coconut-specific diseases
         self.coconut_diseases = {
             0: "Healthy Coconut",
@@ -43,84 +75,310 @@ class LeafAnalyzer:
             'nutrient_deficiency': ['Soil testing', 'Fertilizer application', 'pH adjustment']
         }
         
-        # Load pre-trained model (simulated for now)
+        # Load pre-trained model once; the interpreter is reused for every scan
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.model = None
         self.model_loaded = False
+        self.model_fingerprint = 'simulated'
         self.load_model()
+        
+        # Extractors and the intermediates they share, callers request features by name
+        self.feature_registry = DEFAULT_REGISTRY
+        
+        # Crop extractors to the segmented leaf and count ratios over leaf pixels
+        self.segment_leaf = segment_leaf
+        
+        # Optional thumbnail pre-gate: True for DEFAULT_PRE_GATE or a dict of overrides
+        self.pre_gate_config = None
+        self.pre_gate = None
+        if pre_gate:
+            self.pre_gate_config = dict(DEFAULT_PRE_GATE)
+            if isinstance(pre_gate, dict):
+                self.pre_gate_config.update(pre_gate)
+            self.pre_gate = FrameQualityGate(**self.pre_gate_config)
+        
+        # Saved analyses go to an append-only log (analysis_results/log by default)
+        self.analysis_log = analysis_log
+        
+        # Optional persistent result cache; results of any other model are dropped
+        self.cache = cache
+        if self.cache is not None:
+            self.cache.invalidate_model(self.model_fingerprint)
     
     def load_model(self):
         """Load the AI model"""
         try:
             # Check if model file exists
-            model_path = "model/model.tflite"
-            if os.path.exists(model_path):
+            model_path = self.model_path
+            if os.path.exists(model_path) and os.path.getsize(model_path) > 0:
+                self.model = TFLiteModel(model_path, num_threads=self.num_threads)
                 self.model_loaded = True
+                self.model_fingerprint = hash_file(model_path)
                 print("✅ Coconut AI Model loaded successfully")
             else:
-                print("⚠️ Model file not found, using simulated coconut AI")
+                print("⚠️ Model file not found or empty, using simulated coconut AI")
+                self.model = None
                 self.model_loaded = False
         except Exception as e:
             print(f"❌ Error loading model: {e}")
+            self.model = None
             self.model_loaded = False
     
-    def preprocess_image(self, image_path):
+    def get_model_input_size(self):
+        """(width, height) fed to the model"""
+        if self.model is not None:
+            return self.model.input_size
+        return (224, 224)
+    
+    def get_decode_max_side(self):
+        """Longest image side any extractor or the model needs (None for full resolution)
+        
+        Extractors marked 'decode': False (quality) take whatever resolution
+        the others need and do not hold the decode at full size.
+        """
+        sides = [spec.get('max_side') for spec in self.analysis_resolutions.values() if spec.get('decode', True)]
+        if any(side is None for side in sides):
+            return None
+        return max(sides + list(self.get_model_input_size()))
+    
+    def decode_image(self, image_path, image_bytes=None):
+        """Load a BGR image, reusing the file bytes if they were already read
+        
+        Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still covers
+        get_decode_max_side(). Returns (img, decode_info).
+        """
+        return decode_image(image_path, image_bytes, target_side=self.get_decode_max_side())
+    
+    def preprocess_image(self, image_path, image_bytes=None):
         """Preprocess image for coconut AI analysis"""
         try:
-            # Load and resize image
-            img = cv2.imread(image_path)
+            img, _ = self.decode_image(image_path, image_bytes)
             if img is None:
                 raise ValueError("Could not load image")
             
-            # Resize to standard size
-            img_resized = cv2.resize(img, (224, 224))
-            
-            # Convert to RGB
-            img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
-            
-            # Normalize pixel values
-            img_normalized = img_rgb.astype(np.float32) / 255.0
-            
-            # Add batch dimension
-            img_batch = np.expand_dims(img_normalized, axis=0)
-            
-            return img_batch, img
+            return self.prepare_model_input(img), img
             
         except Exception as e:
             print(f"Error preprocessing image: {e}")
             return None, None
     
-    def analyze_leaf(self, image_path):
-        """Analyze coconut leaf image for disease detection"""
+    def prepare_model_input(self, img):
+        """Resize, convert and normalize a BGR image into a model input batch"""
+        # Resize to the model input size
+        img_resized = cv2.resize(img, self.get_model_input_size())
+        
+        # Convert to RGB
+        img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
+        
+        # Normalize pixel values
+        img_normalized = img_rgb.astype(np.float32) / 255.0
+        
+        # Add batch dimension
+        return np.expand_dims(img_normalized, axis=0)
+    
+    def analyze_leaf(self, image_path, raise_errors=False, on_progress=None, on_decoded=None):
+        """Analyze coconut leaf image for disease detection
+        
+        Per-stage wall/CPU times are attached under 'timings' unless profiling
+        is switched off (analysis.profiling.set_profiling). on_progress is
+        passed on to analyze_array; cached results are returned without it.
+        on_decoded(img) receives the decoded pixels, e.g. for hashing, and is
+        not called on a cache hit.
+        """
         try:
-            # Preprocess image
-            processed_img, original_img = self.preprocess_image(image_path)
-            if processed_img is None:
-                return self.get_coconut_simulated_analysis()
-            
-            # Perform AI analysis
-            if self.model_loaded:
-                results = self.run_ai_model(processed_img)
-            else:
-                results = self.get_coconut_simulated_analysis()
+            timings = start_timings()
+            with timings.stage('total'):
+                # Reuse a cached result for identical image bytes before decoding pixels
+                analysis = image_bytes = cache_key = image_hash = None
+                if self.cache is not None:
+                    with timings.stage('cache_lookup'):
+                        analysis, cache_key, image_hash, image_bytes = self.lookup_cached_analysis(image_path)
+                
+                if analysis is None:
+                    # Decode image
+                    with timings.stage('decode'):
+                        original_img, decode_info = self.decode_image(image_path, image_bytes)
+                    if original_img is None:
+                        if raise_errors:
+                            raise ValueError(f"Could not load image: {image_path}")
+                        return self.get_coconut_simulated_analysis()
+                    if on_decoded is not None:
+                        on_decoded(original_img)
+                    
+                    analysis = self.analyze_array(original_img, source=image_path, raise_errors=raise_errors,
+                                                  timings=timings, on_progress=on_progress,
+                                                  source_scale=decode_info['scale'])
+                    analysis['decode'] = decode_info
+                    
+                    if cache_key is not None:
+                        # Timings describe this run only, they are not cached
+                        stored = {key: value for key, value in analysis.items() if key != 'timings'}
+                        self.cache.put(cache_key, image_hash, self.model_fingerprint, stored)
             
-            # Add coconut-specific image analysis features
-            analysis = self.enhance_coconut_analysis(results, original_img, image_path)
+            if timings.enabled:
+                analysis['timings'] = timings.to_dict()
+            return analysis
             
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error in coconut leaf analysis: {e}")
+            return self.get_coconut_simulated_analysis()
+    
+    def analyze_array(self, img, source=None, raise_errors=False, timings=None, on_progress=None, source_scale=1.0):
+        """Analyze a decoded BGR image already in memory, e.g. a camera frame
+        
+        source only labels where the pixels came from (a file path or "camera");
+        source_scale is the factor img was reduced by when it was decoded.
+        Stages are recorded into timings when analyze_leaf passes its recorder;
+        otherwise this call starts and attaches its own. on_progress(stage,
+        partial_analysis) is called as each stage of iter_analysis completes.
+        """
+        try:
+            owns_timings = timings is None
+            if owns_timings:
+                timings = start_timings()
+            
+            if img is None or img.ndim != 3 or img.shape[2] != 3:
+                raise ValueError(f"Expected a BGR image from {source or 'memory'}")
+            
+            # Unusable or leafless photos stop here, before the model runs
+            gate_result = None
+            if self.pre_gate is not None:
+                with timings.stage('pre_gate'):
+                    gate_result = self.pre_gate.check(img, source_scale)
+                if not gate_result['ready']:
+                    return self.get_retake_analysis(gate_result)
+            
+            # AI diagnosis and coconut-specific features, reported stage by stage
+            pyramid = AnalysisPyramid(img, source_scale=source_scale)
+            analysis = {}
+            try:
+                for stage, analysis in self.iter_analysis(pyramid, timings=timings):
+                    if on_progress is not None:
+                        self.report_progress(on_progress, stage, analysis)
+            except Exception as e:
+                print(f"Error enhancing coconut analysis: {e}")
+                if 'disease_name' not in analysis:
+                    analysis = self.compute_features(['model_results'], pyramid)['model_results']
+            
+            if gate_result is not None:
+                analysis['pre_gate'] = gate_result
+            if owns_timings and timings.enabled:
+                analysis['timings'] = timings.to_dict()
             return analysis
             
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error in coconut leaf analysis: {e}")
             return self.get_coconut_simulated_analysis()
     
+    def analyze_batch(self, paths, workers=None, chunksize=1, compact=False):
+        """Analyze many leaf images in parallel, yielding results as they complete
+        
+        Each item is a BatchResult(path, result, error); error is None on success.
+        With compact=True results are LeafResult objects (analysis/results.py),
+        which travel between processes and sit in memory in a packed layout.
+        """
+        return analyze_batch(paths, workers=workers, chunksize=chunksize,
+                             analyzer_kwargs=self.get_config(), compact=compact)
+    
+    def analyze_large_image(self, image_path, tile_size=1024, overlap=64, workers=None):
+        """Tiled colour, texture and pattern analysis for orthomosaics too big to load at once
+        
+        .npy (memory-mapped) and GeoTIFF (with rasterio) inputs are read one
+        window at a time; other formats are decoded once and then tiled.
+        """
+        source = open_tile_source(image_path)
+        try:
+            results = analyze_tiled(self, source, tile_size=tile_size, overlap=overlap, workers=workers)
+            results['image_path'] = image_path
+            results['timestamp'] = datetime.now().isoformat()
+            return results
+        finally:
+            source.close()
+    
+    def get_analyzer_fingerprint(self):
+        """Version, configuration and model identity that analysis results depend on"""
+        return json.dumps({
+            'version': ANALYZER_VERSION,
+            'model': self.model_fingerprint,
+            'model_input_size': list(self.get_model_input_size()),
+            'analysis_resolutions': self.analysis_resolutions,
+            'pre_gate': self.pre_gate_config,
+            'segment_leaf': self.segment_leaf
+        }, sort_keys=True)
+    
+    def lookup_cached_analysis(self, image_path):
+        """Return (cached_result, cache_key, image_hash, image_bytes) for an image file"""
+        try:
+            with open(image_path, 'rb') as f:
+                image_bytes = f.read()
+        except Exception as e:
+            print(f"Error reading image for cache lookup: {e}")
+            return None, None, None, None
+        
+        image_hash = hash_image_bytes(image_bytes)
+        cache_key = AnalysisCache.make_key(image_hash, self.get_analyzer_fingerprint())
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            cached['cache_hit'] = True
+        return cached, cache_key, image_hash, image_bytes
+    
+    def get_config(self):
+        """Constructor arguments that reproduce this analyzer, e.g. in worker processes"""
+        return {
+            'analysis_resolutions': self.analysis_resolutions,
+            'model_path': self.model_path,
+            'num_threads': self.num_threads,
+            'cache': self.cache,
+            'pre_gate': self.pre_gate_config,
+            'segment_leaf': self.segment_leaf
+        }
+    
     def run_ai_model(self, processed_img):
-        """Run the actual AI model (placeholder for TensorFlow Lite)"""
+        """Run the TensorFlow Lite model on a preprocessed image"""
         try:
-            # This would be replaced with actual TensorFlow Lite inference
-            # For now, return simulated coconut results
-            return self.get_coconut_simulated_analysis()
+            probabilities = self.model.predict(processed_img)[0]
+            return self.get_coconut_model_analysis(probabilities)
         except Exception as e:
             print(f"AI model inference error: {e}")
             return self.get_coconut_simulated_analysis()
     
+    def run_ai_model_batch(self, processed_imgs):
+        """Run the TensorFlow Lite model on a stack of preprocessed images"""
+        try:
+            batch = np.concatenate(processed_imgs) if isinstance(processed_imgs, (list, tuple)) else processed_imgs
+            return [self.get_coconut_model_analysis(p) for p in self.model.predict(batch)]
+        except Exception as e:
+            print(f"AI model batch inference error: {e}")
+            return [self.get_coconut_simulated_analysis() for _ in range(len(processed_imgs))]
+    
+    def get_coconut_model_analysis(self, probabilities):
+        """Map model class probabilities onto the coconut disease results"""
+        disease_class = int(np.argmax(probabilities))
+        disease_name = self.coconut_diseases.get(disease_class, f"Unknown Class {disease_class}")
+        disease_confidence = float(probabilities[disease_class])
+        
+        return {
+            'disease_class': disease_class,
+            'disease_name': disease_name,
+            'disease_confidence': disease_confidence,
+            'disease_probabilities': {
+                self.coconut_diseases.get(i, f"Unknown Class {i}"): float(p)
+                for i, p in enumerate(probabilities)
+            },
+            'leaf_type': 'Coconut',
+            'leaf_name': 'Coconut (Cocos nucifera)',
+            'leaf_confidence': 0.95,
+            'overall_confidence': disease_confidence,
+            'symptoms': self.get_coconut_symptoms(disease_name),
+            'analysis_timestamp': datetime.now().isoformat(),
+            'model_used': 'coconut_tflite'
+        }
+    
     def get_coconut_simulated_analysis(self):
         """Generate realistic simulated coconut analysis results"""
         import random
@@ -128,7 +386,7 @@ class LeafAnalyzer:
         # Simulate different coconut disease probabilities
         # Bias towards healthy coconut with some common issues
         disease_probs = np.random.dirichlet([4, 1, 1, 0.5, 0.5, 0.8, 0.8, 1.2])  # Healthy bias
-        disease_class = np.argmax(disease_probs)
+        disease_class = int(np.argmax(disease_probs))
         
         # Generate confidence scores
         confidence = random.uniform(0.75, 0.98)
@@ -150,6 +408,24 @@ class LeafAnalyzer:
             'model_used': 'coconut_specialized' if not self.model_loaded else 'coconut_tflite'
         }
     
+    def get_retake_analysis(self, gate_result):
+        """Short result for photos rejected by the pre-gate"""
+        return {
+            'disease_class': None,
+            'disease_name': 'Retake Photo',
+            'disease_confidence': 0.0,
+            'leaf_type': 'Unknown',
+            'leaf_name': 'Unknown',
+            'leaf_confidence': float(gate_result['leaf_coverage']),
+            'overall_confidence': 0.0,
+            'symptoms': [],
+            'analysis_timestamp': datetime.now().isoformat(),
+            'model_used': 'pre_gate',
+            'pre_gate': gate_result,
+            'recommendations': [f"📸 Retake photo: {', '.join(gate_result['problems'])}"],
+            'coconut_specific': True
+        }
+    
     def get_coconut_symptoms(self, disease_name):
         """Get symptoms for specific coconut disease"""
         if 'Lethal Yellowing' in disease_name:
@@ -169,34 +445,18 @@ class LeafAnalyzer:
         else:
             return ['No specific symptoms detected']
     
-    def enhance_coconut_analysis(self, results, original_img, image_path):
+    def enhance_coconut_analysis(self, results, original_img, image_path, timings=NULL_TIMINGS):
         """Enhance analysis with coconut-specific image processing features"""
         try:
-            # Add coconut-specific image quality metrics
-            quality_metrics = self.analyze_coconut_image_quality(original_img)
-            
-            # Add coconut-specific color analysis
-            color_analysis = self.analyze_coconut_colors(original_img)
-            
-            # Add coconut-specific texture analysis
-            texture_analysis = self.analyze_coconut_texture(original_img)
-            
-            # Add coconut-specific disease patterns
-            disease_patterns = self.detect_coconut_disease_patterns(original_img)
-            
-            # Generate coconut-specific recommendations
-            recommendations = self.generate_coconut_recommendations(results, quality_metrics, disease_patterns)
+            # The registry builds the pyramid levels, leaf ROI and shared
+            # gray/HSV/mask planes once for all extractors (see analysis/registry.py)
+            features = self.compute_features(COCONUT_ANALYSIS_FEATURES, original_img,
+                                             provided={'model_results': results}, timings=timings)
             
             # Combine all analyses
             enhanced_results = results.copy()
-            enhanced_results.update({
-                'image_quality': quality_metrics,
-                'color_analysis': color_analysis,
-                'texture_analysis': texture_analysis,
-                'disease_patterns': disease_patterns,
-                'recommendations': recommendations,
-                'coconut_specific': True
-            })
+            enhanced_results.update(features)
+            enhanced_results['coconut_specific'] = True
             
             return enhanced_results
             
@@ -204,12 +464,57 @@ class LeafAnalyzer:
             print(f"Error enhancing coconut analysis: {e}")
             return results
     
+    def iter_analysis(self, img, workers=None, timings=NULL_TIMINGS):
+        """Yield (stage, partial analysis) as each stage of ANALYSIS_STAGES completes
+        
+        The partial analysis grows stage by stage: image quality first, the
+        model diagnosis next, the slower colour, texture and pattern
+        extractors after it. The last one is the complete analysis.
+        """
+        analysis = {}
+        stages = self.feature_registry.iter_stages(ANALYSIS_STAGES, self, provided={'pyramid': as_pyramid(img)},
+                                                   workers=workers, timings=timings)
+        for stage, features in stages:
+            if stage == 'model':
+                diagnosis = dict(features['model_results'])
+                diagnosis.update(analysis)
+                analysis = diagnosis
+            else:
+                analysis.update(features)
+            if stage == ANALYSIS_STAGES[-1][0]:
+                analysis['coconut_specific'] = True
+            yield stage, analysis
+    
+    def report_progress(self, on_progress, stage, analysis):
+        """Hand a copy of the partial analysis to a progress callback; its errors never stop the analysis"""
+        try:
+            on_progress(stage, dict(analysis))
+        except Exception as e:
+            print(f"Error reporting analysis progress: {e}")
+    
+    def compute_features(self, names, img, provided=None, workers=None, timings=NULL_TIMINGS):
+        """Compute only the named features of an image or AnalysisPyramid
+        
+        Shared intermediates are computed once; independent extractors run
+        concurrently when workers > 1. Returns {name: value}.
+        """
+        values = dict(provided or {})
+        values['pyramid'] = as_pyramid(img)
+        return self.feature_registry.compute(names, self, provided=values, workers=workers, timings=timings)
+    
     def analyze_coconut_image_quality(self, img):
-        """Analyze image quality specifically for coconut leaves"""
+        """Analyze image quality specifically for coconut leaves
+        
+        Sharpness thresholds were tuned on capture-resolution photos and are
+        scaled to the resolution of the context (analysis/sharpness.py).
+        """
         try:
+            ctx = as_feature_context(img)
+            
             # Calculate sharpness (Laplacian variance)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            gray = ctx.gray
+            laplacian_var = laplacian_variance(gray)
+            excellent, good, fair = (scaled_sharpness_threshold(threshold, ctx.scale) for threshold in (100, 50, 20))
             
             # Calculate brightness
             brightness = np.mean(gray)
@@ -218,17 +523,18 @@ class LeafAnalyzer:
             contrast = np.std(gray)
             
             # Coconut-specific quality assessment
-            if laplacian_var > 100 and 50 < brightness < 200 and contrast > 30:
+            if laplacian_var > excellent and 50 < brightness < 200 and contrast > 30:
                 quality_level = "Excellent for Coconut Analysis"
-            elif laplacian_var > 50 and 30 < brightness < 220 and contrast > 20:
+            elif laplacian_var > good and 30 < brightness < 220 and contrast > 20:
                 quality_level = "Good for Coconut Analysis"
-            elif laplacian_var > 20 and 20 < brightness < 230 and contrast > 10:
+            elif laplacian_var > fair and 20 < brightness < 230 and contrast > 10:
                 quality_level = "Fair for Coconut Analysis"
             else:
                 quality_level = "Poor - Retake Photo"
             
             return {
                 'sharpness': float(laplacian_var),
+                'sharpness_scale': float(ctx.scale),
                 'brightness': float(brightness),
                 'contrast': float(contrast),
                 'quality_level': quality_level,
@@ -242,39 +548,17 @@ class LeafAnalyzer:
     def analyze_coconut_colors(self, img):
         """Analyze coconut leaf colors for disease indicators"""
         try:
-            # Convert to HSV for better color analysis
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            
-            # Calculate color histograms
-            h, s, v = cv2.split(hsv)
+            # HSV conversion and masks are shared through the feature context
+            ctx = as_feature_context(img)
             
             # Coconut-specific color ranges
-            healthy_green = cv2.inRange(hsv, np.array([35, 40, 40]), np.array([85, 255, 255]))
-            yellowing = cv2.inRange(hsv, np.array([15, 40, 40]), np.array([35, 255, 255]))
-            browning = cv2.inRange(hsv, np.array([0, 40, 20]), np.array([20, 255, 200]))
-            necrosis = cv2.inRange(hsv, np.array([0, 0, 0]), np.array([180, 255, 50]))
-            
-            healthy_ratio = np.sum(healthy_green > 0) / (img.shape[0] * img.shape[1])
-            yellowing_ratio = np.sum(yellowing > 0) / (img.shape[0] * img.shape[1])
-            browning_ratio = np.sum(browning > 0) / (img.shape[0] * img.shape[1])
-            necrosis_ratio = np.sum(necrosis > 0) / (img.shape[0] * img.shape[1])
-            
-            # Coconut-specific color health assessment
-            if healthy_ratio > 0.7:
-                color_health = "Healthy Coconut Green"
-                severity = "None"
-            elif yellowing_ratio > 0.3:
-                color_health = "Coconut Yellowing - Monitor Closely"
-                severity = "Mild"
-            elif browning_ratio > 0.2:
-                color_health = "Coconut Browning - Action Required"
-                severity = "Moderate"
-            elif necrosis_ratio > 0.1:
-                color_health = "Coconut Necrosis - Immediate Attention"
-                severity = "Severe"
-            else:
-                color_health = "Mixed Coconut Colors - Further Analysis Needed"
-                severity = "Unknown"
+            healthy_ratio = ctx.ratio('healthy_green')
+            yellowing_ratio = ctx.ratio('yellowing')
+            browning_ratio = ctx.ratio('browning')
+            necrosis_ratio = ctx.ratio('necrosis')
+            
+            color_health, severity = self.classify_coconut_colors(
+                healthy_ratio, yellowing_ratio, browning_ratio, necrosis_ratio)
             
             return {
                 'healthy_green_ratio': float(healthy_ratio),
@@ -290,29 +574,72 @@ class LeafAnalyzer:
             print(f"Error analyzing coconut colors: {e}")
             return {'color_health': 'Unknown', 'coconut_specific': True}
     
+    def classify_coconut_colors(self, healthy_ratio, yellowing_ratio, browning_ratio, necrosis_ratio):
+        """Coconut-specific color health assessment, returns (color_health, severity)"""
+        if healthy_ratio > 0.7:
+            return "Healthy Coconut Green", "None"
+        elif yellowing_ratio > 0.3:
+            return "Coconut Yellowing - Monitor Closely", "Mild"
+        elif browning_ratio > 0.2:
+            return "Coconut Browning - Action Required", "Moderate"
+        elif necrosis_ratio > 0.1:
+            return "Coconut Necrosis - Immediate Attention", "Severe"
+        return "Mixed Coconut Colors - Further Analysis Needed", "Unknown"
+    
+    def analyze_region_health(self, img, rows=3, cols=3):
+        """Per grid cell colour ratios and health, from the shared mask integrals"""
+        try:
+            ctx = as_feature_context(img)
+            names = ('healthy_green', 'yellowing', 'browning', 'necrosis')
+            grids = [ctx.grid_ratios(name, rows, cols) for name in names]
+            
+            grid = []
+            for row in range(rows):
+                cells = []
+                for col in range(cols):
+                    ratios = [grid_ratios[row, col] for grid_ratios in grids]
+                    if np.isnan(ratios[0]):
+                        # No leaf pixels in this cell
+                        cells.append(None)
+                        continue
+                    color_health, severity = self.classify_coconut_colors(*ratios)
+                    cell = {f'{name}_ratio': float(ratio) for name, ratio in zip(names, ratios)}
+                    cell.update({'color_health': color_health, 'severity': severity})
+                    cells.append(cell)
+                grid.append(cells)
+            
+            return {'rows': rows, 'cols': cols, 'grid': grid}
+        except Exception as e:
+            print(f"Error analyzing region health: {e}")
+            return {'rows': rows, 'cols': cols, 'grid': []}
+    
+    def analyze_color_classes(self, img):
+        """Coverage ratio of every named coconut colour class from a single pass"""
+        try:
+            ctx = as_feature_context(img)
+            return {name: float(ratio) for name, ratio in ctx.ratios().items()}
+        except Exception as e:
+            print(f"Error analyzing coconut color classes: {e}")
+            return {}
+    
     def analyze_coconut_texture(self, img):
         """Analyze coconut leaf texture patterns"""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            ctx = as_feature_context(img)
+            gray = ctx.gray
             
             # Calculate texture features specific to coconut leaves
-            edges = cv2.Canny(gray, 50, 150)
-            edge_density = np.sum(edges > 0) / (img.shape[0] * img.shape[1])
+            edge_density = cv2.countNonZero(ctx.edges) / ctx.pixel_count
             
             # Local binary pattern (simplified)
             lbp = self.simple_lbp(gray)
+            if ctx.roi is not None and lbp.shape == (ctx.roi.shape[0] - 2, ctx.roi.shape[1] - 2):
+                # Leaf pixels only; codes drop a one-pixel border
+                leaf_codes = lbp[ctx.roi[1:-1, 1:-1] > 0]
+                lbp = leaf_codes if leaf_codes.size else lbp
             texture_variance = np.var(lbp)
             
-            # Coconut-specific texture patterns
-            if edge_density > 0.1 and texture_variance > 100:
-                texture_pattern = "Normal Coconut Leaf Texture"
-            elif edge_density < 0.05:
-                texture_pattern = "Smooth - Possible Disease"
-            elif texture_variance > 200:
-                texture_pattern = "Rough - Check for Damage"
-            else:
-                texture_pattern = "Standard Coconut Texture"
+            texture_pattern = self.classify_coconut_texture(edge_density, texture_variance)
             
             return {
                 'edge_density': float(edge_density),
@@ -325,16 +652,26 @@ class LeafAnalyzer:
             print(f"Error analyzing coconut texture: {e}")
             return {'texture_pattern': 'Unknown', 'coconut_specific': True}
     
+    def classify_coconut_texture(self, edge_density, texture_variance):
+        """Coconut-specific texture pattern name"""
+        if edge_density > 0.1 and texture_variance > 100:
+            return "Normal Coconut Leaf Texture"
+        elif edge_density < 0.05:
+            return "Smooth - Possible Disease"
+        elif texture_variance > 200:
+            return "Rough - Check for Damage"
+        return "Standard Coconut Texture"
+    
     def detect_coconut_disease_patterns(self, img):
         """Detect coconut-specific disease patterns"""
         try:
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            ctx = as_feature_context(img)
             
             # Detect specific coconut disease patterns
-            yellowing_spots = self.detect_coconut_yellowing(hsv)
-            root_wilt_signs = self.detect_root_wilt_patterns(hsv)
-            bud_rot_indicators = self.detect_bud_rot_signs(hsv)
-            leaf_spot_detection = self.detect_leaf_spots(hsv)
+            yellowing_spots = self.detect_coconut_yellowing(ctx)
+            root_wilt_signs = self.detect_root_wilt_patterns(ctx)
+            bud_rot_indicators = self.detect_bud_rot_signs(ctx)
+            leaf_spot_detection = self.detect_leaf_spots(ctx)
             
             # Combine pattern analysis
             patterns = {
@@ -355,8 +692,8 @@ class LeafAnalyzer:
         """Detect lethal yellowing patterns in coconut"""
         try:
             # Yellow color range for coconut yellowing
-            yellow_mask = cv2.inRange(hsv_img, np.array([20, 30, 100]), np.array([30, 255, 255]))
-            yellow_ratio = np.sum(yellow_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            yellow_ratio = ctx.ratio('lethal_yellowing')
             
             return {
                 'detected': yellow_ratio > 0.15,
@@ -370,8 +707,8 @@ class LeafAnalyzer:
         """Detect root wilt disease patterns"""
         try:
             # Wilting patterns (darker, less saturated areas)
-            wilt_mask = cv2.inRange(hsv_img, np.array([0, 0, 50]), np.array([180, 100, 150]))
-            wilt_ratio = np.sum(wilt_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            wilt_ratio = ctx.ratio('root_wilt')
             
             return {
                 'detected': wilt_ratio > 0.2,
@@ -385,8 +722,8 @@ class LeafAnalyzer:
         """Detect bud rot disease signs"""
         try:
             # Rot patterns (dark, brown areas)
-            rot_mask = cv2.inRange(hsv_img, np.array([0, 50, 20]), np.array([20, 255, 100]))
-            rot_ratio = np.sum(rot_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            rot_ratio = ctx.ratio('bud_rot')
             
             return {
                 'detected': rot_ratio > 0.1,
@@ -400,8 +737,8 @@ class LeafAnalyzer:
         """Detect leaf spot disease"""
         try:
             # Spot patterns (circular dark areas)
-            spot_mask = cv2.inRange(hsv_img, np.array([0, 0, 0]), np.array([180, 255, 80]))
-            spot_ratio = np.sum(spot_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            spot_ratio = ctx.ratio('leaf_spot')
             
             return {
                 'detected': spot_ratio > 0.05,
@@ -411,35 +748,23 @@ class LeafAnalyzer:
         except Exception as e:
             return {'detected': False, 'confidence': 0.0, 'severity': 'Unknown'}
     
-    def simple_lbp(self, gray_img):
+    def simple_lbp(self, gray_img, radius=1, method='default'):
         """Simple Local Binary Pattern calculation for coconut texture analysis"""
         try:
-            # Simplified LBP for coconut leaf texture analysis
-            height, width = gray_img.shape
-            lbp = np.zeros((height-2, width-2), dtype=np.uint8)
-            
-            for i in range(1, height-1):
-                for j in range(1, width-1):
-                    center = gray_img[i, j]
-                    code = 0
-                    # Check 8 neighbors
-                    neighbors = [
-                        gray_img[i-1, j-1], gray_img[i-1, j], gray_img[i-1, j+1],
-                        gray_img[i, j+1], gray_img[i+1, j+1], gray_img[i+1, j],
-                        gray_img[i+1, j-1], gray_img[i, j-1]
-                    ]
-                    
-                    for k, neighbor in enumerate(neighbors):
-                        if neighbor >= center:
-                            code |= (1 << k)
-                    
-                    lbp[i-1, j-1] = code
-            
-            return lbp
+            # Vectorized LBP - identical codes to the old per-pixel loop for radius 1
+            return lbp_codes(gray_img, radius=radius, method=method)
         except Exception as e:
             print(f"Error in LBP calculation: {e}")
             return np.zeros((10, 10))
     
+    def lbp_texture_histogram(self, gray_img, radii=(1, 2, 3), method='riu2'):
+        """Multi-radius LBP histogram describing coconut leaf texture"""
+        try:
+            return lbp_histogram(gray_img, radii=radii, method=method)
+        except Exception as e:
+            print(f"Error in LBP histogram: {e}")
+            return np.zeros(0)
+    
     def generate_coconut_recommendations(self, results, quality_metrics, disease_patterns):
         """Generate coconut-specific recommendations"""
         recommendations = []
@@ -499,54 +824,99 @@ class LeafAnalyzer:
         
         return recommendations
     
-    def save_analysis(self, analysis_results, image_path):
-        """Save analysis results to JSON file"""
+    def save_analysis(self, analysis_results, image_path, scan_id=None):
+        """Append analysis results to the compressed analysis log
+        
+        Returns the log record_id, or None if saving failed.
+        """
         try:
-            # Create analysis directory
-            analysis_dir = "analysis_results"
-            if not os.path.exists(analysis_dir):
-                os.makedirs(analysis_dir)
+            if self.analysis_log is None:
+                self.analysis_log = AnalysisLog()
+            record_id = self.analysis_log.append(analysis_results, image_path=image_path, scan_id=scan_id)
             
-            # Generate filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            analysis_file = f"{base_name}_analysis_{timestamp}.json"
-            analysis_path = os.path.join(analysis_dir, analysis_file)
+            print(f"✅ Analysis saved to log record {record_id}")
+            return record_id
             
-            # Save results
-            with open(analysis_path, 'w') as f:
-                json.dump(analysis_results, f, indent=2)
+        except Exception as e:
+            print(f"Error saving analysis: {e}")
+            return None
+    
+    def load_analysis(self, scan_id):
+        """Latest analysis saved for a scan, or None if there is none"""
+        try:
+            if self.analysis_log is None:
+                self.analysis_log = AnalysisLog()
+            return self.analysis_log.get_by_scan(scan_id)
             
-            print(f"✅ Analysis saved to: {analysis_path}")
-            return analysis_path
+        except Exception as e:
+            print(f"Error loading analysis: {e}")
+            return None
+
+    def reuse_duplicate_analysis(self, duplicate, img, source_scale=1.0):
+        """Saved analysis of a near-duplicate scan, checked against this image, or None
+        
+        duplicate is a (scan_id, image_path, hamming_distance) match. The saved
+        analysis is reused only within REUSE_MAX_DISTANCE and when the leaf
+        colours of img agree with it. This image's own pre-gate and quality
+        check always replace the saved ones.
+        """
+        try:
+            scan_id, _, distance = duplicate
+            if distance > REUSE_MAX_DISTANCE:
+                return None
+            saved = self.load_analysis(scan_id)
+            if saved is None or 'color_analysis' not in saved:
+                return None
+            
+            gate_result = None
+            if self.pre_gate is not None:
+                gate_result = self.pre_gate.check(img, source_scale)
+                if not gate_result['ready']:
+                    return self.get_retake_analysis(gate_result)
+            
+            features = self.compute_features(['image_quality', 'color_analysis'],
+                                             AnalysisPyramid(img, source_scale=source_scale))
+            for key in REUSE_COLOR_KEYS:
+                difference = abs(features['color_analysis'].get(key, 0.0) - saved['color_analysis'].get(key, 0.0))
+                if difference > REUSE_MAX_COLOR_DIFFERENCE:
+                    return None
+            
+            analysis = {key: value for key, value in saved.items() if key not in ('timings', 'cache_hit')}
+            analysis['image_quality'] = features['image_quality']
+            analysis['recommendations'] = self.generate_coconut_recommendations(
+                analysis, features['image_quality'], analysis.get('disease_patterns', {}))
+            if gate_result is not None:
+                analysis['pre_gate'] = gate_result
+            return analysis
             
         except Exception as e:
-            print(f"Error saving analysis: {e}")
+            print(f"Error reusing duplicate analysis: {e}")
             return None
 
     def detect_disease_patterns(self, img):
         """Detect specific disease patterns in leaf images"""
         try:
-            # Convert to HSV for better pattern detection
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            # HSV and gray planes are shared through the feature context
+            ctx = as_feature_context(img)
             
             # Detect spots (common disease symptom)
-            spots = self.detect_spots(hsv)
+            spots = self.detect_spots(ctx)
             
             # Detect lesions
-            lesions = self.detect_lesions(hsv)
+            lesions = self.detect_lesions(ctx)
             
             # Detect wilting patterns
-            wilting = self.detect_wilting(img)
+            wilting = self.detect_wilting(ctx)
             
             # Detect fungal growth
-            fungal = self.detect_fungal_growth(hsv)
+            fungal = self.detect_fungal_growth(ctx)
             
             return {
                 'spots_detected': spots,
                 'lesions_detected': lesions,
                 'wilting_detected': wilting,
                 'fungal_growth': fungal,
+                'blob_statistics': self.analyze_blob_statistics(ctx),
                 'pattern_confidence': self.calculate_pattern_confidence(spots, lesions, wilting, fungal)
             }
             
@@ -557,19 +927,9 @@ class LeafAnalyzer:
     def detect_spots(self, hsv_img):
         """Detect dark spots on leaves"""
         try:
-            # Create mask for dark spots
-            lower_dark = np.array([0, 0, 0])
-            upper_dark = np.array([180, 255, 100])
-            dark_mask = cv2.inRange(hsv_img, lower_dark, upper_dark)
-            
-            # Find contours
-            contours, _ = cv2.findContours(dark_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter small spots
-            min_area = 50
-            spots = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
-            
-            return len(spots)
+            # Connected dark-spot blobs, small ones filtered out
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            return self.get_spot_blobs(ctx).count
             
         except Exception as e:
             print(f"Error detecting spots: {e}")
@@ -578,40 +938,45 @@ class LeafAnalyzer:
     def detect_lesions(self, hsv_img):
         """Detect lesions on leaves"""
         try:
-            # Create mask for brown/yellow lesions
-            lower_lesion = np.array([10, 50, 50])
-            upper_lesion = np.array([30, 255, 255])
-            lesion_mask = cv2.inRange(hsv_img, lower_lesion, upper_lesion)
-            
-            # Morphological operations to clean up
-            kernel = np.ones((5,5), np.uint8)
-            lesion_mask = cv2.morphologyEx(lesion_mask, cv2.MORPH_CLOSE, kernel)
-            
-            # Find contours
-            contours, _ = cv2.findContours(lesion_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter lesions
-            min_area = 100
-            lesions = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
-            
-            return len(lesions)
+            # Brown/yellow lesion blobs after a morphological close
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            return self.get_lesion_blobs(ctx).count
             
         except Exception as e:
             print(f"Error detecting lesions: {e}")
             return 0
 
+    def get_spot_blobs(self, ctx, min_area=SPOT_MIN_AREA):
+        """Dark spot blobs larger than min_area capture pixels"""
+        return ctx.blobs('dark_spot').filter(scaled_min_area(min_area, ctx.scale))
+    
+    def get_lesion_blobs(self, ctx, min_area=LESION_MIN_AREA):
+        """Lesion blobs larger than min_area capture pixels, after closing small gaps"""
+        close_size = scaled_close_size(LESION_CLOSE_SIZE, ctx.scale)
+        return ctx.blobs('lesion', close_size=close_size).filter(scaled_min_area(min_area, ctx.scale))
+    
+    def analyze_blob_statistics(self, img):
+        """Size histograms, coverage and largest blob for spots, lesions and fungal patches"""
+        try:
+            ctx = as_feature_context(img)
+            return {
+                'spots': self.get_spot_blobs(ctx).to_dict(),
+                'lesions': self.get_lesion_blobs(ctx).to_dict(),
+                'fungal': ctx.blobs('fungal').to_dict()
+            }
+        except Exception as e:
+            print(f"Error computing blob statistics: {e}")
+            return {}
+    
     def detect_wilting(self, img):
         """Detect wilting patterns"""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Detect edges
-            edges = cv2.Canny(gray, 50, 150)
+            # Edges are shared with the texture analysis
+            ctx = as_feature_context(img)
             
             # Look for irregular patterns (wilting)
             # Wilting often creates more complex edge patterns
-            edge_density = np.sum(edges > 0) / (img.shape[0] * img.shape[1])
+            edge_density = cv2.countNonZero(ctx.edges) / ctx.pixel_count
             
             # High edge density might indicate wilting
             return edge_density > 0.15
@@ -623,18 +988,9 @@ class LeafAnalyzer:
     def detect_fungal_growth(self, hsv_img):
         """Detect fungal growth patterns"""
         try:
-            # Create mask for white/gray fungal growth
-            lower_fungal = np.array([0, 0, 150])
-            upper_fungal = np.array([180, 30, 255])
-            fungal_mask = cv2.inRange(hsv_img, lower_fungal, upper_fungal)
-            
-            # Find fungal patches
-            contours, _ = cv2.findContours(fungal_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Calculate fungal coverage
-            total_area = hsv_img.shape[0] * hsv_img.shape[1]
-            fungal_area = sum(cv2.contourArea(cnt) for cnt in contours)
-            fungal_coverage = fungal_area / total_area
+            # Coverage of white/gray fungal patches
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            fungal_coverage = ctx.blobs('fungal').coverage
             
             return fungal_coverage > 0.05  # 5% coverage threshold
             
@@ -672,17 +1028,23 @@ class LeafAnalyzer:
     def analyze_nutrient_deficiency(self, img):
         """Analyze leaf for nutrient deficiency signs"""
         try:
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            # The shared yellow mask is computed once for all detectors
+            ctx = as_feature_context(img)
             
             # Analyze color patterns for nutrient deficiency
             deficiencies = {
-                'nitrogen': self.detect_nitrogen_deficiency(hsv),
-                'phosphorus': self.detect_phosphorus_deficiency(hsv),
-                'potassium': self.detect_potassium_deficiency(hsv),
-                'magnesium': self.detect_magnesium_deficiency(hsv),
-                'iron': self.detect_iron_deficiency(hsv)
+                'nitrogen': self.detect_nitrogen_deficiency(ctx),
+                'phosphorus': self.detect_phosphorus_deficiency(ctx),
+                'potassium': self.detect_potassium_deficiency(ctx),
+                'magnesium': self.detect_magnesium_deficiency(ctx),
+                'iron': self.detect_iron_deficiency(ctx)
             }
             
+            # Potassium moved from the centre to the edge band in 2.6; name it
+            # wherever that changes the answer so the change is not silent
+            if deficiencies['potassium'] != self.detect_centre_potassium_deficiency(ctx):
+                deficiencies['changed'] = ['potassium']
+            
             return deficiencies
             
         except Exception as e:
@@ -693,11 +1055,8 @@ class LeafAnalyzer:
         """Detect nitrogen deficiency (yellowing of older leaves)"""
         try:
             # Nitrogen deficiency shows as yellowing
-            lower_yellow = np.array([15, 50, 50])
-            upper_yellow = np.array([35, 255, 255])
-            yellow_mask = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
-            
-            yellow_ratio = np.sum(yellow_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            yellow_ratio = ctx.ratio('nutrient_yellow')
             
             return yellow_ratio > 0.3
             
@@ -709,11 +1068,8 @@ class LeafAnalyzer:
         """Detect phosphorus deficiency (purple/reddish leaves)"""
         try:
             # Phosphorus deficiency shows as purple/reddish
-            lower_purple = np.array([130, 50, 50])
-            upper_purple = np.array([170, 255, 255])
-            purple_mask = cv2.inRange(hsv_img, lower_purple, upper_purple)
-            
-            purple_ratio = np.sum(purple_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            purple_ratio = ctx.ratio('purple')
             
             return purple_ratio > 0.1
             
@@ -726,16 +1082,24 @@ class LeafAnalyzer:
         try:
             # Potassium deficiency shows as edge yellowing
             # This is a simplified detection
-            lower_yellow = np.array([15, 50, 50])
-            upper_yellow = np.array([35, 255, 255])
-            yellow_mask = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            yellow = ctx.integral('nutrient_yellow')
             
-            # Check edges more than center
-            height, width = hsv_img.shape[:2]
-            edge_region = yellow_mask[height//4:3*height//4, width//4:3*width//4]
-            edge_yellow_ratio = np.sum(edge_region > 0) / edge_region.size
+            # Check edges more than center (O(1) region lookups)
+            edge_yellow_ratio = ctx.regions.ratio(yellow, 'edge') or 0.0
+            centre_yellow_ratio = ctx.regions.ratio(yellow, 'centre') or 0.0
             
-            return edge_yellow_ratio > 0.2
+            return edge_yellow_ratio > 0.2 and edge_yellow_ratio > centre_yellow_ratio
+            
+        except Exception as e:
+            print(f"Error detecting potassium deficiency: {e}")
+            return False
+
+    def detect_centre_potassium_deficiency(self, hsv_img):
+        """Potassium test of analyzer versions before 2.6 (yellowing of the centre region)"""
+        try:
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            return (ctx.regions.ratio(ctx.integral('nutrient_yellow'), 'centre') or 0.0) > 0.2
             
         except Exception as e:
             print(f"Error detecting potassium deficiency: {e}")
@@ -746,11 +1110,8 @@ class LeafAnalyzer:
         try:
             # Magnesium deficiency shows as interveinal yellowing
             # This is a simplified detection
-            lower_yellow = np.array([15, 50, 50])
-            upper_yellow = np.array([35, 255, 255])
-            yellow_mask = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
-            
-            yellow_ratio = np.sum(yellow_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            yellow_ratio = ctx.ratio('nutrient_yellow')
             
             return 0.2 < yellow_ratio < 0.5  # Moderate yellowing
             
@@ -763,11 +1124,8 @@ class LeafAnalyzer:
         try:
             # Iron deficiency affects young leaves
             # This is a simplified detection
-            lower_yellow = np.array([15, 50, 50])
-            upper_yellow = np.array([35, 255, 255])
-            yellow_mask = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
-            
-            yellow_ratio = np.sum(yellow_mask > 0) / (hsv_img.shape[0] * hsv_img.shape[1])
+            ctx = as_feature_context(hsv_img, is_hsv=True)
+            yellow_ratio = ctx.ratio('nutrient_yellow')
             
             return yellow_ratio > 0.4  # High yellowing
             
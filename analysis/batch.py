@@ -0,0 +1,101 @@
+"""
+Batch leaf analysis for CocoScan
+Runs the full analyze_leaf pipeline across a process pool with one warm
+LeafAnalyzer per worker, so throughput scales with CPU cores
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from analysis.phash import dhash_file, dhash_image
+from analysis.results import LeafResult
+
+# One analysed image: result is None and error holds the message on failure;
+# phash is the image's dHash, computed in the worker from the decoded pixels
+BatchResult = namedtuple('BatchResult', ['path', 'result', 'error', 'phash'], defaults=(None,))
+
+# Analyzer owned by the current worker process
+_worker_analyzer = None
+
+def _init_worker(analyzer_kwargs):
+    """Create the warm LeafAnalyzer for this worker process"""
+    global _worker_analyzer
+    import sys
+    import cv2
+    from ai_leaf_analyzer import LeafAnalyzer
+
+    # Results travel back through the pool, keep analyzer logging off stdout
+    sys.stdout = sys.stderr
+
+    # Parallelism comes from the pool, keep OpenCV single-threaded per worker
+    cv2.setNumThreads(1)
+    _worker_analyzer = LeafAnalyzer(**analyzer_kwargs)
+
+def _analyze_chunk(paths, compact=False):
+    """Analyze a chunk of paths inside a worker process"""
+    results = []
+    for path in paths:
+        try:
+            decoded = []
+            result = _worker_analyzer.analyze_leaf(path, raise_errors=True, on_decoded=decoded.append)
+            if compact:
+                result = LeafResult.from_dict(result)
+            results.append(BatchResult(path, result, None, _phash(path, decoded)))
+        except Exception as e:
+            results.append(BatchResult(path, None, f"{type(e).__name__}: {e}"))
+    return results
+
+def _phash(path, decoded):
+    """dHash of the pixels analyze_leaf decoded, or of the file on a cache hit"""
+    try:
+        return dhash_image(decoded[0]) if decoded else dhash_file(path)
+    except Exception as e:
+        print(f"Error hashing {path}: {e}")
+        return None
+
+def _chunks(paths, chunksize):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def analyze_batch(paths, workers=None, chunksize=1, analyzer_kwargs=None, compact=False):
+    """Analyze many images in parallel, yielding BatchResult in completion order
+
+    Only a few chunks per worker are in flight at a time, so very long
+    path iterables do not pile up pending results in memory. compact=True
+    returns LeafResult objects instead of result dicts.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(int(chunksize), 1)
+    max_pending = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(analyzer_kwargs or {},)) as executor:
+        pending = {}
+        for chunk in _chunks(paths, chunksize):
+            pending[executor.submit(_analyze_chunk, chunk, compact)] = chunk
+            if len(pending) >= max_pending:
+                yield from _collect_finished(pending)
+
+        while pending:
+            yield from _collect_finished(pending)
+
+def _collect_finished(pending):
+    """Wait for at least one chunk and return its results"""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    results = []
+    for future in done:
+        chunk = pending.pop(future)
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            # The worker itself failed, report every path of the chunk
+            error = f"{type(e).__name__}: {e}"
+            results.extend(BatchResult(path, None, error) for path in chunk)
+    return results
@@ -0,0 +1,92 @@
+"""
+Single-pass multi-class colour segmentation for CocoScan
+All named HSV ranges are compiled into per-channel bitmask lookup tables,
+so one classification pass labels every pixel with every class it belongs to
+"""
+
+import numpy as np
+import cv2
+
+# Named HSV ranges used across the coconut analyzers (lower, upper)
+COLOR_RANGES = {
+    'healthy_green': ([35, 40, 40], [85, 255, 255]),
+    'yellowing': ([15, 40, 40], [35, 255, 255]),
+    'browning': ([0, 40, 20], [20, 255, 200]),
+    'necrosis': ([0, 0, 0], [180, 255, 50]),
+    'lethal_yellowing': ([20, 30, 100], [30, 255, 255]),
+    'root_wilt': ([0, 0, 50], [180, 100, 150]),
+    'bud_rot': ([0, 50, 20], [20, 255, 100]),
+    'leaf_spot': ([0, 0, 0], [180, 255, 80]),
+    'dark_spot': ([0, 0, 0], [180, 255, 100]),
+    'lesion': ([10, 50, 50], [30, 255, 255]),
+    'fungal': ([0, 0, 150], [180, 30, 255]),
+    'nutrient_yellow': ([15, 50, 50], [35, 255, 255]),
+    'purple': ([130, 50, 50], [170, 255, 255])
+}
+
+class ColorLabelMap:
+    """Compiles named HSV ranges into bitmask lookup tables"""
+
+    def __init__(self, ranges=None):
+        ranges = COLOR_RANGES if ranges is None else ranges
+        self.names = list(ranges)
+        if len(self.names) > 32:
+            raise ValueError("ColorLabelMap supports at most 32 colour classes")
+
+        # 16 classes fit cv2.LUT's uint16 tables, larger sets fall back to uint32
+        self.dtype = np.uint16 if len(self.names) <= 16 else np.uint32
+        self.bits = {name: 1 << index for index, name in enumerate(self.names)}
+
+        # One table per HSV channel, a class bit is set where the channel is in range
+        self.tables = [np.zeros(256, dtype=self.dtype) for _ in range(3)]
+        for name, (lower, upper) in ranges.items():
+            bit = self.dtype(self.bits[name])
+            for channel in range(3):
+                low = max(int(lower[channel]), 0)
+                high = min(int(upper[channel]), 255)
+                if low <= high:
+                    self.tables[channel][low:high + 1] |= bit
+
+    def classify(self, hsv_img):
+        """Label map where each pixel holds the bitmask of matching classes"""
+        h, s, v = cv2.split(hsv_img)
+        if self.dtype == np.uint16:
+            labels = cv2.LUT(h, self.tables[0])
+            labels = cv2.bitwise_and(labels, cv2.LUT(s, self.tables[1]))
+            return cv2.bitwise_and(labels, cv2.LUT(v, self.tables[2]))
+
+        labels = self.tables[0][h]
+        labels &= self.tables[1][s]
+        labels &= self.tables[2][v]
+        return labels
+
+    def counts(self, labels):
+        """Pixel count of every class from a single histogram of the label map"""
+        if self.dtype == np.uint16:
+            histogram = np.bincount(labels.ravel(), minlength=1 << len(self.names))
+            values = np.nonzero(histogram)[0]
+            value_counts = histogram[values]
+        else:
+            values, value_counts = np.unique(labels, return_counts=True)
+
+        # Classes overlap, so each class sums every bitmask value containing its bit
+        return {
+            name: int(value_counts[(values & bit) != 0].sum())
+            for name, bit in self.bits.items()
+        }
+
+    def mask(self, labels, name):
+        """Binary (0/255) mask for one class of a label map"""
+        selected = labels & self.dtype(self.bits[name])
+        if self.dtype == np.uint16:
+            return cv2.compare(selected, 0, cv2.CMP_NE)
+        return np.where(selected != 0, 255, 0).astype(np.uint8)
+
+_default_label_map = None
+
+def get_default_label_map():
+    """Shared label map compiled from COLOR_RANGES"""
+    global _default_label_map
+    if _default_label_map is None:
+        _default_label_map = ColorLabelMap()
+    return _default_label_map
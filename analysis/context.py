@@ -0,0 +1,150 @@
+"""
+Per-image feature context for CocoScan analysis
+Computes gray, HSV, edge and colour-mask planes once and shares them
+between every analyzer method that looks at the same image
+"""
+
+import cv2
+import numpy as np
+
+from analysis.blobs import blob_stats
+from analysis.color_lut import get_default_label_map
+from analysis.integral import MaskIntegral, RegionRatios
+
+class FeatureContext:
+    """Lazily computed and memoized image planes for one analysis
+
+    With a leaf roi mask (0/255), colour masks, counts, ratios and edges only
+    cover leaf pixels and pixel_count is the leaf area. scale is how many
+    capture pixels one context pixel spans along each side.
+    """
+
+    def __init__(self, img=None, hsv=None, roi=None, scale=1.0):
+        if img is None and hsv is None:
+            raise ValueError("FeatureContext needs a BGR or HSV image")
+        self.img = img
+        self.roi = roi
+        self.scale = scale
+        self._planes = {}
+        if hsv is not None:
+            self._planes['hsv'] = hsv
+
+    @property
+    def shape(self):
+        """Height and width of the analysed image"""
+        source = self.img if self.img is not None else self._planes['hsv']
+        return source.shape[:2]
+
+    @property
+    def pixel_count(self):
+        """Number of pixels in the analysed image (leaf pixels only with a roi)"""
+        if self.roi is not None:
+            return max(cv2.countNonZero(self.roi), 1)
+        height, width = self.shape
+        return height * width
+
+    def _require_bgr(self, plane):
+        if self.img is None:
+            raise ValueError(f"'{plane}' needs the BGR image, context was built from HSV only")
+
+    @property
+    def gray(self):
+        """Grayscale plane"""
+        if 'gray' not in self._planes:
+            self._require_bgr('gray')
+            self._planes['gray'] = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
+        return self._planes['gray']
+
+    @property
+    def hsv(self):
+        """HSV plane"""
+        if 'hsv' not in self._planes:
+            self._require_bgr('hsv')
+            self._planes['hsv'] = cv2.cvtColor(self.img, cv2.COLOR_BGR2HSV)
+        return self._planes['hsv']
+
+    @property
+    def edges(self):
+        """Canny edge map of the grayscale plane"""
+        if 'edges' not in self._planes:
+            edges = cv2.Canny(self.gray, 50, 150)
+            if self.roi is not None:
+                edges = cv2.bitwise_and(edges, self.roi)
+            self._planes['edges'] = edges
+        return self._planes['edges']
+
+    @property
+    def labels(self):
+        """Bitmask label map classifying every pixel against all COLOR_RANGES"""
+        if 'labels' not in self._planes:
+            labels = get_default_label_map().classify(self.hsv)
+            if self.roi is not None:
+                # Background pixels belong to no class
+                labels[self.roi == 0] = 0
+            self._planes['labels'] = labels
+        return self._planes['labels']
+
+    def mask(self, name):
+        """Binary (0/255) mask for one of the named COLOR_RANGES"""
+        key = ('mask', name)
+        if key not in self._planes:
+            self._planes[key] = get_default_label_map().mask(self.labels, name)
+        return self._planes[key]
+
+    def blobs(self, name, close_size=0):
+        """BlobStats of a named colour mask, optionally closed with a square kernel first"""
+        key = ('blobs', name, close_size)
+        if key not in self._planes:
+            mask = self.mask(name)
+            if close_size:
+                mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((close_size, close_size), np.uint8))
+            self._planes[key] = blob_stats(mask, pixel_count=self.pixel_count)
+        return self._planes[key]
+
+    def integral(self, name):
+        """Summed-area table of a named colour mask"""
+        key = ('integral', name)
+        if key not in self._planes:
+            self._planes[key] = MaskIntegral(self.mask(name))
+        return self._planes[key]
+
+    @property
+    def regions(self):
+        """Region ratio helper, dividing by leaf pixels when there is a roi"""
+        if 'regions' not in self._planes:
+            self._planes['regions'] = RegionRatios(self.shape, self.roi)
+        return self._planes['regions']
+
+    def region_ratio(self, name, region):
+        """Fraction of a region (name in REGIONS or fractions) covered by a colour mask"""
+        return self.regions.ratio(self.integral(name), region)
+
+    def grid_ratios(self, name, rows, cols):
+        """Per grid cell coverage of a colour mask"""
+        return self.regions.grid_ratios(self.integral(name), rows, cols)
+
+    def counts(self):
+        """Pixel counts of every named colour class from one histogram pass"""
+        if 'counts' not in self._planes:
+            self._planes['counts'] = get_default_label_map().counts(self.labels)
+        return self._planes['counts']
+
+    def count(self, name):
+        """Number of pixels inside a named colour mask"""
+        return self.counts()[name]
+
+    def ratio(self, name):
+        """Fraction of the image covered by a named colour mask"""
+        return self.count(name) / self.pixel_count
+
+    def ratios(self):
+        """Coverage fraction of every named colour class"""
+        return {name: count / self.pixel_count for name, count in self.counts().items()}
+
+def as_feature_context(img, is_hsv=False):
+    """Wrap an image in a FeatureContext unless it already is one"""
+    if isinstance(img, FeatureContext):
+        return img
+    if is_hsv:
+        return FeatureContext(hsv=img)
+    return FeatureContext(img)
@@ -0,0 +1,97 @@
+"""
+In-memory image helpers for CocoScan
+Camera frames are converted straight to BGR arrays and written to disk on a
+background thread, so analysis never waits on a PNG round trip; large JPEG
+uploads are decoded at a reduced scale when full detail is not needed
+"""
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+def texture_to_bgr(texture, step=1):
+    """BGR array from a Kivy texture's RGBA pixels, optionally decimated by step"""
+    width, height = texture.size
+    rgba = np.frombuffer(texture.pixels, dtype=np.uint8).reshape(height, width, 4)
+    # Texture rows start at the bottom
+    rgba = np.ascontiguousarray(rgba[::-step, ::step])
+    return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+# cv2.imread flags decoding JPEGs directly at 1/2, 1/4 and 1/8 scale
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2
+}
+
+def read_image_header(image_path=None, image_bytes=None):
+    """(format, (width, height)) from the file header without decoding pixels"""
+    from PIL import Image
+
+    source = io.BytesIO(image_bytes) if image_bytes is not None else image_path
+    with Image.open(source) as img:
+        return img.format, img.size
+
+def choose_decode_scale(size, target_side):
+    """Largest reduced-decode factor that keeps the long side at or above target_side"""
+    if not target_side:
+        return 1
+    long_side = max(size)
+    for scale in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if long_side // scale >= target_side:
+            return scale
+    return 1
+
+def decode_image(image_path=None, image_bytes=None, target_side=None):
+    """Decode a BGR image, at reduced scale for JPEGs larger than target_side
+
+    Returns (img, decode_info) where decode_info records the scale used and
+    the source size from the header.
+    """
+    scale = 1
+    source_size = None
+    if target_side:
+        try:
+            image_format, source_size = read_image_header(image_path, image_bytes)
+            if image_format == 'JPEG':
+                scale = choose_decode_scale(source_size, target_side)
+        except Exception as e:
+            print(f"Error reading image header: {e}")
+
+    flag = REDUCED_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR)
+    if image_bytes is not None:
+        img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flag)
+    else:
+        img = cv2.imread(image_path, flag)
+
+    decode_info = {'scale': scale}
+    if source_size is not None:
+        decode_info['source_size'] = list(source_size)
+    if img is not None:
+        decode_info['decoded_size'] = [img.shape[1], img.shape[0]]
+    return img, decode_info
+
+class BackgroundImageWriter:
+    """Writes images on a single background thread, in submission order"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-writer")
+
+    def write(self, path, img):
+        """Queue an image for writing, returns a Future resolving to the path"""
+        return self._executor.submit(self._write, path, img)
+
+    @staticmethod
+    def _write(path, img):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        if not cv2.imwrite(path, img):
+            raise IOError(f"Could not write image: {path}")
+        return path
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,157 @@
+"""
+Live camera preview quality gate for CocoScan
+Cheap sharpness, exposure and leaf-coverage checks on downsampled preview
+frames, so blurry or dark shots are rejected before capture
+"""
+
+import cv2
+import numpy as np
+
+from analysis.color_lut import COLOR_RANGES
+from analysis.image_io import texture_to_bgr
+from analysis.sharpness import laplacian_variance, scaled_sharpness_threshold
+
+def downsample(frame, max_side):
+    """Shrink a frame so its longest side is at most max_side"""
+    height, width = frame.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale >= 1.0:
+        return frame
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+# Thumbnail pre-gate LeafAnalyzer runs before the full pipeline; diseased
+# leaves count as plant pixels too, so only junk frames are turned away.
+# min_sharpness is the capture-resolution value, like the live gate's
+DEFAULT_PRE_GATE = {
+    'max_side': 256,
+    'min_sharpness': 20.0,
+    'min_brightness': 20.0,
+    'max_brightness': 230.0,
+    'min_contrast': 10.0,
+    'min_leaf_coverage': 0.15,
+    'leaf_classes': ['healthy_green', 'yellowing', 'browning', 'necrosis']
+}
+
+class FrameQualityGate:
+    """Decides whether a preview frame is good enough to capture
+
+    Thresholds default to the "Fair for Coconut Analysis" level of
+    LeafAnalyzer.analyze_coconut_image_quality, plus a minimum share of
+    leaf pixels (leaf_classes from COLOR_RANGES) so empty frames are not captured.
+    min_sharpness is a capture-resolution value, scaled to the thumbnail the
+    sharpness is measured on (analysis/sharpness.py).
+    """
+
+    def __init__(self, max_side=160, min_sharpness=20.0, min_brightness=20.0, max_brightness=230.0,
+                 min_contrast=10.0, min_leaf_coverage=0.15, leaf_classes=('healthy_green', 'yellowing')):
+        self.max_side = max_side
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.min_leaf_coverage = min_leaf_coverage
+
+        leaf_ranges = [COLOR_RANGES[name] for name in leaf_classes]
+        self._leaf_ranges = [(np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8))
+                             for lower, upper in leaf_ranges]
+
+    def check(self, frame, scale=1.0):
+        """Quality metrics and a ready flag for a BGR frame
+
+        scale is how many capture pixels one frame pixel already spans, e.g.
+        the decimation step of the camera source.
+        """
+        small = downsample(frame, self.max_side)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        mean, std = cv2.meanStdDev(gray)
+        brightness = float(mean[0][0])
+        contrast = float(std[0][0])
+        sharpness = laplacian_variance(gray)
+        sharpness_scale = scale * max(frame.shape[:2]) / float(max(small.shape[:2]))
+
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        leaf_mask = np.zeros(gray.shape, dtype=np.uint8)
+        for lower, upper in self._leaf_ranges:
+            leaf_mask |= cv2.inRange(hsv, lower, upper)
+        leaf_coverage = cv2.countNonZero(leaf_mask) / float(leaf_mask.size)
+
+        problems = []
+        if sharpness < scaled_sharpness_threshold(self.min_sharpness, sharpness_scale):
+            problems.append("too blurry")
+        if brightness < self.min_brightness:
+            problems.append("too dark")
+        elif brightness > self.max_brightness:
+            problems.append("too bright")
+        if contrast < self.min_contrast:
+            problems.append("low contrast")
+        if leaf_coverage < self.min_leaf_coverage:
+            problems.append("no leaf in frame")
+
+        return {
+            'ready': not problems,
+            'problems': problems,
+            'sharpness': sharpness,
+            'sharpness_scale': sharpness_scale,
+            'brightness': brightness,
+            'contrast': contrast,
+            'leaf_coverage': leaf_coverage
+        }
+
+class KivyCameraFrameSource:
+    """Reads preview frames from a kivy.uix.camera.Camera texture
+
+    Must be called from the Kivy main thread. Rows are decimated before the
+    colour conversion so only a small frame is ever converted; decimation
+    stops at twice max_side because skipped pixels alias into extra
+    sharpness, the gate's area resize does the rest. scale is the step
+    of the last frame read.
+    """
+
+    def __init__(self, camera, max_side=160):
+        self.camera = camera
+        self.max_side = max_side
+        self.scale = 1
+
+    def read(self):
+        texture = getattr(self.camera, 'texture', None)
+        if texture is None:
+            return None
+
+        width, height = texture.size
+        self.scale = max(1, max(width, height) // (2 * self.max_side))
+        return texture_to_bgr(texture, step=self.scale)
+
+    def close(self):
+        pass
+
+class VideoFileFrameSource:
+    """Reads preview frames from a video file, standing in for the camera"""
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.scale = 1
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video: {path}")
+
+    def read(self):
+        ok, frame = self.capture.read()
+        if not ok and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return frame if ok else None
+
+    def close(self):
+        self.capture.release()
+
+def iter_frame_quality(source, gate=None):
+    """Yield gate results for every frame until the source runs dry"""
+    gate = gate or FrameQualityGate()
+    while True:
+        frame = source.read()
+        if frame is None:
+            return
+        yield gate.check(frame, source.scale)
@@ -0,0 +1,70 @@
+"""
+Perceptual hashing for near-duplicate CocoScan scans
+A 64-bit difference hash (dHash) is computed from a tiny thumbnail and
+split into four 16-bit chunks for multi-index Hamming search
+"""
+
+from itertools import combinations
+
+HASH_BITS = 64
+CHUNK_COUNT = 4
+CHUNK_BITS = HASH_BITS // CHUNK_COUNT
+
+def dhash_image(img, hash_size=8):
+    """64-bit difference hash of a BGR or grayscale image"""
+    import cv2
+    import numpy as np
+
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+
+    # Each bit says whether brightness increases left to right
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def dhash_file(image_path):
+    """dHash of an image file, decoded at 1/8 scale to keep it cheap"""
+    import cv2
+
+    img = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"Could not load image: {image_path}")
+    return dhash_image(img)
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hashes"""
+    return bin(hash_a ^ hash_b).count('1')
+
+def split_hash(image_hash):
+    """Split a 64-bit hash into CHUNK_COUNT chunks, most significant first"""
+    mask = (1 << CHUNK_BITS) - 1
+    return [(image_hash >> (CHUNK_BITS * (CHUNK_COUNT - 1 - i))) & mask for i in range(CHUNK_COUNT)]
+
+def chunk_radius(max_distance):
+    """Per-chunk search radius guaranteeing every match within max_distance is found
+
+    By the pigeonhole principle, if two hashes differ in at most max_distance
+    bits, at least one of the chunks differs in at most max_distance // CHUNK_COUNT.
+    """
+    return max_distance // CHUNK_COUNT
+
+def chunk_neighbours(chunk, radius):
+    """All chunk values within a Hamming radius of chunk"""
+    values = [chunk]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            value = chunk
+            for bit in bits:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+def to_signed64(value):
+    """Store an unsigned 64-bit hash in SQLite's signed INTEGER"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def from_signed64(value):
+    """Inverse of to_signed64"""
+    return value + (1 << 64) if value < 0 else value
@@ -0,0 +1,174 @@
+"""
+Per-stage instrumentation for CocoScan analysis
+Each stage records wall time, CPU time of the calling thread and
+optionally peak allocation (tracemalloc); results carry them under
+'timings' and every stage also feeds process-wide histograms. Switched
+off, stages cost one no-op call
+"""
+
+import math
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# Histogram bucket upper bounds in milliseconds (log spaced, last bucket open)
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, math.inf)
+
+_settings = {'enabled': True, 'trace_memory': False}
+
+def set_profiling(enabled=True, trace_memory=False):
+    """Turn stage recording on or off; trace_memory adds tracemalloc peaks (slow)"""
+    _settings['enabled'] = bool(enabled)
+    _settings['trace_memory'] = bool(enabled and trace_memory)
+    if _settings['trace_memory'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def profiling_enabled():
+    return _settings['enabled']
+
+class StageHistograms:
+    """Thread-safe wall-time histograms per stage name"""
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS_MS):
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, wall_ms, thread_cpu_ms):
+        bucket = next(i for i, bound in enumerate(self.bounds) if wall_ms <= bound)
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = {'count': 0, 'wall_ms': 0.0, 'thread_cpu_ms': 0.0, 'max_ms': 0.0,
+                         'buckets': [0] * len(self.bounds)}
+                self._stages[stage] = entry
+            entry['count'] += 1
+            entry['wall_ms'] += wall_ms
+            entry['thread_cpu_ms'] += thread_cpu_ms
+            entry['max_ms'] = max(entry['max_ms'], wall_ms)
+            entry['buckets'][bucket] += 1
+
+    def percentile(self, buckets, count, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        target = fraction * count
+        seen = 0
+        for bound, n in zip(self.bounds, buckets):
+            seen += n
+            if n and seen >= target:
+                return bound
+        return self.bounds[-1]
+
+    def summary(self):
+        """{stage: count, mean/max wall ms, mean calling-thread cpu ms, p50/p95 bucket bounds}"""
+        with self._lock:
+            stages = {name: dict(entry, buckets=list(entry['buckets'])) for name, entry in self._stages.items()}
+        return {
+            name: {
+                'count': entry['count'],
+                'mean_ms': entry['wall_ms'] / entry['count'],
+                'mean_thread_cpu_ms': entry['thread_cpu_ms'] / entry['count'],
+                'max_ms': entry['max_ms'],
+                'p50_ms': self.percentile(entry['buckets'], entry['count'], 0.5),
+                'p95_ms': self.percentile(entry['buckets'], entry['count'], 0.95),
+                'buckets': dict(zip(('<=%g' % b if b != math.inf else 'inf' for b in self.bounds), entry['buckets']))
+            }
+            for name, entry in stages.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+STAGE_HISTOGRAMS = StageHistograms()
+
+# Stages currently tracing memory. tracemalloc keeps one process-wide peak,
+# so before a stage resets it the peak so far is handed to every open stage
+_open_stages = []
+_memory_lock = threading.Lock()
+
+def _fold_peak():
+    peak = tracemalloc.get_traced_memory()[1]
+    for stage in _open_stages:
+        stage.memory_peak = max(stage.memory_peak, peak)
+
+class _Stage:
+    """One timed stage
+
+    thread_cpu_ms is CPU time of the thread that entered the stage only;
+    work OpenCV or a worker pool runs on other threads shows in wall_ms.
+    Process CPU time would instead charge concurrent stages to each other.
+    """
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        if self.timings.trace_memory:
+            with _memory_lock:
+                _fold_peak()
+                tracemalloc.reset_peak()
+                self.memory_start = self.memory_peak = tracemalloc.get_traced_memory()[0]
+                _open_stages.append(self)
+        self.cpu_start = time.thread_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall_ms = (time.perf_counter() - self.wall_start) * 1000.0
+        thread_cpu_ms = (time.thread_time() - self.cpu_start) * 1000.0
+        record = {'wall_ms': round(wall_ms, 3), 'thread_cpu_ms': round(thread_cpu_ms, 3)}
+        if self.timings.trace_memory:
+            # Nested stages count towards their parents; concurrent stages overlap
+            with _memory_lock:
+                _fold_peak()
+                _open_stages.remove(self)
+            record['peak_kb'] = round((self.memory_peak - self.memory_start) / 1024.0, 1)
+        self.timings.add(self.name, record)
+        STAGE_HISTOGRAMS.record(self.name, wall_ms, thread_cpu_ms)
+        return False
+
+class StageTimings:
+    """Stage records of one analysis; stage(name) is a context manager"""
+
+    enabled = True
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, record):
+        with self._lock:
+            self.stages[name] = record
+
+    def to_dict(self):
+        with self._lock:
+            return {name: dict(record) for name, record in self.stages.items()}
+
+class _NullTimings:
+    """Stand-in used while profiling is off"""
+
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def add(self, name, record):
+        pass
+
+    def to_dict(self):
+        return {}
+
+NULL_TIMINGS = _NullTimings()
+
+def start_timings():
+    """A fresh StageTimings, or the shared no-op recorder when profiling is off"""
+    if not _settings['enabled']:
+        return NULL_TIMINGS
+    return StageTimings(trace_memory=_settings['trace_memory'])
@@ -0,0 +1,120 @@
+"""
+Resolution-capped analysis pyramid for CocoScan
+Levels are built once with cv2.pyrDown and shared between extractors,
+so analysis cost stays bounded whatever resolution the camera delivers
+"""
+
+import threading
+
+import cv2
+
+from analysis.context import FeatureContext
+
+# Longest image side each extractor needs (None keeps full resolution),
+# whether it wants exactly that size instead of the nearest level, whether
+# it only looks at the segmented leaf (roi, on unless False) and an optional
+# centre crop side. Quality scales its sharpness thresholds to whatever
+# resolution it gets (analysis/sharpness.py), so it takes the decoded image
+# as is and bounds its cost with the crop; 'decode': False leaves it out of
+# the JPEG decode target
+DEFAULT_ANALYSIS_RESOLUTIONS = {
+    'quality': {'max_side': None, 'exact': False, 'roi': False, 'crop': 1024, 'decode': False},
+    'colors': {'max_side': 512, 'exact': False},
+    'texture': {'max_side': 256, 'exact': True},
+    'patterns': {'max_side': 512, 'exact': False}
+}
+
+class AnalysisPyramid:
+    """Image pyramid with one shared feature context per level
+
+    Levels and contexts are built under a lock, so extractors running on
+    several threads share them safely. source_scale is the factor img was
+    already reduced by when it was decoded, so contexts know their scale
+    relative to the capture.
+    """
+
+    def __init__(self, img, roi=None, source_scale=1.0):
+        if img is None:
+            raise ValueError("AnalysisPyramid needs an image")
+        self.levels = [img]
+        self.source_scale = source_scale
+        # Optional LeafROI, contexts for roi extractors are cropped to the leaf
+        self.roi = roi
+        self._contexts = {}
+        self._lock = threading.RLock()
+
+    @property
+    def full_shape(self):
+        """Height and width of the full-resolution image"""
+        return self.levels[0].shape[:2]
+
+    def level(self, index):
+        """Pyramid level, halving the image once per index"""
+        with self._lock:
+            while len(self.levels) <= index:
+                self.levels.append(cv2.pyrDown(self.levels[-1]))
+            return self.levels[index]
+
+    def level_index_for(self, max_side):
+        """Smallest level whose longest side still covers max_side"""
+        if max_side is None:
+            return 0
+
+        height, width = self.full_shape
+        index = 0
+        # pyrDown rounds odd sizes up
+        while max((height + 1) // 2, (width + 1) // 2) >= max_side:
+            height, width = (height + 1) // 2, (width + 1) // 2
+            index += 1
+        return index
+
+    def scale_of(self, img):
+        """Capture pixels per pixel of a level (or resized level) of this pyramid"""
+        return self.source_scale * max(self.full_shape) / max(max(img.shape[:2]), 1)
+
+    def image_for(self, max_side, exact=False):
+        """Image at the requested resolution"""
+        img = self.level(self.level_index_for(max_side))
+        if exact and max_side is not None:
+            height, width = img.shape[:2]
+            scale = max_side / max(height, width)
+            if scale < 1.0:
+                size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+                img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        return img
+
+    def context(self, max_side=None, exact=False, roi=False, crop=None):
+        """Shared FeatureContext for the requested resolution
+
+        With roi the image is cropped to the leaf, otherwise crop keeps only
+        a centred window of at most crop x crop pixels.
+        """
+        roi = roi and self.roi is not None
+        crop = None if roi else crop
+        if max_side is None:
+            key = (0, False, roi, crop)
+        else:
+            key = (self.level_index_for(max_side), max_side if exact else False, roi, crop)
+        with self._lock:
+            if key not in self._contexts:
+                img = self.image_for(max_side, exact)
+                scale = self.scale_of(img)
+                if roi:
+                    leaf, mask = self.roi.crop(img)
+                    self._contexts[key] = FeatureContext(leaf, roi=mask, scale=scale)
+                else:
+                    self._contexts[key] = FeatureContext(center_crop(img, crop) if crop else img, scale=scale)
+            return self._contexts[key]
+
+    def context_for(self, extractor, resolutions=None):
+        """FeatureContext for an extractor's declared resolution"""
+        resolutions = DEFAULT_ANALYSIS_RESOLUTIONS if resolutions is None else resolutions
+        spec = resolutions.get(extractor, {})
+        return self.context(spec.get('max_side'), spec.get('exact', False), spec.get('roi', True), spec.get('crop'))
+
+def center_crop(img, side):
+    """Centred window of at most side x side pixels"""
+    height, width = img.shape[:2]
+    top = max((height - side) // 2, 0)
+    left = max((width - side) // 2, 0)
+    return img[top:top + side, left:left + side]
@@ -0,0 +1,209 @@
+"""
+Feature registry for CocoScan analysis
+Every extractor declares the nodes it reads (pyramid contexts, gray, HSV
+labels, edges) and callers ask for feature names; the executor resolves the
+dependency graph, computes shared intermediates once and skips the rest
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis.profiling import NULL_TIMINGS
+from analysis.pyramid import AnalysisPyramid
+from analysis.segmentation import segment_leaf
+
+# Extractor levels declared in DEFAULT_ANALYSIS_RESOLUTIONS, plus the
+# untouched full image used by the interactive AI tools
+CONTEXT_LEVELS = ('quality', 'colors', 'texture', 'patterns')
+
+# What enhance_coconut_analysis adds to every scan
+COCONUT_ANALYSIS_FEATURES = ('image_quality', 'color_analysis', 'region_health', 'texture_analysis',
+                             'disease_patterns', 'recommendations', 'leaf_roi', 'analysis_resolution')
+
+# Stages of a full scan in the order partial results are reported; the
+# diagnosis comes right after the cheap quality check, the slow extractors last
+ANALYSIS_STAGES = (
+    ('quality', ('leaf_roi', 'image_quality')),
+    ('model', ('model_results',)),
+    ('colors', ('color_analysis', 'region_health')),
+    ('texture', ('texture_analysis',)),
+    ('patterns', ('disease_patterns',)),
+    ('recommendations', ('recommendations', 'analysis_resolution'))
+)
+
+class FeatureNode:
+    """One named value, computed as compute(analyzer, *values of inputs)"""
+
+    def __init__(self, name, inputs, compute):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.compute = compute
+
+class FeatureRegistry:
+    """Named feature nodes and a dependency-resolving executor"""
+
+    def __init__(self):
+        self.nodes = {}
+
+    def register(self, name, inputs, compute):
+        if name in self.nodes:
+            raise ValueError(f"Feature already registered: {name}")
+        self.nodes[name] = FeatureNode(name, inputs, compute)
+
+    def feature(self, name, inputs=()):
+        """Decorator form of register"""
+        def decorator(compute):
+            self.register(name, inputs, compute)
+            return compute
+        return decorator
+
+    def resolve(self, names, provided=()):
+        """Nodes needed for names as dependency levels; nodes in one level are independent"""
+        depth = {}
+        visiting = set()
+
+        def visit(name):
+            if name in depth:
+                return depth[name]
+            if name in provided:
+                depth[name] = -1
+                return -1
+            if name not in self.nodes:
+                raise KeyError(f"Unknown feature: {name}")
+            if name in visiting:
+                raise ValueError(f"Feature dependency cycle at: {name}")
+            visiting.add(name)
+            level = 1 + max([visit(dep) for dep in self.nodes[name].inputs], default=-1)
+            visiting.discard(name)
+            depth[name] = level
+            return level
+
+        for name in names:
+            visit(name)
+
+        levels = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for name, level in depth.items():
+            if level >= 0:
+                levels[level].append(name)
+        return levels
+
+    def compute(self, names, analyzer, provided=None, workers=None, timings=NULL_TIMINGS):
+        """Values of the requested features, sharing every intermediate node
+
+        provided maps node names to precomputed values (e.g. the pyramid or
+        model results). With workers > 1 independent nodes run concurrently.
+        Each computed node is recorded as a stage in timings.
+        """
+        values = dict(provided or {})
+        self.compute_into(values, names, analyzer, workers, timings)
+        return {name: values[name] for name in names}
+
+    def iter_stages(self, stages, analyzer, provided=None, workers=None, timings=NULL_TIMINGS):
+        """Yield (stage, {name: value}) as each (stage, names) group completes
+
+        Intermediates computed for one group are reused by the later ones.
+        """
+        values = dict(provided or {})
+        for stage, names in stages:
+            self.compute_into(values, names, analyzer, workers, timings)
+            yield stage, {name: values[name] for name in names}
+
+    def compute_into(self, values, names, analyzer, workers=None, timings=NULL_TIMINGS):
+        """Compute names and every missing input into the values dict"""
+        levels = self.resolve(names, values)
+
+        def run(name):
+            node = self.nodes[name]
+            with timings.stage(name):
+                return node.compute(analyzer, *(values[dep] for dep in node.inputs))
+
+        executor = ThreadPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+        try:
+            for level in levels:
+                if executor is not None and len(level) > 1:
+                    for name, value in zip(level, executor.map(run, level)):
+                        values[name] = value
+                else:
+                    for name in level:
+                        values[name] = run(name)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+def _segment(analyzer, pyramid):
+    if analyzer.segment_leaf and pyramid.roi is None:
+        pyramid.roi = segment_leaf(pyramid.image_for(256))
+    return pyramid.roi.to_dict(pyramid.full_shape) if pyramid.roi is not None else {'found': False}
+
+def _model_input(analyzer, pyramid):
+    return analyzer.prepare_model_input(pyramid.levels[0]) if analyzer.model_loaded else None
+
+def _run_model(analyzer, model_input):
+    if analyzer.model_loaded:
+        return analyzer.run_ai_model(model_input)
+    return analyzer.get_coconut_simulated_analysis()
+
+def _plane(plane):
+    """Node computing one memoized FeatureContext plane, passing the context on"""
+    def force(analyzer, ctx):
+        getattr(ctx, plane)
+        return ctx
+    return force
+
+def build_default_registry():
+    """Registry of the LeafAnalyzer extractors and the planes they share"""
+    registry = FeatureRegistry()
+
+    # 'pyramid' is always provided by the caller
+    registry.register('leaf_roi', ('pyramid',), _segment)
+    registry.register('model_input', ('pyramid',), _model_input)
+    registry.register('model_results', ('model_input',), _run_model)
+
+    # Contexts per extractor level, cropped to the leaf where the level asks for it
+    for level in CONTEXT_LEVELS:
+        registry.register(f'context:{level}', ('pyramid', 'leaf_roi'),
+                          lambda analyzer, pyramid, roi, level=level:
+                          pyramid.context_for(level, analyzer.analysis_resolutions))
+    registry.register('context:full', ('pyramid',), lambda analyzer, pyramid: pyramid.context())
+
+    # Shared planes; each node forces the plane and passes the context on
+    for level in CONTEXT_LEVELS + ('full',):
+        context = f'context:{level}'
+        registry.register(f'gray:{level}', (context,), _plane('gray'))
+        registry.register(f'labels:{level}', (context,), _plane('labels'))
+        registry.register(f'edges:{level}', (f'gray:{level}',), _plane('edges'))
+
+    # Coconut scan features
+    registry.register('image_quality', ('gray:quality',),
+                      lambda analyzer, ctx: analyzer.analyze_coconut_image_quality(ctx))
+    registry.register('color_analysis', ('labels:colors',),
+                      lambda analyzer, ctx: analyzer.analyze_coconut_colors(ctx))
+    registry.register('color_classes', ('labels:colors',),
+                      lambda analyzer, ctx: analyzer.analyze_color_classes(ctx))
+    registry.register('region_health', ('labels:colors',),
+                      lambda analyzer, ctx: analyzer.analyze_region_health(ctx))
+    registry.register('texture_analysis', ('edges:texture',),
+                      lambda analyzer, ctx: analyzer.analyze_coconut_texture(ctx))
+    registry.register('disease_patterns', ('labels:patterns',),
+                      lambda analyzer, ctx: analyzer.detect_coconut_disease_patterns(ctx))
+    registry.register('recommendations', ('model_results', 'image_quality', 'disease_patterns'),
+                      lambda analyzer, results, quality, patterns:
+                      analyzer.generate_coconut_recommendations(results, quality, patterns))
+    registry.register('analysis_resolution', tuple(f'context:{level}' for level in CONTEXT_LEVELS),
+                      lambda analyzer, *contexts: {level: list(ctx.shape)
+                                                   for level, ctx in zip(CONTEXT_LEVELS, contexts)})
+
+    # Interactive AI tools on the whole image
+    registry.register('pattern_detection', ('labels:full', 'edges:full'),
+                      lambda analyzer, ctx, _: analyzer.detect_disease_patterns(ctx))
+    registry.register('nutrient_deficiency', ('labels:full',),
+                      lambda analyzer, ctx: analyzer.analyze_nutrient_deficiency(ctx))
+    registry.register('blob_statistics', ('labels:full',),
+                      lambda analyzer, ctx: analyzer.analyze_blob_statistics(ctx))
+
+    return registry
+
+DEFAULT_REGISTRY = build_default_registry()
+
+def as_pyramid(img):
+    """Wrap an image in an AnalysisPyramid unless it already is one"""
+    return img if isinstance(img, AnalysisPyramid) else AnalysisPyramid(img)
@@ -0,0 +1,479 @@
+"""
+Compact analysis results for CocoScan
+LeafResult keeps the numeric features of an analysis in one fixed-layout
+float array, the region health grid in a second one, labels, recommendations
+and symptoms as interned strings and only the irregular rest (ROI boxes,
+decode info...) as JSON bytes decoded on access. It converts to and from the
+analyzer's result dict (timings are dropped) and packs to bytes with one
+struct layout and a shared string table, so large batches stay small in
+memory and on disk
+"""
+
+import json
+import struct
+import sys
+from array import array
+
+from analysis.serialization import json_default
+
+# (attribute, path of nested sections, key, kind) with kind 'f' float, 'i' int, 'b' bool
+NUMERIC_FIELDS = (
+    ('disease_class', (), 'disease_class', 'i'),
+    ('disease_confidence', (), 'disease_confidence', 'f'),
+    ('overall_confidence', (), 'overall_confidence', 'f'),
+    ('leaf_confidence', (), 'leaf_confidence', 'f'),
+    ('coconut_specific', (), 'coconut_specific', 'b'),
+    ('leaf_found', ('leaf_roi',), 'found', 'b'),
+    ('leaf_coverage', ('leaf_roi',), 'coverage', 'f'),
+    ('sharpness', ('image_quality',), 'sharpness', 'f'),
+    ('sharpness_scale', ('image_quality',), 'sharpness_scale', 'f'),
+    ('brightness', ('image_quality',), 'brightness', 'f'),
+    ('contrast', ('image_quality',), 'contrast', 'f'),
+    ('coconut_optimized', ('image_quality',), 'coconut_optimized', 'b'),
+    ('healthy_green_ratio', ('color_analysis',), 'healthy_green_ratio', 'f'),
+    ('yellowing_ratio', ('color_analysis',), 'yellowing_ratio', 'f'),
+    ('browning_ratio', ('color_analysis',), 'browning_ratio', 'f'),
+    ('necrosis_ratio', ('color_analysis',), 'necrosis_ratio', 'f'),
+    ('color_coconut_specific', ('color_analysis',), 'coconut_specific', 'b'),
+    ('edge_density', ('texture_analysis',), 'edge_density', 'f'),
+    ('texture_variance', ('texture_analysis',), 'texture_variance', 'f'),
+    ('texture_coconut_specific', ('texture_analysis',), 'coconut_specific', 'b'),
+    ('yellowing_detected', ('disease_patterns', 'yellowing_detected'), 'detected', 'b'),
+    ('yellowing_confidence', ('disease_patterns', 'yellowing_detected'), 'confidence', 'f'),
+    ('root_wilt_detected', ('disease_patterns', 'root_wilt_signs'), 'detected', 'b'),
+    ('root_wilt_confidence', ('disease_patterns', 'root_wilt_signs'), 'confidence', 'f'),
+    ('bud_rot_detected', ('disease_patterns', 'bud_rot_indicators'), 'detected', 'b'),
+    ('bud_rot_confidence', ('disease_patterns', 'bud_rot_indicators'), 'confidence', 'f'),
+    ('leaf_spots_detected', ('disease_patterns', 'leaf_spots'), 'detected', 'b'),
+    ('leaf_spots_confidence', ('disease_patterns', 'leaf_spots'), 'confidence', 'f'),
+    ('patterns_coconut_specific', ('disease_patterns',), 'coconut_specific', 'b'),
+)
+
+# (attribute, path, key); values repeat across results, so they are interned
+LABEL_FIELDS = (
+    ('disease_name', (), 'disease_name'),
+    ('leaf_type', (), 'leaf_type'),
+    ('leaf_name', (), 'leaf_name'),
+    ('model_used', (), 'model_used'),
+    ('analysis_timestamp', (), 'analysis_timestamp'),
+    ('quality_level', ('image_quality',), 'quality_level'),
+    ('color_health', ('color_analysis',), 'color_health'),
+    ('color_severity', ('color_analysis',), 'severity'),
+    ('texture_pattern', ('texture_analysis',), 'texture_pattern'),
+    ('yellowing_severity', ('disease_patterns', 'yellowing_detected'), 'severity'),
+    ('root_wilt_severity', ('disease_patterns', 'root_wilt_signs'), 'severity'),
+    ('bud_rot_severity', ('disease_patterns', 'bud_rot_indicators'), 'severity'),
+    ('leaf_spots_severity', ('disease_patterns', 'leaf_spots'), 'severity'),
+)
+
+NUMERIC_NAMES = tuple(field[0] for field in NUMERIC_FIELDS)
+LABEL_NAMES = tuple(field[0] for field in LABEL_FIELDS)
+
+# Region health cells: four ratios packed as floats, two interned labels
+REGION_RATIOS = ('healthy_green_ratio', 'yellowing_ratio', 'browning_ratio', 'necrosis_ratio')
+REGION_LABELS = ('color_health', 'severity')
+
+# Top-level string lists kept as tuples of interned strings
+TEXT_FIELDS = ('recommendations', 'symptoms')
+
+# Profiling data, not part of the analysis itself
+DROPPED_FIELDS = ('timings',)
+
+# Binary record: magic, layout version, presence bits of the numeric fields,
+# the numeric block, label references, the region grid, text references and
+# the JSON rest. Strings are stored once in a table ahead of the records and
+# referenced by index
+MAGIC = b'CSR'
+LAYOUT_VERSION = 3
+_HEADER = struct.Struct('<3sBQ')
+_NUMBERS = struct.Struct(f'<{len(NUMERIC_FIELDS)}d')
+_LABEL_REFS = struct.Struct(f'<{len(LABEL_FIELDS)}I')
+_GRID = struct.Struct('<BB')
+_LENGTH32 = struct.Struct('<I')
+_COUNT = struct.Struct('<I')
+
+_NONE = 0xFFFFFFFF
+
+def _is_number(value, kind):
+    import numpy as np
+
+    if kind == 'b':
+        return isinstance(value, (bool, np.bool_))
+    if isinstance(value, (bool, np.bool_)):
+        return False
+    if kind == 'i':
+        return isinstance(value, (int, np.integer))
+    return isinstance(value, (int, float, np.integer, np.floating))
+
+# Nested sections fields live in, parents before children
+SECTION_PATHS = tuple(sorted({field[1] for field in NUMERIC_FIELDS + LABEL_FIELDS if field[1]}, key=len))
+
+def _lookup(result, path):
+    """The dict at path inside result, None if it is missing or not a dict"""
+    container = result
+    for section in path:
+        container = container.get(section)
+        if not isinstance(container, dict):
+            return None
+    return container
+
+def _section(result, path):
+    container = result
+    for section in path:
+        container = container.setdefault(section, {})
+    return container
+
+def _copy_sections(result):
+    """Shallow copy of result with every field section copied, so fields can be popped"""
+    rest = dict(result)
+    for path in SECTION_PATHS:
+        parent = _lookup(rest, path[:-1])
+        if parent is not None and isinstance(parent.get(path[-1]), dict):
+            parent[path[-1]] = dict(parent[path[-1]])
+    return rest
+
+def _pack_region(region):
+    """(rows, cols, ratios, labels) for a region health grid, None if it has another shape"""
+    if not isinstance(region, dict) or set(region) != {'rows', 'cols', 'grid'}:
+        return None
+    rows, cols, grid = region['rows'], region['cols'], region['grid']
+    if not (_is_number(rows, 'i') and _is_number(cols, 'i') and 0 < rows < 256 and 0 < cols < 256):
+        return None
+    if not isinstance(grid, list) or len(grid) != rows:
+        return None
+
+    ratios = array('d')
+    labels = []
+    for cells in grid:
+        if not isinstance(cells, list) or len(cells) != cols:
+            return None
+        for cell in cells:
+            if cell is None:
+                ratios.extend([float('nan')] * len(REGION_RATIOS))
+                labels.extend([None] * len(REGION_LABELS))
+                continue
+            if not isinstance(cell, dict) or set(cell) != set(REGION_RATIOS + REGION_LABELS):
+                return None
+            if not all(_is_number(cell[key], 'f') for key in REGION_RATIOS):
+                return None
+            if not all(isinstance(cell[key], str) for key in REGION_LABELS):
+                return None
+            ratios.extend(float(cell[key]) for key in REGION_RATIOS)
+            labels.extend(sys.intern(str(cell[key])) for key in REGION_LABELS)
+    return int(rows), int(cols), ratios, tuple(labels)
+
+def _unpack_region(region):
+    rows, cols, ratios, labels = region
+    grid = []
+    for row in range(rows):
+        cells = []
+        for col in range(cols):
+            cell = row * cols + col
+            if labels[cell * len(REGION_LABELS)] is None:
+                cells.append(None)
+                continue
+            values = ratios[cell * len(REGION_RATIOS):(cell + 1) * len(REGION_RATIOS)]
+            entry = dict(zip(REGION_RATIOS, values))
+            entry.update(zip(REGION_LABELS, labels[cell * len(REGION_LABELS):(cell + 1) * len(REGION_LABELS)]))
+            cells.append(entry)
+        grid.append(cells)
+    return {'rows': rows, 'cols': cols, 'grid': grid}
+
+def _pack_texts(values):
+    """Tuple of interned strings, None unless values is a list of strings"""
+    if not isinstance(values, (list, tuple)) or not all(isinstance(value, str) for value in values):
+        return None
+    return tuple(sys.intern(str(value)) for value in values)
+
+class StringTable:
+    """Strings referenced by index from packed records"""
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self._index = {string: index for index, string in enumerate(self.strings)}
+
+    def ref(self, string):
+        if string is None:
+            return _NONE
+        index = self._index.get(string)
+        if index is None:
+            index = self._index[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def get(self, ref):
+        return None if ref == _NONE else self.strings[ref]
+
+    def to_bytes(self):
+        parts = [_COUNT.pack(len(self.strings))]
+        for string in self.strings:
+            encoded = string.encode('utf-8')
+            parts.append(_LENGTH32.pack(len(encoded)) + encoded)
+        return b''.join(parts)
+
+    @classmethod
+    def read_from(cls, data, offset=0):
+        """(StringTable, offset after it)"""
+        (count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        strings = []
+        for _ in range(count):
+            (length,) = _LENGTH32.unpack_from(data, offset)
+            offset += _LENGTH32.size
+            strings.append(sys.intern(bytes(data[offset:offset + length]).decode('utf-8')))
+            offset += length
+        return cls(strings), offset
+
+class LeafResult:
+    """One analysis result in compact form
+
+    numbers is an array('d') in NUMERIC_FIELDS order, present a bitmask of
+    the numeric fields that exist and labels a tuple of str or None. region
+    holds the region health grid as (rows, cols, array('d') of ratios, cell
+    labels), recommendations and symptoms are tuples of interned strings and
+    everything else stays as JSON bytes, decoded by the rest property. Fields
+    read as attributes, e.g. result.disease_name or result.yellowing_ratio
+    (None when absent).
+    """
+
+    __slots__ = ('numbers', 'present', 'labels', 'region', 'recommendations', 'symptoms', 'rest_json')
+
+    def __init__(self, numbers, present, labels, region=None, recommendations=None, symptoms=None,
+                 rest_json=None):
+        self.numbers = numbers
+        self.present = present
+        self.labels = labels
+        self.region = region
+        self.recommendations = recommendations
+        self.symptoms = symptoms
+        self.rest_json = rest_json
+
+    @property
+    def rest(self):
+        """The remaining result dict (or None), decoded on every access"""
+        return json.loads(self.rest_json) if self.rest_json else None
+
+    @property
+    def region_health(self):
+        return _unpack_region(self.region) if self.region is not None else None
+
+    @classmethod
+    def from_dict(cls, result):
+        """Split an analyzer result dict; the input is not modified"""
+        rest = _copy_sections(result)
+        for key in DROPPED_FIELDS:
+            rest.pop(key, None)
+
+        numbers = array('d', bytes(_NUMBERS.size))
+        present = 0
+        emptied = set()
+
+        for index, (_, path, key, kind) in enumerate(NUMERIC_FIELDS):
+            container = _lookup(rest, path)
+            if container is not None and key in container and _is_number(container[key], kind):
+                numbers[index] = float(container.pop(key))
+                present |= 1 << index
+                emptied.add(path)
+
+        labels = []
+        for _, path, key in LABEL_FIELDS:
+            container = _lookup(rest, path)
+            if container is not None and isinstance(container.get(key), str):
+                labels.append(sys.intern(str(container.pop(key))))
+                emptied.add(path)
+            else:
+                labels.append(None)
+
+        # Sections whose every key moved into the layout are rebuilt by to_dict
+        for path in reversed(SECTION_PATHS):
+            if path in emptied and _lookup(rest, path) == {}:
+                del _lookup(rest, path[:-1])[path[-1]]
+                emptied.add(path[:-1])
+
+        region = _pack_region(rest.get('region_health'))
+        if region is not None:
+            del rest['region_health']
+        texts = {}
+        for key in TEXT_FIELDS:
+            texts[key] = _pack_texts(rest.get(key))
+            if texts[key] is not None:
+                del rest[key]
+
+        rest_json = json.dumps(rest, default=json_default, separators=(',', ':')).encode('utf-8') if rest else None
+        return cls(numbers, present, tuple(labels), region, texts['recommendations'], texts['symptoms'], rest_json)
+
+    def to_dict(self):
+        """The analyzer result dict this was made from, without timings"""
+        result = {}
+        for index, (_, path, key, kind) in enumerate(NUMERIC_FIELDS):
+            if self.present >> index & 1:
+                value = self.numbers[index]
+                _section(result, path)[key] = int(value) if kind == 'i' else bool(value) if kind == 'b' else value
+        for (_, path, key), value in zip(LABEL_FIELDS, self.labels):
+            if value is not None:
+                _section(result, path)[key] = value
+        if self.region is not None:
+            result['region_health'] = _unpack_region(self.region)
+        for key in TEXT_FIELDS:
+            values = getattr(self, key)
+            if values is not None:
+                result[key] = list(values)
+        if self.rest_json:
+            _merge(result, self.rest)
+        return result
+
+    def write(self, strings):
+        """Record bytes, with strings added to the StringTable strings"""
+        parts = [_HEADER.pack(MAGIC, LAYOUT_VERSION, self.present),
+                 self.numbers.tobytes() if sys.byteorder == 'little' else _swapped(self.numbers),
+                 _LABEL_REFS.pack(*(strings.ref(label) for label in self.labels))]
+
+        if self.region is None:
+            parts.append(_GRID.pack(0, 0))
+        else:
+            rows, cols, ratios, labels = self.region
+            parts.append(_GRID.pack(rows, cols))
+            parts.append(ratios.tobytes() if sys.byteorder == 'little' else _swapped(ratios))
+            parts.append(struct.pack(f'<{len(labels)}I', *(strings.ref(label) for label in labels)))
+
+        for key in TEXT_FIELDS:
+            values = getattr(self, key)
+            if values is None:
+                parts.append(_COUNT.pack(_NONE))
+            else:
+                parts.append(struct.pack(f'<I{len(values)}I', len(values), *(strings.ref(value) for value in values)))
+
+        rest = self.rest_json or b''
+        parts.append(_LENGTH32.pack(len(rest)) + rest)
+        return b''.join(parts)
+
+    @classmethod
+    def read(cls, data, offset, strings):
+        """(LeafResult, offset after it) for a record written against the StringTable strings"""
+        magic, version, present = _HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f"Not a CocoScan result record (layout {version})")
+        offset += _HEADER.size
+
+        numbers = _read_doubles(data, offset, len(NUMERIC_FIELDS))
+        offset += _NUMBERS.size
+
+        labels = tuple(strings.get(ref) for ref in _LABEL_REFS.unpack_from(data, offset))
+        offset += _LABEL_REFS.size
+
+        rows, cols = _GRID.unpack_from(data, offset)
+        offset += _GRID.size
+        region = None
+        if rows:
+            cells = rows * cols
+            ratios = _read_doubles(data, offset, cells * len(REGION_RATIOS))
+            offset += 8 * cells * len(REGION_RATIOS)
+            refs = struct.unpack_from(f'<{cells * len(REGION_LABELS)}I', data, offset)
+            offset += 4 * cells * len(REGION_LABELS)
+            region = (rows, cols, ratios, tuple(strings.get(ref) for ref in refs))
+
+        texts = []
+        for _ in TEXT_FIELDS:
+            (count,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            if count == _NONE:
+                texts.append(None)
+            else:
+                texts.append(tuple(strings.get(ref) for ref in struct.unpack_from(f'<{count}I', data, offset)))
+                offset += 4 * count
+
+        (length,) = _LENGTH32.unpack_from(data, offset)
+        offset += _LENGTH32.size
+        rest_json = bytes(data[offset:offset + length]) if length else None
+        return cls(numbers, present, labels, region, texts[0], texts[1], rest_json), offset + length
+
+    def to_bytes(self):
+        """Serialize with one struct layout, preceded by the record's own string table"""
+        strings = StringTable()
+        record = self.write(strings)
+        return strings.to_bytes() + record
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls.read_from(data)[0]
+
+    @classmethod
+    def read_from(cls, data, offset=0):
+        """(LeafResult, offset after it) for a to_bytes record starting at offset"""
+        strings, offset = StringTable.read_from(data, offset)
+        return cls.read(data, offset, strings)
+
+    def __reduce__(self):
+        # Worker processes pickle results through the compact layout
+        return (LeafResult.from_bytes, (self.to_bytes(),))
+
+    def __eq__(self, other):
+        return isinstance(other, LeafResult) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"LeafResult({self.disease_name!r}, {self.overall_confidence})"
+
+def _merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+def _swapped(numbers):
+    copy = array('d', numbers)
+    copy.byteswap()
+    return copy.tobytes()
+
+def _read_doubles(data, offset, count):
+    numbers = array('d')
+    numbers.frombytes(bytes(data[offset:offset + 8 * count]))
+    if sys.byteorder != 'little':
+        numbers.byteswap()
+    return numbers
+
+def _numeric_property(index, kind):
+    def getter(self):
+        if not self.present >> index & 1:
+            return None
+        value = self.numbers[index]
+        return int(value) if kind == 'i' else bool(value) if kind == 'b' else value
+    return property(getter)
+
+def _label_property(index):
+    return property(lambda self: self.labels[index])
+
+for _index, (_name, _, _, _kind) in enumerate(NUMERIC_FIELDS):
+    setattr(LeafResult, _name, _numeric_property(_index, _kind))
+for _index, _name in enumerate(LABEL_NAMES):
+    setattr(LeafResult, _name, _label_property(_index))
+
+def pack_results(results):
+    """One bytes blob for many LeafResults (or result dicts), sharing one string table"""
+    strings = StringTable()
+    records = [(result if isinstance(result, LeafResult) else LeafResult.from_dict(result)).write(strings)
+               for result in results]
+    return _COUNT.pack(len(records)) + strings.to_bytes() + b''.join(records)
+
+def unpack_results(data):
+    """LeafResults packed by pack_results"""
+    data = memoryview(data)
+    (count,) = _COUNT.unpack_from(data, 0)
+    strings, offset = StringTable.read_from(data, _COUNT.size)
+    results = []
+    for _ in range(count):
+        result, offset = LeafResult.read(data, offset, strings)
+        results.append(result)
+    return results
+
+def numeric_matrix(results):
+    """(N, len(NUMERIC_FIELDS)) float64 array of the numeric features, NaN where absent"""
+    import numpy as np
+
+    results = list(results)
+    matrix = np.frombuffer(b''.join(result.numbers.tobytes() for result in results),
+                           dtype=np.float64).reshape(len(results), len(NUMERIC_FIELDS)).copy()
+    bits = np.array([result.present for result in results], dtype=np.uint64)
+    for index in range(len(NUMERIC_FIELDS)):
+        matrix[(bits >> np.uint64(index)) & np.uint64(1) == 0, index] = np.nan
+    return matrix
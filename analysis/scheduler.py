@@ -0,0 +1,215 @@
+"""
+Analysis job scheduler for CocoScan
+A fixed pool of worker threads drains a bounded queue of analysis jobs.
+Every job gets an ID and can be cancelled, and results are delivered in
+submission order through a deliver hook (Clock.schedule_once in the app)
+"""
+
+import itertools
+import threading
+from collections import deque
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+class AnalysisJob:
+    """One submitted analysis; work(job) may poll job.cancelled between steps"""
+
+    def __init__(self, job_id, work, on_result=None, on_error=None):
+        self.job_id = job_id
+        self.work = work
+        self.on_result = on_result
+        self.on_error = on_error
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Ask the job to stop; queued jobs never run and no result is delivered"""
+        self._cancel_event.set()
+
+    def wait(self, timeout=None):
+        """Block until the job's outcome is delivered (after every earlier job's)"""
+        return self._done_event.wait(timeout)
+
+    def __repr__(self):
+        return f"AnalysisJob({self.job_id}, {self.state})"
+
+class QueueFullError(Exception):
+    """Raised by submit when the queue is full and overflow is 'reject'"""
+
+class AnalysisScheduler:
+    """Bounded job queue over a fixed worker pool with in-order result delivery
+
+    overflow decides what happens when max_queued jobs are already waiting:
+    'reject' raises QueueFullError (backpressure), 'drop_oldest' cancels the
+    oldest waiting job so the newest capture is analysed (coalescing).
+    deliver(callback) runs callbacks on the consumer's thread; by default
+    they run on the worker thread that finished the job.
+    """
+
+    def __init__(self, workers=1, max_queued=4, overflow='reject', deliver=None, name="analysis"):
+        if overflow not in ('reject', 'drop_oldest'):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self.deliver = deliver or (lambda callback: callback())
+
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._jobs = {}
+        self._finished = {}
+        self._next_delivery = 1
+        # Jobs ready for delivery in submission order, drained by one thread at a time
+        self._ready = deque()
+        self._delivery_lock = threading.Lock()
+        self._closed = False
+
+        self._threads = [threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, work, on_result=None, on_error=None):
+        """Queue work(job); returns the AnalysisJob"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Scheduler is shut down")
+
+            waiting = [job for job in self._queue if not job.cancelled]
+            if len(waiting) >= self.max_queued:
+                if self.overflow == 'reject':
+                    raise QueueFullError(f"{len(waiting)} analyses already waiting")
+                waiting[0].cancel()
+
+            job = AnalysisJob(next(self._ids), work, on_result, on_error)
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+            self._condition.notify()
+            return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel one job by ID; returns False if it is unknown or already delivered"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self):
+        """Cancel every queued and running job, e.g. when the screen is left"""
+        with self._condition:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    @property
+    def pending(self):
+        """Jobs submitted but not yet delivered"""
+        with self._condition:
+            return len(self._jobs)
+
+    def shutdown(self, wait=True, cancel=True):
+        """Stop the workers after the running jobs; queued jobs are cancelled unless cancel is False"""
+        if cancel:
+            self.cancel_all()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next_job(self):
+        """Next job to run, or None at shutdown or when cancelled jobs became deliverable"""
+        with self._condition:
+            while True:
+                finished = False
+                while self._queue:
+                    job = self._queue.popleft()
+                    if job.cancelled:
+                        self._finish(job, CANCELLED)
+                        finished = True
+                        continue
+                    job.state = RUNNING
+                    return job
+                if self._closed or finished:
+                    return None
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            self._deliver()
+            if job is None:
+                if self._closed:
+                    return
+                continue
+            try:
+                result = job.work(job)
+                state = CANCELLED if job.cancelled else DONE
+                job.result = result
+            except Exception as e:
+                state = CANCELLED if job.cancelled else FAILED
+                job.error = e
+            with self._condition:
+                self._finish(job, state)
+            self._deliver()
+
+    def _finish(self, job, state):
+        """Record a finished job, queue the jobs now deliverable in submission order (lock held)"""
+        job.state = state
+        self._finished[job.job_id] = job
+        while self._next_delivery in self._finished:
+            self._ready.append(self._finished.pop(self._next_delivery))
+            self._jobs.pop(self._next_delivery, None)
+            self._next_delivery += 1
+
+    def _deliver(self):
+        """Deliver ready jobs from one worker at a time, so submission order holds
+
+        A worker finding another one delivering leaves its jobs to it instead
+        of waiting; the deliverer checks the queue again after letting go.
+        """
+        while True:
+            if not self._delivery_lock.acquire(blocking=False):
+                return
+            try:
+                while True:
+                    with self._condition:
+                        if not self._ready:
+                            break
+                        job = self._ready.popleft()
+                    self._deliver_job(job)
+            finally:
+                self._delivery_lock.release()
+            with self._condition:
+                if not self._ready:
+                    return
+
+    def _deliver_job(self, job):
+        try:
+            # A job cancelled while running still completes, but its result is dropped
+            if job.cancelled or job.state == CANCELLED:
+                return
+            if job.state == DONE and job.on_result is not None:
+                self.deliver(lambda: job.on_result(job.result))
+            elif job.state == FAILED and job.on_error is not None:
+                self.deliver(lambda: job.on_error(job.error))
+        finally:
+            job._done_event.set()
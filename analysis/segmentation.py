@@ -0,0 +1,90 @@
+"""
+Fast leaf segmentation for CocoScan
+An excess-green vegetation index is thresholded on a small copy of the
+image, cleaned up with morphology and turned into a leaf mask and bounding box
+"""
+
+import cv2
+import numpy as np
+
+# Excess green (2G - R - B) above this is always vegetation, even when
+# Otsu splits a frame that is entirely leaf
+VEGETATION_THRESHOLD = 20
+
+class LeafROI:
+    """Leaf mask at segmentation scale plus a bounding box in relative coordinates"""
+
+    def __init__(self, mask, bbox):
+        self.mask = mask
+        # (x0, y0, x1, y1) as fractions of the image width and height
+        self.bbox = bbox
+
+    @property
+    def coverage(self):
+        """Fraction of the frame covered by leaf"""
+        return cv2.countNonZero(self.mask) / float(self.mask.size)
+
+    def crop_box(self, shape):
+        """Pixel (x0, y0, x1, y1) of the bounding box for an image of this shape"""
+        height, width = shape[:2]
+        fx0, fy0, fx1, fy1 = self.bbox
+        x0 = min(int(np.floor(fx0 * width)), width - 1)
+        y0 = min(int(np.floor(fy0 * height)), height - 1)
+        x1 = max(int(np.ceil(fx1 * width)), x0 + 1)
+        y1 = max(int(np.ceil(fy1 * height)), y0 + 1)
+        return x0, y0, x1, y1
+
+    def crop(self, img):
+        """(cropped image, leaf mask for the crop) at the image's resolution"""
+        x0, y0, x1, y1 = self.crop_box(img.shape)
+        height, width = img.shape[:2]
+        mask = cv2.resize(self.mask, (width, height), interpolation=cv2.INTER_NEAREST)
+        return img[y0:y1, x0:x1], mask[y0:y1, x0:x1]
+
+    def to_dict(self, shape):
+        """Summary for analysis results, bbox as [x, y, w, h] in pixels of shape"""
+        x0, y0, x1, y1 = self.crop_box(shape)
+        return {'found': True, 'bbox': [x0, y0, x1 - x0, y1 - y0], 'coverage': float(self.coverage)}
+
+def _fill_holes(mask):
+    """Fill background regions not connected to the border, e.g. lesions inside a leaf"""
+    padded = cv2.copyMakeBorder(mask, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    flood = padded.copy()
+    fill_mask = np.zeros((padded.shape[0] + 2, padded.shape[1] + 2), dtype=np.uint8)
+    cv2.floodFill(flood, fill_mask, (0, 0), 255)
+    holes = cv2.bitwise_not(flood)[1:-1, 1:-1]
+    return cv2.bitwise_or(mask, holes)
+
+def segment_leaf(img, max_side=256, min_area_ratio=0.02):
+    """Leaf ROI of a BGR image, or None when no leaf-sized vegetation is found"""
+    height, width = img.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width)))
+    small = img
+    if scale < 1.0:
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+    blue, green, red = cv2.split(small.astype(np.int16))
+    exg = np.clip(2 * green - red - blue, 0, 255).astype(np.uint8)
+
+    otsu, _ = cv2.threshold(exg, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    _, mask = cv2.threshold(exg, min(otsu, VEGETATION_THRESHOLD), 255, cv2.THRESH_BINARY)
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    # Keep only leaf-sized components
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    min_area = min_area_ratio * mask.size
+    keep = np.zeros(count, dtype=np.uint8)
+    keep[1:] = np.where(stats[1:, cv2.CC_STAT_AREA] >= min_area, 255, 0)
+    mask = keep[labels]
+    if not mask.any():
+        return None
+
+    mask = _fill_holes(mask)
+    x, y, w, h = cv2.boundingRect(mask)
+    small_height, small_width = mask.shape
+    bbox = (x / small_width, y / small_height, (x + w) / small_width, (y + h) / small_height)
+    return LeafROI(mask, bbox)
@@ -0,0 +1,21 @@
+"""
+JSON helpers for CocoScan analysis results
+Analysis results may still carry numpy scalars and arrays
+"""
+
+import json
+
+def json_default(value):
+    """Convert numpy values left in analysis results to plain JSON types"""
+    # Imported here so callers such as the UI do not pull numpy in at import time
+    import numpy as np
+
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_result(result, **kwargs):
+    """Serialize an analysis result to a JSON string"""
+    return json.dumps(result, default=json_default, **kwargs)
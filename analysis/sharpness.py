@@ -0,0 +1,47 @@
+"""
+Resolution-aware sharpness thresholds for CocoScan
+Laplacian variance grows as an image is downsampled, so thresholds tuned
+on capture-resolution photos are scaled to the resolution they are
+actually measured at
+"""
+
+import math
+
+import cv2
+
+# Laplacian variance gain after downsampling by each factor, fitted as
+# gain = a * threshold ** -b on blurred images/ captures near thresholds of
+# 10-200 (benchmarks/calibrate_sharpness.py). Blurry images gain more than
+# sharp ones, whose fine detail averages away; from 8x down thresholds
+# nearly merge, so thumbnails only tell heavy blur apart
+SHARPNESS_GAIN_FIT = {
+    1: (1.0, 0.0),
+    2: (16.8, 0.33),
+    4: (253.0, 0.74),
+    8: (1330.0, 0.93),
+    16: (2900.0, 0.97)
+}
+
+def laplacian_variance(img):
+    """Variance of the Laplacian of a gray or BGR image"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+def sharpness_gain(threshold, scale):
+    """Expected variance gain of a capture near threshold once downsampled by scale"""
+    if scale is None or scale <= 1.0 or threshold <= 0:
+        return 1.0
+    # Interpolate log a and b linearly in log2 scale, clamped to the fitted range
+    factors = sorted(SHARPNESS_GAIN_FIT)
+    position = min(math.log2(scale), math.log2(factors[-1]))
+    lower = max(k for k in factors if math.log2(k) <= position)
+    upper = min(k for k in factors if math.log2(k) >= position)
+    weight = 0.0 if upper == lower else (position - math.log2(lower)) / (math.log2(upper) - math.log2(lower))
+    (a0, b0), (a1, b1) = SHARPNESS_GAIN_FIT[lower], SHARPNESS_GAIN_FIT[upper]
+    log_a = math.log(a0) + (math.log(a1) - math.log(a0)) * weight
+    b = b0 + (b1 - b0) * weight
+    return max(math.exp(log_a - b * math.log(threshold)), 1.0)
+
+def scaled_sharpness_threshold(threshold, scale):
+    """Capture-resolution sharpness threshold translated to an image downsampled by scale"""
+    return threshold * sharpness_gain(threshold, scale)
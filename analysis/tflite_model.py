@@ -0,0 +1,130 @@
+"""
+TensorFlow Lite inference for the CocoScan disease model
+The interpreter is created once and reused for every prediction
+"""
+
+import threading
+
+import numpy as np
+
+def load_interpreter_class():
+    """Find an installed TFLite interpreter implementation"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+    except ImportError:
+        return None
+
+class TFLiteModel:
+    """Persistent TFLite interpreter with a reusable input tensor"""
+
+    def __init__(self, model_path, num_threads=None):
+        interpreter_class = load_interpreter_class()
+        if interpreter_class is None:
+            raise ImportError("No TFLite runtime installed (tflite-runtime, ai-edge-litert or tensorflow)")
+
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.interpreter = interpreter_class(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._lock = threading.Lock()
+
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        self.input_index = input_details['index']
+        self.output_index = output_details['index']
+        self.input_dtype = input_details['dtype']
+        self.output_dtype = output_details['dtype']
+        self.input_quantization = input_details.get('quantization', (0.0, 0))
+        self.output_quantization = output_details.get('quantization', (0.0, 0))
+        self.input_shape = tuple(int(d) for d in input_details['shape'])
+
+        # A batch dimension of -1 in the signature means the model can be resized
+        signature = input_details.get('shape_signature')
+        self.dynamic_batch = signature is not None and len(signature) > 0 and int(signature[0]) == -1
+
+    @property
+    def input_size(self):
+        """(width, height) the model expects"""
+        return self.input_shape[2], self.input_shape[1]
+
+    @property
+    def batch_size(self):
+        """Current batch size of the allocated input tensor"""
+        return self.input_shape[0]
+
+    def _resize_batch(self, batch_size):
+        """Reallocate the input tensor for a different batch size"""
+        shape = (batch_size,) + self.input_shape[1:]
+        self.interpreter.resize_tensor_input(self.input_index, shape)
+        self.interpreter.allocate_tensors()
+        self.input_shape = shape
+
+    def _fill_input(self, batch):
+        """Copy a normalized float batch straight into the input tensor memory"""
+        if np.issubdtype(self.input_dtype, np.integer):
+            scale, zero_point = self.input_quantization
+            if scale:
+                batch = batch / scale + zero_point
+            info = np.iinfo(self.input_dtype)
+            batch = np.clip(np.rint(batch), info.min, info.max)
+
+        # The tensor view must not outlive the copy, invoke() refuses live references
+        np.copyto(self.interpreter.tensor(self.input_index)(), batch, casting='unsafe')
+
+    def _read_output(self):
+        output = self.interpreter.get_tensor(self.output_index).astype(np.float32)
+        scale, zero_point = self.output_quantization
+        if scale and np.issubdtype(self.output_dtype, np.integer):
+            output = (output - zero_point) * scale
+        return output
+
+    def predict(self, batch):
+        """Class probabilities for a (N, H, W, C) batch from preprocess_image"""
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == 3:
+            batch = batch[np.newaxis]
+
+        with self._lock:
+            if batch.shape[0] != self.batch_size and self.dynamic_batch:
+                self._resize_batch(batch.shape[0])
+
+            if batch.shape[0] == self.batch_size:
+                self._fill_input(batch)
+                self.interpreter.invoke()
+                scores = self._read_output()
+            else:
+                # Fixed batch size: run the images one slice at a time
+                scores = []
+                step = self.batch_size
+                for start in range(0, batch.shape[0], step):
+                    part = batch[start:start + step]
+                    if part.shape[0] < step:
+                        padding = np.zeros((step - part.shape[0],) + part.shape[1:], dtype=part.dtype)
+                        part = np.concatenate([part, padding])
+                    self._fill_input(part)
+                    self.interpreter.invoke()
+                    scores.append(self._read_output())
+                scores = np.concatenate(scores)[:batch.shape[0]]
+
+        scores = scores.reshape(scores.shape[0], -1)
+        return to_probabilities(scores)
+
+def to_probabilities(scores):
+    """Apply softmax unless the model already outputs probabilities"""
+    sums = scores.sum(axis=1)
+    if np.all(scores >= 0) and np.allclose(sums, 1.0, atol=1e-3):
+        return scores
+    shifted = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
@@ -0,0 +1,358 @@
+"""
+Tiled analysis of very large images such as drone orthomosaics
+Overlapping tiles are read from disk one window at a time and analysed in
+parallel, so peak memory depends on the tile size, not the image size
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+import numpy as np
+
+from analysis.blobs import SPOT_MIN_AREA, LESION_MIN_AREA, LESION_CLOSE_SIZE, scaled_close_size
+from analysis.context import FeatureContext
+from analysis.color_lut import get_default_label_map
+from analysis.lbp import lbp_codes
+
+GRID_COLOR_CLASSES = ('healthy_green', 'yellowing', 'browning', 'necrosis')
+
+class NpyTileSource:
+    """Memory-mapped (H, W, 3) uint8 BGR .npy file, only the read windows are paged in"""
+
+    def __init__(self, path):
+        self.path = path
+        self.array = np.load(path, mmap_mode='r')
+        if self.array.ndim != 3 or self.array.shape[2] != 3:
+            raise ValueError(f"Expected an (H, W, 3) BGR array in {path}")
+
+    @property
+    def shape(self):
+        return self.array.shape[:2]
+
+    def read(self, y0, y1, x0, x1):
+        return np.array(self.array[y0:y1, x0:x1])
+
+    def close(self):
+        self.array = None
+
+class RasterioTileSource:
+    """Windowed reads from a GeoTIFF orthomosaic (needs the optional rasterio package)"""
+
+    def __init__(self, path):
+        import rasterio
+        from rasterio.windows import Window
+
+        self.path = path
+        self._window = Window
+        self.dataset = rasterio.open(path)
+        # Dataset handles are not safe to share between reader threads
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.dataset.height, self.dataset.width
+
+    def read(self, y0, y1, x0, x1):
+        with self._lock:
+            rgb = self.dataset.read([1, 2, 3], window=self._window(x0, y0, x1 - x0, y1 - y0))
+        return cv2.cvtColor(np.ascontiguousarray(rgb.transpose(1, 2, 0)), cv2.COLOR_RGB2BGR)
+
+    def close(self):
+        self.dataset.close()
+
+class ArrayTileSource:
+    """Tiles cut from an image already in memory"""
+
+    def __init__(self, img):
+        if img is None:
+            raise ValueError("ArrayTileSource needs an image")
+        self.img = img
+
+    @property
+    def shape(self):
+        return self.img.shape[:2]
+
+    def read(self, y0, y1, x0, x1):
+        return self.img[y0:y1, x0:x1]
+
+    def close(self):
+        self.img = None
+
+def open_tile_source(path):
+    """Pick the most memory-friendly tile reader for a file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return NpyTileSource(path)
+    if extension in ('.tif', '.tiff'):
+        try:
+            return RasterioTileSource(path)
+        except ImportError:
+            pass
+
+    # Formats without windowed reads are decoded once; convert very large
+    # mosaics to .npy (np.lib.format.open_memmap) to keep memory bounded
+    print(f"⚠️ No windowed reader for {path}, decoding the whole image")
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"Could not load image: {path}")
+    return ArrayTileSource(img)
+
+def iter_tiles(shape, tile_size=1024, overlap=64):
+    """Yield tiles with a non-overlapping core and a read window padded by overlap"""
+    height, width = shape
+    for row, y0 in enumerate(range(0, height, tile_size)):
+        for col, x0 in enumerate(range(0, width, tile_size)):
+            y1 = min(y0 + tile_size, height)
+            x1 = min(x0 + tile_size, width)
+            yield {
+                'row': row,
+                'col': col,
+                'core': (y0, y1, x0, x1),
+                'window': (max(0, y0 - overlap), min(height, y1 + overlap),
+                           max(0, x0 - overlap), min(width, x1 + overlap))
+            }
+
+def _core_parts(mask, core):
+    """8-connected blobs of the mask cut to the tile core: areas and the labels along the core border
+
+    Label i (from 1) has area areas[i - 1]; border arrays hold 0 for background.
+    """
+    y0, y1, x0, x1 = core
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(np.ascontiguousarray(mask[y0:y1, x0:x1]), connectivity=8)
+    return {
+        'areas': stats[1:, cv2.CC_STAT_AREA].astype(np.int64),
+        'top': labels[0].copy(),
+        'bottom': labels[-1].copy(),
+        'left': labels[:, 0].copy(),
+        'right': labels[:, -1].copy()
+    }
+
+class BlobMerger:
+    """Counts blobs larger than min_area across tiles, joining parts that touch over tile borders
+
+    Blobs inside a tile core are counted right away. Parts touching the core
+    border go into a union-find and are joined with the parts on the other
+    side as soon as both tiles are in. A tile's border labels are dropped once
+    all its neighbours have been added, so memory follows the tile frontier.
+    """
+
+    def __init__(self, rows, cols, min_area=0):
+        self.rows = rows
+        self.cols = cols
+        self.min_area = min_area
+        self.interior = 0
+        self.parent = []
+        self.areas = []
+        self.borders = {}
+        self.waiting = {}
+
+    def _find(self, node):
+        while self.parent[node] != node:
+            self.parent[node] = self.parent[self.parent[node]]
+            node = self.parent[node]
+        return node
+
+    def _union(self, a, b):
+        if a < 0 or b < 0:
+            return
+        a, b = self._find(a), self._find(b)
+        if a != b:
+            self.parent[b] = a
+            self.areas[a] += self.areas[b]
+
+    def _join_edges(self, a, b):
+        """Union the parts on two facing edges, including diagonal neighbours"""
+        pairs = [np.stack([a, b]), np.stack([a[:-1], b[1:]]), np.stack([a[1:], b[:-1]])]
+        pairs = np.concatenate(pairs, axis=1)
+        pairs = np.unique(pairs[:, (pairs >= 0).all(axis=0)], axis=1)
+        for first, second in pairs.T:
+            self._union(int(first), int(second))
+
+    def _join_tiles(self, first, second):
+        """Join two neighbouring tiles, first before second in row-major order"""
+        a, b = self.borders[first], self.borders[second]
+        if first[0] == second[0]:
+            self._join_edges(a['right'], b['left'])
+        elif first[1] == second[1]:
+            self._join_edges(a['bottom'], b['top'])
+        elif second[1] > first[1]:
+            self._union(int(a['bottom'][-1]), int(b['top'][0]))
+        else:
+            self._union(int(a['bottom'][0]), int(b['top'][-1]))
+
+    def _neighbours(self, row, col):
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if (dy or dx) and 0 <= row + dy < self.rows and 0 <= col + dx < self.cols:
+                    yield row + dy, col + dx
+
+    def add(self, row, col, parts):
+        """Add one tile's _core_parts"""
+        areas = parts['areas']
+        sides = ('top', 'bottom', 'left', 'right')
+        on_border = np.zeros(areas.size + 1, dtype=bool)
+        for side in sides:
+            on_border[parts[side]] = True
+        on_border[0] = False
+        self.interior += int((areas[~on_border[1:]] > self.min_area).sum())
+
+        # Border parts get global ids, background stays -1
+        local = np.flatnonzero(on_border)
+        ids = np.full(areas.size + 1, -1, dtype=np.int64)
+        ids[local] = np.arange(len(self.parent), len(self.parent) + local.size)
+        self.parent.extend(range(len(self.parent), len(self.parent) + local.size))
+        self.areas.extend(int(area) for area in areas[local - 1])
+
+        tile = (row, col)
+        self.borders[tile] = {side: ids[parts[side]] for side in sides}
+        self.waiting[tile] = sum(1 for _ in self._neighbours(row, col))
+        for neighbour in self._neighbours(row, col):
+            if neighbour in self.borders:
+                self._join_tiles(min(tile, neighbour), max(tile, neighbour))
+                for done in (tile, neighbour):
+                    self.waiting[done] -= 1
+        for done in [tile] + list(self._neighbours(row, col)):
+            if self.waiting.get(done) == 0:
+                del self.borders[done], self.waiting[done]
+
+    @property
+    def count(self):
+        """Blobs larger than min_area over every tile added so far"""
+        roots = {self._find(node) for node in range(len(self.parent))}
+        return self.interior + sum(1 for root in roots if self.areas[root] > self.min_area)
+
+def analyze_tile(source, tile):
+    """Mergeable colour, texture and pattern statistics for one tile core"""
+    wy0, wy1, wx0, wx1 = tile['window']
+    y0, y1, x0, x1 = tile['core']
+    ctx = FeatureContext(source.read(wy0, wy1, wx0, wx1))
+
+    # Core box in window coordinates
+    core = (y0 - wy0, y1 - wy0, x0 - wx0, x1 - wx0)
+    core_slice = (slice(core[0], core[1]), slice(core[2], core[3]))
+
+    counts = get_default_label_map().counts(ctx.labels[core_slice])
+    edge_pixels = cv2.countNonZero(ctx.edges[core_slice])
+
+    # LBP codes drop a one-pixel border, shift the core into code coordinates
+    codes = lbp_codes(ctx.gray)
+    code_slice = (slice(max(core[0] - 1, 0), max(core[1] - 1, 0)),
+                  slice(max(core[2] - 1, 0), max(core[3] - 1, 0)))
+    histogram = np.bincount(codes[code_slice].ravel(), minlength=256).astype(np.float64)
+    values = np.arange(256, dtype=np.float64)
+
+    # Tiles are read at capture resolution, so the blob thresholds apply as they are
+    close_size = scaled_close_size(LESION_CLOSE_SIZE, ctx.scale)
+    lesion_mask = cv2.morphologyEx(ctx.mask('lesion'), cv2.MORPH_CLOSE, np.ones((close_size, close_size), np.uint8))
+
+    return {
+        'row': tile['row'],
+        'col': tile['col'],
+        'pixels': (y1 - y0) * (x1 - x0),
+        'counts': counts,
+        'edge_pixels': edge_pixels,
+        'lbp_count': float(histogram.sum()),
+        'lbp_sum': float(histogram @ values),
+        'lbp_sq_sum': float(histogram @ (values * values)),
+        'spot_parts': _core_parts(ctx.mask('dark_spot'), core),
+        'lesion_parts': _core_parts(lesion_mask, core),
+        'fungal_area': float(cv2.countNonZero(ctx.mask('fungal')[core_slice]))
+    }
+
+def analyze_tiled(analyzer, source, tile_size=1024, overlap=64, workers=None,
+                  min_spot_area=SPOT_MIN_AREA, min_lesion_area=LESION_MIN_AREA):
+    """Run the colour, texture and pattern extractors tile by tile and merge the results
+
+    At most 2 * workers tiles are in flight, so peak memory is bounded by the
+    tile size. Blob areas are capture pixels, the same thresholds the
+    pyramid path scales to its levels. Returns global results in the
+    analyzer's usual shape plus a per-tile health grid.
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    height, width = source.shape
+    rows = (height + tile_size - 1) // tile_size
+    cols = (width + tile_size - 1) // tile_size
+
+    totals = {'pixels': 0, 'edge_pixels': 0, 'lbp_count': 0.0, 'lbp_sum': 0.0, 'lbp_sq_sum': 0.0,
+              'fungal_area': 0.0}
+    spots = BlobMerger(rows, cols, min_spot_area)
+    lesions = BlobMerger(rows, cols, min_lesion_area)
+    class_counts = {}
+    health_grid = [[None] * cols for _ in range(rows)]
+
+    def merge(stats):
+        for key in totals:
+            totals[key] += stats[key]
+        for name, count in stats['counts'].items():
+            class_counts[name] = class_counts.get(name, 0) + count
+        spots.add(stats['row'], stats['col'], stats['spot_parts'])
+        lesions.add(stats['row'], stats['col'], stats['lesion_parts'])
+
+        ratios = {name: stats['counts'][name] / stats['pixels'] for name in GRID_COLOR_CLASSES}
+        color_health, severity = analyzer.classify_coconut_colors(*(ratios[name] for name in GRID_COLOR_CLASSES))
+        cell = {f'{name}_ratio': float(ratio) for name, ratio in ratios.items()}
+        cell.update({'color_health': color_health, 'severity': severity})
+        health_grid[stats['row']][stats['col']] = cell
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for tile in iter_tiles((height, width), tile_size, overlap):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+            pending.add(executor.submit(analyze_tile, source, tile))
+        for future in pending:
+            merge(future.result())
+
+    pixels = float(totals['pixels'])
+    color_ratios = {name: count / pixels for name, count in class_counts.items()}
+    color_health, severity = analyzer.classify_coconut_colors(
+        *(color_ratios[name] for name in GRID_COLOR_CLASSES))
+
+    edge_density = totals['edge_pixels'] / pixels
+    if totals['lbp_count']:
+        lbp_mean = totals['lbp_sum'] / totals['lbp_count']
+        texture_variance = totals['lbp_sq_sum'] / totals['lbp_count'] - lbp_mean ** 2
+    else:
+        texture_variance = 0.0
+
+    spot_count = spots.count
+    lesion_count = lesions.count
+    wilting = edge_density > 0.15
+    fungal = totals['fungal_area'] / pixels > 0.05
+
+    return {
+        'image_shape': [height, width],
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'tiles': rows * cols,
+        'color_analysis': {
+            'healthy_green_ratio': float(color_ratios['healthy_green']),
+            'yellowing_ratio': float(color_ratios['yellowing']),
+            'browning_ratio': float(color_ratios['browning']),
+            'necrosis_ratio': float(color_ratios['necrosis']),
+            'color_health': color_health,
+            'severity': severity,
+            'coconut_specific': True
+        },
+        'color_classes': {name: float(ratio) for name, ratio in color_ratios.items()},
+        'texture_analysis': {
+            'edge_density': float(edge_density),
+            'texture_variance': float(texture_variance),
+            'texture_pattern': analyzer.classify_coconut_texture(edge_density, texture_variance),
+            'coconut_specific': True
+        },
+        'disease_patterns': {
+            'spots_detected': spot_count,
+            'lesions_detected': lesion_count,
+            'wilting_detected': wilting,
+            'fungal_growth': fungal,
+            'pattern_confidence': analyzer.calculate_pattern_confidence(
+                spot_count, lesion_count, wilting, fungal)
+        },
+        'health_grid': health_grid,
+        'tiled': True
+    }
@@ -0,0 +1,62 @@
+"""
+Background warm-up for the CocoScan analyzer
+Builds the LeafAnalyzer and primes the model off the UI thread so neither
+app start nor the first scan pays the cold-start cost
+"""
+
+import threading
+from concurrent.futures import Future
+
+class AnalyzerWarmup:
+    """Constructs and primes a LeafAnalyzer on a background thread
+
+    The readiness future resolves to the warm analyzer. Heavy imports
+    (cv2, numpy, the model runtime) only happen on the warm-up thread.
+    """
+
+    def __init__(self, analyzer_kwargs=None):
+        self.analyzer_kwargs = analyzer_kwargs or {}
+        self.future = Future()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """True once the analyzer is built and primed"""
+        return self.future.done() and self.future.exception() is None
+
+    def start(self):
+        """Start warming up in the background (safe to call more than once)"""
+        with self._start_lock:
+            if self._thread is None:
+                self.future.set_running_or_notify_cancel()
+                self._thread = threading.Thread(target=self._run, name="analyzer-warmup", daemon=True)
+                self._thread.start()
+        return self.future
+
+    def get(self, timeout=None):
+        """Wait for the warm analyzer, starting the warm-up if needed"""
+        return self.start().result(timeout)
+
+    def _run(self):
+        try:
+            from ai_leaf_analyzer import LeafAnalyzer
+            analyzer = LeafAnalyzer(**self.analyzer_kwargs)
+            self.prime(analyzer)
+            self.future.set_result(analyzer)
+        except Exception as e:
+            print(f"❌ Error warming up analyzer: {e}")
+            self.future.set_exception(e)
+
+    @staticmethod
+    def prime(analyzer):
+        """Run one dummy pass so allocations, kernels and lookup tables are ready"""
+        import numpy as np
+
+        width, height = analyzer.get_model_input_size()
+        if analyzer.model_loaded:
+            dummy_batch = np.zeros((1, height, width, 3), dtype=np.float32)
+            analyzer.run_ai_model(dummy_batch)
+
+        dummy_img = np.full((height, width, 3), [50, 150, 50], dtype=np.uint8)
+        analyzer.enhance_coconut_analysis({}, dummy_img, None)
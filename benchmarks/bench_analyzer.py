@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+CocoScan analyzer benchmarks
+Times analyze_leaf, every feature-registry stage and batch throughput on
+the images/ captures plus synthetic 720p, 1080p, 4K and 12MP leaves, and
+saves p50/p95 latency, images per second and peak RSS as JSON
+
+    python benchmarks/bench_analyzer.py
+    python benchmarks/bench_analyzer.py --repeat 3 --sizes 720p 4k --compare benchmarks/results/old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.profiling import set_profiling
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SYNTHETIC_SIZES = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+    '12mp': (4000, 3000)
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def peak_rss_mb(children=False):
+    """Peak resident set size so far of this process (or its finished children) in MB
+
+    The peak only ever grows, so each benchmark reports the high-water mark
+    reached by the end of it.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    scale = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+    return round(usage.ru_maxrss / scale, 1)
+
+def make_synthetic_leaf(width, height, seed=0):
+    """Deterministic leaf photo: sky background, green frond, yellowing and dark spots"""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), (200, 190, 180), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    axes = (int(width * 0.4), int(height * 0.33))
+    cv2.ellipse(img, center, axes, 15, 0, 360, (40, 150, 60), -1)
+    cv2.ellipse(img, (int(width * 0.35), int(height * 0.45)), (axes[0] // 4, axes[1] // 3), 0, 0, 360,
+                (30, 200, 220), -1)
+    for _ in range(40):
+        spot = (int(rng.integers(center[0] - axes[0] // 2, center[0] + axes[0] // 2)),
+                int(rng.integers(center[1] - axes[1] // 2, center[1] + axes[1] // 2)))
+        cv2.circle(img, spot, int(rng.integers(3, max(4, width // 200))), (15, 15, 15), -1)
+    # Sensor noise in int16 keeps the generator from dominating peak RSS
+    noise = np.empty(img.shape, dtype=np.int16)
+    cv2.setRNGSeed(seed)
+    cv2.randn(noise, 0, 6)
+    return cv2.add(img, noise, dtype=cv2.CV_8U)
+
+def write_synthetic_image(directory, name):
+    """Synthetic camera-like JPEG of a named size"""
+    width, height = SYNTHETIC_SIZES[name]
+    path = os.path.join(directory, f"synthetic_{name}.jpg")
+    cv2.imwrite(path, make_synthetic_leaf(width, height), [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return path
+
+def find_corpus(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+def latency_summary(latencies_ms):
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        'runs': int(values.size),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'mean_ms': round(float(values.mean()), 2),
+        'min_ms': round(float(values.min()), 2),
+        'images_per_second': round(1000.0 / float(values.mean()), 2) if values.mean() > 0 else None
+    }
+
+def bench_analyze_leaf(analyzer, name, paths, repeat):
+    """analyze_leaf latency over paths, with the per-stage breakdown from result timings"""
+    # One untimed pass so the first run does not pay for page cache and warm-up
+    for path in paths:
+        analyzer.analyze_leaf(path)
+
+    latencies = []
+    stages = {}
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            analysis = analyzer.analyze_leaf(path)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            for stage, record in analysis.get('timings', {}).items():
+                stages.setdefault(stage, []).append(record['wall_ms'])
+
+    result = {'name': f"analyze_leaf[{name}]", 'images': len(paths)}
+    result.update(latency_summary(latencies))
+    # Registry stages are incremental: shared planes (gray:*, labels:*, edges:*)
+    # are timed once and not again inside the extractors that read them
+    result['stages'] = {stage: {key: summary[key] for key in ('p50_ms', 'p95_ms', 'mean_ms')}
+                        for stage, summary in ((stage, latency_summary(values)) for stage, values in stages.items())}
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def bench_batch(analyzer, paths, workers, chunksize):
+    """analyze_batch throughput across worker processes"""
+    start = time.perf_counter()
+    failed = sum(1 for item in analyzer.analyze_batch(paths, workers=workers, chunksize=chunksize) if item.error)
+    elapsed = time.perf_counter() - start
+    return {
+        'name': 'analyze_batch',
+        'images': len(paths),
+        'failed': failed,
+        'workers': workers or os.cpu_count(),
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(len(paths) / elapsed, 2) if elapsed > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_worker_rss_mb': peak_rss_mb(children=True)
+    }
+
+def environment_info(analyzer):
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'analyzer': json.loads(analyzer.get_analyzer_fingerprint())
+    }
+
+def compare(current, previous):
+    """Print the p50 / throughput change of each benchmark against an earlier run"""
+    before = {bench['name']: bench for bench in previous.get('benchmarks', [])}
+    print("\n📊 Change against previous run:")
+    for bench in current['benchmarks']:
+        old = before.get(bench['name'])
+        if old is None:
+            continue
+        key = 'p50_ms' if 'p50_ms' in bench else 'images_per_second'
+        if old.get(key):
+            change = (bench[key] - old[key]) / old[key] * 100.0
+            print(f"   {bench['name']:<28} {key} {old[key]} -> {bench[key]} ({change:+.1f}%)")
+
+def print_summary(results):
+    for bench in results['benchmarks']:
+        if 'p50_ms' in bench:
+            print(f"⏱️ {bench['name']:<28} p50 {bench['p50_ms']:>8.1f} ms  p95 {bench['p95_ms']:>8.1f} ms  "
+                  f"{bench['images_per_second']:>6.2f} img/s  peak RSS {bench['peak_rss_mb']} MB")
+            slowest = sorted(bench['stages'].items(), key=lambda item: -item[1]['mean_ms'])[:5]
+            print("      slowest stages: " + ", ".join(f"{stage} {s['mean_ms']:.1f} ms"
+                                                      for stage, s in slowest if stage != 'total'))
+        else:
+            print(f"🚀 {bench['name']:<28} {bench['images']} images in {bench['seconds']} s  "
+                  f"{bench['images_per_second']} img/s  worker peak RSS {bench['peak_worker_rss_mb']} MB")
+
+def run(images_dir, sizes, repeat, workers, chunksize, batch=True):
+    set_profiling(True)
+    analyzer = LeafAnalyzer(cache=None)
+    results = environment_info(analyzer)
+    results['repeat'] = repeat
+    results['benchmarks'] = []
+
+    corpus = find_corpus(images_dir)
+    if corpus:
+        results['benchmarks'].append(bench_analyze_leaf(analyzer, 'corpus', corpus, repeat))
+    else:
+        print(f"⚠️ No images found in {images_dir}, running synthetic benchmarks only")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Smallest first, so each size's peak RSS is not masked by a larger one
+        synthetic = {}
+        for name in sorted(sizes, key=lambda size: SYNTHETIC_SIZES[size][0] * SYNTHETIC_SIZES[size][1]):
+            synthetic[name] = write_synthetic_image(tmp, name)
+            results['benchmarks'].append(bench_analyze_leaf(analyzer, name, [synthetic[name]], repeat))
+
+        if batch:
+            batch_paths = (corpus or list(synthetic.values())) * max(1, repeat)
+            results['benchmarks'].append(bench_batch(analyzer, batch_paths, workers, chunksize))
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CocoScan leaf analyzer")
+    parser.add_argument('--images', default=os.path.join(ROOT, 'images'), help='Capture corpus directory')
+    parser.add_argument('--sizes', nargs='*', default=list(SYNTHETIC_SIZES), choices=list(SYNTHETIC_SIZES),
+                        help='Synthetic image sizes to time')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over each image set')
+    parser.add_argument('--workers', type=int, default=None, help='Batch worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=4, help='Images sent to a batch worker at a time')
+    parser.add_argument('--no-batch', action='store_true', help='Skip the batch throughput benchmark')
+    parser.add_argument('--output', '-o', default=None,
+                        help='JSON results file (default: benchmarks/results/bench_<timestamp>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args.images, args.sizes, max(1, args.repeat), args.workers, args.chunksize, batch=not args.no_batch)
+    print_summary(results)
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(ROOT, 'benchmarks', 'results', f"bench_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
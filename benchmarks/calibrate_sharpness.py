@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Sharpness threshold calibration for CocoScan
+Blurs the images/ captures over a range of strengths, measures the
+Laplacian variance at full size and after 2x-16x INTER_AREA downsampling,
+prints the median gain near each threshold and fits gain = a * T ** -b
+per factor. analysis/sharpness.py keeps a rounded copy of the fit
+
+    python benchmarks/calibrate_sharpness.py
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+from analysis.sharpness import laplacian_variance
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+THRESHOLDS = (10, 20, 30, 50, 100, 200)
+SCALES = (2, 4, 8, 16)
+SIGMAS = (0.0,) + tuple(float(s) for s in np.geomspace(0.4, 10.0, 28))
+
+def load_images(directory):
+    """BGR captures in a directory"""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            img = cv2.imread(os.path.join(directory, name))
+            if img is not None:
+                images.append(img)
+    return images
+
+def measure(images, noise=0.5, seed=0):
+    """(full-size variance, {scale: variance}) for every image and blur strength"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    for img in images:
+        for sigma in SIGMAS:
+            blurred = cv2.GaussianBlur(img, (0, 0), sigma) if sigma else img.copy()
+            # A little sensor noise, as on a real capture
+            noisy = blurred.astype(np.float32) + rng.normal(0.0, noise, blurred.shape)
+            frame = np.clip(noisy, 0, 255).astype(np.uint8)
+            height, width = frame.shape[:2]
+            reduced = {}
+            for scale in SCALES:
+                size = (max(width // scale, 8), max(height // scale, 8))
+                reduced[scale] = laplacian_variance(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+            samples.append((laplacian_variance(frame), reduced))
+    return samples
+
+def gain_table(samples, spread=1.5):
+    """Median reduced/full variance ratio of the samples within spread of each threshold"""
+    table = {}
+    for threshold in THRESHOLDS:
+        near = [s for s in samples if threshold / spread <= s[0] <= threshold * spread]
+        table[threshold] = {scale: (float(np.median([s[1][scale] / s[0] for s in near])) if near else None)
+                            for scale in SCALES}
+        table[threshold]['samples'] = len(near)
+    return table
+
+def fit_gains(table):
+    """Least-squares (a, b) per scale of log gain = log a - b log threshold"""
+    fits = {}
+    for scale in SCALES:
+        points = [(np.log(t), np.log(g[scale])) for t, g in table.items() if g[scale]]
+        slope, intercept = np.polyfit([x for x, _ in points], [y for _, y in points], 1)
+        fits[scale] = (float(np.exp(intercept)), float(-slope))
+    return fits
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate sharpness thresholds across downsample factors")
+    parser.add_argument('--images', default=os.path.join(ROOT, 'images'), help="Directory of captures")
+    parser.add_argument('--noise', type=float, default=0.5, help="Gaussian sensor noise sigma")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        return 1
+
+    table = gain_table(measure(images, noise=args.noise))
+    print("threshold  " + "  ".join(f"x{scale:<6}" for scale in SCALES) + "  samples")
+    for threshold, gains in table.items():
+        cells = "  ".join(f"{gains[scale]:7.1f}" if gains[scale] else "      -" for scale in SCALES)
+        print(f"{threshold:9d}  {cells}  {gains['samples']}")
+    print()
+    for scale, (a, b) in fit_gains(table).items():
+        print(f"x{scale}: a={a:.1f} b={b:.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
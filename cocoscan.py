@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Headless CocoScan command line
+Scans image directories in parallel and streams results as JSON Lines
+
+Usage:
+    python -m cocoscan scan images/ --workers 4 --output scans.jsonl --save-db
+    python -m cocoscan import-analyses analysis_results/
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from analysis.batch import analyze_batch
+from analysis.serialization import json_default
+from database.analysis_log import AnalysisLog
+from database.db import (init_db, save_scans_batch, save_rejected_images, clear_rejected_images,
+                         get_scanned_image_paths)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff')
+
+def find_images(root):
+    """Walk a directory tree and yield image paths in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.abspath(os.path.join(dirpath, filename))
+
+def scan_row(item, user_id=None):
+    """Map a successful batch result onto a scans table row"""
+    return {
+        'user_id': user_id,
+        'leaf_type': item.result['leaf_name'],
+        'health_status': item.result['disease_name'],
+        'confidence': float(item.result['overall_confidence']),
+        'image_path': item.path,
+        'notes': 'Batch scan',
+        'phash': item.phash
+    }
+
+def scan_directory(root, workers=None, output=None, save_db=False, user_id=None,
+                   batch_size=50, rescan=False, chunksize=4, pre_gate=True, retry_rejected=False):
+    """Analyze every new image under root, return (analysed, failed, skipped)
+
+    With pre_gate, unusable or leafless photos get a short retake result and
+    are not recorded in the scans table; with save_db they are remembered as
+    rejected so reruns skip them too. retry_rejected analyses them again,
+    e.g. after the gate thresholds changed; the ones that pass now are saved
+    and no longer count as rejected.
+    """
+    paths = list(find_images(root))
+
+    skipped = 0
+    if not rescan:
+        # Only images without a recorded scan or pre-gate rejection are analysed again
+        recorded = {os.path.abspath(path) for path in get_scanned_image_paths(include_rejected=not retry_rejected)}
+        new_paths = [path for path in paths if path not in recorded]
+        skipped = len(paths) - len(new_paths)
+        paths = new_paths
+
+    if save_db:
+        init_db()
+
+    out = open(output, 'a') if output else sys.stdout
+    analysed = failed = 0
+    pending_rows = []
+    pending_rejections = []
+    accepted = []
+
+    try:
+        for item in analyze_batch(paths, workers=workers, chunksize=chunksize,
+                                  analyzer_kwargs={'pre_gate': pre_gate}):
+            out.write(json.dumps(item._asdict(), default=json_default) + "\n")
+            out.flush()
+
+            if item.error:
+                failed += 1
+                print(f"❌ {item.path}: {item.error}", file=sys.stderr)
+                continue
+
+            analysed += 1
+            gate_result = item.result.get('pre_gate')
+            if gate_result and not gate_result['ready']:
+                print(f"🚫 {item.path}: retake ({', '.join(gate_result['problems'])})", file=sys.stderr)
+                if save_db:
+                    pending_rejections.append((item.path, gate_result['problems']))
+                continue
+            if save_db:
+                accepted.append(item.path)
+                pending_rows.append(scan_row(item, user_id))
+                if len(pending_rows) >= batch_size:
+                    save_scans_batch(pending_rows)
+                    pending_rows = []
+    finally:
+        if save_db and pending_rows:
+            save_scans_batch(pending_rows)
+        if save_db and pending_rejections:
+            save_rejected_images(pending_rejections)
+        if save_db and accepted and (retry_rejected or rescan):
+            clear_rejected_images(accepted)
+        if output:
+            out.close()
+
+    return analysed, failed, skipped
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(prog='cocoscan', description='Headless CocoScan leaf analysis')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan = subparsers.add_parser('scan', help='Analyze every image in a directory tree')
+    scan.add_argument('directory', help='Directory to scan, e.g. images/')
+    scan.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    scan.add_argument('--chunksize', type=int, default=4, help='Images sent to a worker at a time')
+    scan.add_argument('--output', '-o', default=None, help='Append JSON Lines here instead of stdout')
+    scan.add_argument('--save-db', action='store_true', help='Record results in the scans table')
+    scan.add_argument('--user-id', type=int, default=None, help='User the recorded scans belong to')
+    scan.add_argument('--batch-size', type=int, default=50, help='Rows per database transaction')
+    scan.add_argument('--rescan', action='store_true', help='Also analyze images that already have a scan')
+    scan.add_argument('--no-pre-gate', action='store_true',
+                      help='Run the full pipeline even on blurry, dark or leafless photos')
+    scan.add_argument('--retry-rejected', action='store_true',
+                      help='Analyze photos the pre-gate rejected on earlier runs again')
+
+    importer = subparsers.add_parser('import-analyses',
+                                     help='Copy per-scan analysis JSON files into the analysis log')
+    importer.add_argument('directory', nargs='?', default='analysis_results', help='Directory of *_analysis_*.json files')
+    importer.add_argument('--log-dir', default=None, help='Analysis log directory (default: analysis_results/log)')
+    importer.add_argument('--remove-originals', action='store_true',
+                          help='Delete each JSON file once its record reads back from the log intact')
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"❌ Directory not found: {args.directory}", file=sys.stderr)
+        return 1
+
+    if args.command == 'import-analyses':
+        log = AnalysisLog(args.log_dir) if args.log_dir else AnalysisLog()
+        imported, skipped, failed = log.import_json_files(args.directory, remove_originals=args.remove_originals)
+        print(f"✅ Imported {imported} analyses, {skipped} already in the log, {failed} unreadable "
+              f"({log.stats()['segments']} segments)", file=sys.stderr)
+        return 0
+
+    analysed, failed, skipped = scan_directory(
+        args.directory,
+        workers=args.workers,
+        output=args.output,
+        save_db=args.save_db,
+        user_id=args.user_id,
+        batch_size=args.batch_size,
+        rescan=args.rescan,
+        chunksize=args.chunksize,
+        pre_gate=not args.no_pre_gate,
+        retry_rejected=args.retry_rejected
+    )
+    print(f"✅ Analysed {analysed} images, {failed} failed, {skipped} already recorded", file=sys.stderr)
+    return 0 if failed == 0 else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
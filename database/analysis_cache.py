@@ -0,0 +1,152 @@
+import sqlite3
+import hashlib
+import json
+import time
+
+from database.db import get_db_path
+from analysis.serialization import dumps_result
+
+def hash_image_bytes(image_bytes):
+    """Content hash of the raw image file bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def hash_file(path, chunk_size=1 << 20):
+    """Content hash of a file on disk, e.g. the model"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """Persistent analysis result cache keyed by image content and analyzer version
+
+    Entries are evicted least-recently-used first once the cache grows past
+    max_entries or max_bytes of serialized results.
+    """
+
+    def __init__(self, db_path=None, max_entries=500, max_bytes=20 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._table_ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path or get_db_path())
+        if not self._table_ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    image_hash TEXT NOT NULL,
+                    model_fingerprint TEXT NOT NULL,
+                    result_json TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_accessed REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_accessed
+                ON analysis_cache (last_accessed)
+            ''')
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    @staticmethod
+    def make_key(image_hash, analyzer_fingerprint):
+        """Cache key combining the image hash with analyzer/model version and config"""
+        return hashlib.sha256(f"{image_hash}:{analyzer_fingerprint}".encode('utf-8')).hexdigest()
+
+    def get(self, cache_key):
+        """Cached analysis result for a key, or None"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT result_json FROM analysis_cache WHERE cache_key = ?', (cache_key,))
+            row = cursor.fetchone()
+            if row:
+                cursor.execute('UPDATE analysis_cache SET last_accessed = ? WHERE cache_key = ?',
+                               (time.time(), cache_key))
+                conn.commit()
+
+            cursor.close()
+            conn.close()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            print(f"Analysis Cache Error: {e}")
+            return None
+
+    def put(self, cache_key, image_hash, model_fingerprint, result):
+        """Store an analysis result and evict old entries if over budget"""
+        try:
+            result_json = dumps_result(result)
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO analysis_cache
+                    (cache_key, image_hash, model_fingerprint, result_json, size_bytes, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (cache_key, image_hash, model_fingerprint, result_json,
+                  len(result_json.encode('utf-8')), time.time()))
+            self._evict(cursor)
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"Analysis Cache Error: {e}")
+            return False
+
+    def _evict(self, cursor):
+        """Drop least recently used entries beyond the entry and size budgets"""
+        cursor.execute('''
+            DELETE FROM analysis_cache WHERE cache_key IN (
+                SELECT cache_key FROM analysis_cache
+                ORDER BY last_accessed DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+        cursor.execute('''
+            DELETE FROM analysis_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key,
+                           SUM(size_bytes) OVER (ORDER BY last_accessed DESC) AS running_bytes
+                    FROM analysis_cache
+                ) WHERE running_bytes > ?
+            )
+        ''', (self.max_bytes,))
+
+    def invalidate_model(self, model_fingerprint):
+        """Remove entries produced by any other model, return how many were removed"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM analysis_cache WHERE model_fingerprint != ?', (model_fingerprint,))
+            removed = cursor.rowcount
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return removed
+        except Exception as e:
+            print(f"Analysis Cache Error: {e}")
+            return 0
+
+    def stats(self):
+        """Number of entries and total serialized size"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM analysis_cache')
+            entries, size_bytes = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return {'entries': entries, 'size_bytes': size_bytes}
+        except Exception as e:
+            print(f"Analysis Cache Error: {e}")
+            return {'entries': 0, 'size_bytes': 0}
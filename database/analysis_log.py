@@ -0,0 +1,243 @@
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+from analysis.serialization import json_default
+
+SEGMENT_PATTERN = re.compile(r'^segment_(\d{6})\.jsonl\.gz$')
+LEGACY_PATTERN = re.compile(r'^.+_analysis_(?P<stamp>\d{8}_\d{6})\.json$')
+
+class AnalysisLog:
+    """Append-only, size-rotated log of saved analyses
+
+    Every record is one JSON line compressed as its own gzip member, so a
+    segment file is a normal .jsonl.gz that streams with gzip.open, while
+    an offset index (sqlite, next to the segments) reads any single record
+    by record_id or scan_id without touching the rest. One process writes
+    to a log at a time.
+    """
+
+    def __init__(self, directory=os.path.join("analysis_results", "log"), max_segment_bytes=8 * 1024 * 1024):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._index_ready = False
+
+    def _connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite"))
+        if not self._index_ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS records (
+                    record_id INTEGER PRIMARY KEY,
+                    scan_id INTEGER,
+                    image_path TEXT,
+                    source TEXT,
+                    saved_at TEXT NOT NULL,
+                    segment INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_scan_id ON records(scan_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_source ON records(source)')
+            conn.commit()
+            self._index_ready = True
+        return conn
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f"segment_{segment:06d}.jsonl.gz")
+
+    def segments(self):
+        """Segment numbers on disk, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        found = (SEGMENT_PATTERN.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in found if match)
+
+    def append(self, analysis, image_path=None, scan_id=None, source=None, saved_at=None):
+        """Append one analysis; returns its record_id"""
+        saved_at = saved_at or datetime.now().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                record_id = conn.execute('SELECT COALESCE(MAX(record_id), 0) + 1 FROM records').fetchone()[0]
+                record = {
+                    'record_id': record_id,
+                    'scan_id': scan_id,
+                    'image_path': image_path,
+                    'source': source,
+                    'saved_at': saved_at,
+                    'analysis': analysis
+                }
+                line = json.dumps(record, default=json_default, separators=(',', ':')) + "\n"
+                member = gzip.compress(line.encode('utf-8'), mtime=0)
+
+                # Rotate once the current segment would grow past the size limit
+                segments = self.segments()
+                segment = segments[-1] if segments else 1
+                path = self.segment_path(segment)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size and size + len(member) > self.max_segment_bytes:
+                    segment += 1
+                    path = self.segment_path(segment)
+                    size = 0
+
+                with open(path, 'ab') as f:
+                    f.write(member)
+
+                conn.execute('''
+                    INSERT INTO records (record_id, scan_id, image_path, source, saved_at, segment, offset, length)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (record_id, scan_id, image_path, source, saved_at, segment, size, len(member)))
+                conn.commit()
+                return record_id
+            finally:
+                conn.close()
+
+    def _read_at(self, segment, offset, length):
+        with open(self.segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(gzip.decompress(f.read(length)))
+
+    def _locate(self, where, value):
+        conn = self._connect()
+        try:
+            return conn.execute(f'''
+                SELECT segment, offset, length FROM records WHERE {where} = ?
+                ORDER BY record_id DESC LIMIT 1
+            ''', (value,)).fetchone()
+        finally:
+            conn.close()
+
+    def get_record(self, record_id):
+        """Full record (record_id, scan_id, image_path, saved_at, analysis) or None"""
+        location = self._locate('record_id', record_id)
+        return self._read_at(*location) if location else None
+
+    def get_by_scan(self, scan_id):
+        """Latest analysis saved for a scan, or None"""
+        location = self._locate('scan_id', scan_id)
+        return self._read_at(*location)['analysis'] if location else None
+
+    def iter_records(self, segment=None):
+        """Stream records oldest first, from all segments or just one"""
+        for number in ([segment] if segment is not None else self.segments()):
+            with gzip.open(self.segment_path(number), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            records = conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+        finally:
+            conn.close()
+        segments = self.segments()
+        return {
+            'records': records,
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(self.segment_path(number)) for number in segments)
+        }
+
+    def rebuild_index(self):
+        """Recreate the offset index by walking every segment member by member"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM records')
+                for segment in self.segments():
+                    with open(self.segment_path(segment), 'rb') as f:
+                        data = memoryview(f.read())
+                    offset = 0
+                    while offset < len(data):
+                        text, length = _read_member(data, offset)
+                        record = json.loads(text)
+                        conn.execute('''
+                            INSERT OR REPLACE INTO records (record_id, scan_id, image_path, source, saved_at, segment, offset, length)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (record['record_id'], record['scan_id'], record['image_path'], record.get('source'),
+                              record['saved_at'], segment, offset, length))
+                        offset += length
+                conn.commit()
+                return conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+            finally:
+                conn.close()
+
+    def import_json_files(self, directory="analysis_results", remove_originals=False):
+        """Append the legacy one-file-per-scan JSON results; files already imported are skipped
+
+        Returns (imported, skipped, failed); files that are not valid JSON
+        (e.g. cut short by a failed dump) count as failed and are left alone.
+        The originals are kept unless remove_originals is set, in which case
+        each file is deleted once its record reads back from the log intact.
+        """
+        imported = skipped = failed = 0
+        conn = self._connect()
+        try:
+            known = dict(conn.execute('SELECT source, MAX(record_id) FROM records WHERE source IS NOT NULL GROUP BY source'))
+        finally:
+            conn.close()
+
+        for name in sorted(os.listdir(directory)):
+            match = LEGACY_PATTERN.match(name)
+            if not match:
+                continue
+            path = os.path.join(directory, name)
+            if name in known and not remove_originals:
+                skipped += 1
+                continue
+            try:
+                with open(path) as f:
+                    analysis = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping unreadable {name}: {e}")
+                failed += 1
+                continue
+            if name in known:
+                skipped += 1
+                self._remove_if_logged(path, known[name], analysis)
+                continue
+            try:
+                saved_at = datetime.strptime(match.group('stamp'), "%Y%m%d_%H%M%S").isoformat()
+                record_id = self.append(analysis, source=name, saved_at=saved_at)
+                imported += 1
+            except Exception as e:
+                print(f"Error importing {name}: {e}")
+                failed += 1
+                continue
+            if remove_originals:
+                self._remove_if_logged(path, record_id, analysis)
+        return imported, skipped, failed
+
+    def _remove_if_logged(self, path, record_id, analysis):
+        """Delete a legacy file only if its record reads back equal to it"""
+        try:
+            record = self.get_record(record_id)
+            if record is None or record['analysis'] != analysis:
+                print(f"⚠️ Keeping {os.path.basename(path)}: logged record {record_id} does not match")
+                return False
+            os.remove(path)
+            return True
+        except Exception as e:
+            print(f"Error removing {os.path.basename(path)}: {e}")
+            return False
+
+def _read_member(data, offset, chunk_size=64 * 1024):
+    """(text, compressed length) of the gzip member starting at offset"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    parts = []
+    position = offset
+    while not decompressor.eof:
+        chunk = data[position:position + chunk_size]
+        if not chunk:
+            raise ValueError(f"Truncated record at offset {offset}")
+        parts.append(decompressor.decompress(chunk))
+        position += len(chunk)
+    length = position - offset - len(decompressor.unused_data)
+    return b''.join(parts).decode('utf-8'), length
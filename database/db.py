@@ -2,6 +2,11 @@ import sqlite3
 import os
 from datetime import datetime
 
+from analysis.phash import CHUNK_COUNT, split_hash, chunk_radius, chunk_neighbours, \
+    hamming_distance, to_signed64, from_signed64
+
+PHASH_CHUNK_COLUMNS = [f'phash_{i}' for i in range(CHUNK_COUNT)]
+
 def get_db_path():
     """Get the database file path for mobile storage"""
     try:
@@ -57,6 +62,8 @@ def init_db():
         )
     ''')
     
+    ensure_phash_columns(cursor)
+    
     # Create leaf_types table for categorization
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS leaf_types (
@@ -78,6 +85,9 @@ def init_db():
         )
     ''')
     
+    # Images the pre-gate turned away, so batch reruns skip them
+    ensure_rejected_table(cursor)
+    
     # Insert default leaf types - Coconut focused
     default_leaf_types = [
         ('Coconut', 'Cocos nucifera', 'Coconut palm leaves - Primary focus', 'Lethal yellowing, Root wilt, Bud rot, Stem bleeding'),
@@ -111,6 +121,29 @@ def init_db():
     conn.commit()
     conn.close()
 
+def ensure_phash_columns(cursor):
+    """Add the perceptual hash columns and chunk indexes to older scans tables"""
+    cursor.execute('PRAGMA table_info(scans)')
+    existing = {row[1] for row in cursor.fetchall()}
+    
+    for column in ['phash'] + PHASH_CHUNK_COLUMNS:
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE scans ADD COLUMN {column} INTEGER')
+    
+    # One index per 16-bit chunk for multi-index Hamming search
+    for column in PHASH_CHUNK_COLUMNS:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_scans_{column} ON scans ({column})')
+
+def ensure_rejected_table(cursor):
+    """Create the table of pre-gate rejected images on older databases"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rejected_images (
+            image_path TEXT PRIMARY KEY,
+            problems TEXT,
+            rejected_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
 def create_user(username, password_hash, email=None):
     """Create a new user account"""
     try:
@@ -211,6 +244,170 @@ def save_scan_with_error(user_id, leaf_type, health_status, confidence, image_pa
     except Exception as e:
         return None, str(e)
 
+def save_scans_batch(scans):
+    """Save many scan results in a single transaction, return the number saved"""
+    try:
+        db_path = get_db_path()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        ensure_phash_columns(cursor)
+        
+        def phash_values(scan):
+            phash = scan.get('phash')
+            if phash is None:
+                return [None] * (1 + len(PHASH_CHUNK_COLUMNS))
+            return [to_signed64(phash)] + split_hash(phash)
+        
+        cursor.executemany('''
+            INSERT INTO scans (user_id, leaf_type, health_status, confidence, 
+                              image_path, notes, location, weather_conditions,
+                              phash, phash_0, phash_1, phash_2, phash_3)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [[scan.get('user_id'), scan['leaf_type'], scan['health_status'], scan['confidence'],
+               scan.get('image_path'), scan.get('notes'), scan.get('location'),
+               scan.get('weather_conditions')] + phash_values(scan) for scan in scans])
+        
+        saved = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return saved
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return 0
+
+def save_rejected_images(rejections):
+    """Record (image_path, problems) pairs the pre-gate rejected, return the number saved"""
+    try:
+        db_path = get_db_path()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        ensure_rejected_table(cursor)
+        cursor.executemany('''
+            INSERT OR REPLACE INTO rejected_images (image_path, problems)
+            VALUES (?, ?)
+        ''', [(image_path, ', '.join(problems)) for image_path, problems in rejections])
+        
+        saved = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return saved
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return 0
+
+def clear_rejected_images(image_paths=None):
+    """Forget pre-gate rejections (of image_paths, or all), return the number removed"""
+    try:
+        db_path = get_db_path()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        ensure_rejected_table(cursor)
+        if image_paths is None:
+            cursor.execute('DELETE FROM rejected_images')
+        else:
+            cursor.executemany('DELETE FROM rejected_images WHERE image_path = ?',
+                               [(image_path,) for image_path in image_paths])
+        
+        removed = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return removed
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return 0
+
+def get_scanned_image_paths(include_rejected=True):
+    """Get the set of image paths that already have a recorded scan (or were rejected by the pre-gate)"""
+    try:
+        db_path = get_db_path()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT DISTINCT image_path FROM scans WHERE image_path IS NOT NULL')
+        results = {row[0] for row in cursor.fetchall()}
+        
+        if include_rejected:
+            ensure_rejected_table(cursor)
+            cursor.execute('SELECT image_path FROM rejected_images')
+            results.update(row[0] for row in cursor.fetchall())
+        
+        cursor.close()
+        conn.close()
+        return results
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return set()
+
+def set_scan_phash(scan_id, phash):
+    """Store the perceptual hash of a saved scan"""
+    try:
+        db_path = get_db_path()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        ensure_phash_columns(cursor)
+        
+        chunks = split_hash(phash)
+        assignments = ', '.join(f'{column} = ?' for column in ['phash'] + PHASH_CHUNK_COLUMNS)
+        cursor.execute(f'UPDATE scans SET {assignments} WHERE id = ?',
+                       [to_signed64(phash)] + chunks + [scan_id])
+        
+        updated = cursor.rowcount > 0
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return updated
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return False
+
+def find_near_duplicate_scans(phash, max_distance=6, user_id=None, limit=5):
+    """Find scans whose perceptual hash is within max_distance bits
+    
+    Uses multi-index hashing: any match must agree with the query on at least
+    one 16-bit chunk up to a small radius, so only those candidates are read
+    through the chunk indexes before the exact Hamming distance is checked.
+    Returns a list of (scan_id, image_path, distance), closest first.
+    """
+    try:
+        db_path = get_db_path()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        ensure_phash_columns(cursor)
+        
+        radius = chunk_radius(max_distance)
+        conditions = []
+        params = []
+        for column, chunk in zip(PHASH_CHUNK_COLUMNS, split_hash(phash)):
+            values = chunk_neighbours(chunk, radius)
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        
+        query = f"SELECT id, image_path, phash FROM scans WHERE ({' OR '.join(conditions)})"
+        if user_id:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+        cursor.execute(query, params)
+        
+        matches = []
+        for scan_id, image_path, stored in cursor.fetchall():
+            distance = hamming_distance(phash, from_signed64(stored))
+            if distance <= max_distance:
+                matches.append((scan_id, image_path, distance))
+        
+        cursor.close()
+        conn.close()
+        matches.sort(key=lambda match: (match[2], -match[0]))
+        return matches[:limit]
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return []
+
 def get_user_scans(user_id, limit=50):
     """Get scan history for a specific user"""
     try:
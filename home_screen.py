@@ -15,13 +15,15 @@ from kivy.properties import StringProperty, BooleanProperty
 from kivy.graphics import Color, Rectangle
 import os
 import datetime
-import cv2
-import numpy as np
-import threading
 
-from database.db import get_user_scans, get_scan_statistics, save_scan, get_leaf_types, get_health_statuses, save_scan_with_error
+from database.db import get_user_scans, get_scan_statistics, save_scan, get_leaf_types, get_health_statuses, save_scan_with_error, \
+    set_scan_phash, find_near_duplicate_scans
 from ui.clickable_logo import ClickableLogo, StyledClickableLogo
-from ai_leaf_analyzer import LeafAnalyzer
+# cv2, numpy and the analyzer are imported lazily so they never delay the first frame
+from analysis.warmup import AnalyzerWarmup
+from analysis.phash import dhash_file, dhash_image
+from analysis.scheduler import AnalysisScheduler, QueueFullError
+from database.analysis_cache import AnalysisCache
 
 LOGO_URL = "assets/cocoscan.png"
 
@@ -83,8 +85,19 @@ class HomeScreen(Screen):
         super().__init__(**kwargs)
         self.current_user_id = None
         
-        # Initialize AI analyzer
-        self.ai_analyzer = LeafAnalyzer()
+        # AI analyzer is built and primed in the background (see start_analyzer_warmup)
+        self.analyzer_warmup = AnalyzerWarmup({'cache': AnalysisCache(), 'pre_gate': True})
+        
+        # Live preview quality checks per second while the camera is open
+        self.live_gate_rate = 4
+        self.live_gate_event = None
+        self.live_gate_result = None
+        
+        # One analysis at a time (the analyzer is shared), a few captures may
+        # wait, results reach the UI thread in capture order
+        self.analysis_scheduler = AnalysisScheduler(
+            workers=1, max_queued=3,
+            deliver=lambda callback: Clock.schedule_once(lambda dt: callback()))
         
         layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
 
@@ -108,6 +121,15 @@ class HomeScreen(Screen):
 
         self.add_widget(layout)
 
+    @property
+    def ai_analyzer(self):
+        """The warm LeafAnalyzer, waiting for the background warm-up if needed"""
+        return self.analyzer_warmup.get()
+
+    def start_analyzer_warmup(self, *_):
+        """Build the analyzer and run a dummy inference off the UI thread"""
+        self.analyzer_warmup.start()
+
     def set_user_id(self, user_id):
         """Set the current user ID"""
         self.current_user_id = user_id
@@ -524,6 +546,10 @@ class HomeScreen(Screen):
                 camera_layout.add_widget(Label(text=f"Camera not available: {e2}"))
                 self.camera = None
         
+        # Live "ready to capture" indicator
+        self.live_gate_label = Label(text="⏳ Checking camera preview...", size_hint=(1, 0.1))
+        camera_layout.add_widget(self.live_gate_label)
+        
         # Simple camera controls
         controls_layout = BoxLayout(orientation='horizontal', spacing=10, size_hint=(1, 0.2))
         
@@ -543,7 +569,43 @@ class HomeScreen(Screen):
             content=camera_layout,
             size_hint=(0.9, 0.8)
         )
+        self.camera_popup.bind(on_dismiss=self.stop_live_quality_gate)
         self.camera_popup.open()
+        
+        if self.camera is not None:
+            self.start_live_quality_gate()
+
+    def start_live_quality_gate(self, source=None):
+        """Check downsampled preview frames at live_gate_rate and update the indicator"""
+        from analysis.live_gate import FrameQualityGate, KivyCameraFrameSource
+        
+        self.stop_live_quality_gate()
+        self.live_gate = FrameQualityGate()
+        self.live_gate_source = source or KivyCameraFrameSource(self.camera, self.live_gate.max_side)
+        self.live_gate_result = None
+        self.live_gate_event = Clock.schedule_interval(self.update_live_quality, 1.0 / self.live_gate_rate)
+
+    def update_live_quality(self, dt):
+        """Run the cheap quality gate on the latest preview frame"""
+        try:
+            frame = self.live_gate_source.read()
+            if frame is None:
+                return
+            self.live_gate_result = self.live_gate.check(frame, self.live_gate_source.scale)
+            
+            if self.live_gate_result['ready']:
+                self.live_gate_label.text = "✅ Ready to capture"
+            else:
+                self.live_gate_label.text = f"⚠️ Hold on: {', '.join(self.live_gate_result['problems'])}"
+        except Exception as e:
+            print(f"Error checking preview quality: {e}")
+
+    def stop_live_quality_gate(self, *args):
+        """Stop checking preview frames"""
+        if self.live_gate_event is not None:
+            self.live_gate_event.cancel()
+            self.live_gate_event = None
+            self.live_gate_source.close()
 
     def capture_image(self, instance):
         """Capture HD image from camera"""
@@ -551,8 +613,15 @@ class HomeScreen(Screen):
             self.show_error("Camera not available")
             return
             
+        # Frames the live gate rejected never reach the analysis pipeline
+        if self.live_gate_result is not None and not self.live_gate_result['ready']:
+            self.show_error(f"Photo not ready: {', '.join(self.live_gate_result['problems'])}")
+            return
+            
         try:
             if self.camera.play:
+                self.stop_live_quality_gate()
+                
                 # Create images directory if it doesn't exist
                 images_dir = "images"
                 if not os.path.exists(images_dir):
@@ -564,11 +633,15 @@ class HomeScreen(Screen):
                 filename = f"leaf_capture_{timestamp}_{resolution}.png"
                 filepath = os.path.join(images_dir, filename)
                 
-                # Capture the image
-                self.camera.export_to_png(filepath)
+                # Take the frame pixels straight from the camera texture
+                from analysis.image_io import texture_to_bgr, BackgroundImageWriter
+                frame = texture_to_bgr(self.camera.texture)
+                self.last_captured_image = frame
                 
-                # Store the image for AI analysis
-                self.last_captured_image = cv2.imread(filepath)
+                # The PNG is written in the background while the frame is analysed
+                if not hasattr(self, 'image_writer'):
+                    self.image_writer = BackgroundImageWriter()
+                pending_write = self.image_writer.write(filepath, frame)
                 
                 # Close camera popup
                 self.camera_popup.dismiss()
@@ -577,7 +650,7 @@ class HomeScreen(Screen):
                 self.show_success(f"HD Image captured: {filename}")
                 
                 # Process the scan
-                self.process_scan_result("Healthy", 0.95, filepath)
+                self.process_scan_result("Healthy", 0.95, filepath, image=frame, pending_write=pending_write)
             else:
                 self.show_error("Camera is not playing")
                 
@@ -643,59 +716,148 @@ class HomeScreen(Screen):
         self.preview_popup.dismiss()
         Clock.schedule_once(lambda dt: self.show_camera_capture(), 0.1)
 
-    def process_scan_result(self, health_status, confidence, image_path):
-        """Process and save scan result with AI analysis (now responsive, with error reporting)"""
+    def process_scan_result(self, health_status, confidence, image_path, image=None, pending_write=None):
+        """Process and save scan result with AI analysis (now responsive, with error reporting)
+
+        image is an already decoded BGR frame for image_path, pending_write a
+        Future for the background write of that file. The analysis runs as a
+        job on the analysis scheduler; returns the job, or None if the queue is full.
+        """
         if not self.current_user_id:
             self.show_error("Please login first")
-            return
+            return None
 
-        self.show_ai_analysis_progress()  # Show progress popup immediately
+        user_id = self.current_user_id
 
-        def background_task():
+        def analyze(job):
+            # Partial results update the progress popup while later stages run
+            def on_progress(stage, partial):
+                if not job.cancelled:
+                    Clock.schedule_once(lambda dt: self.update_ai_analysis_progress(stage, partial))
+
+            # Wait for the background warm-up instead of paying cold-start cost here
+            analyzer = self.analyzer_warmup.get()
+
+            # Look for a near-identical earlier shot before re-analyzing
+            phash = None
+            duplicate = None
             try:
-                # Perform AI analysis (heavy work)
-                analysis_results = self.ai_analyzer.analyze_leaf(image_path)
-
-                # Check for Opisina arenosella detection
-                if analysis_results.get('disease_name', '').strip().lower() == 'opisina arenosella':
-                    Clock.schedule_once(lambda dt: self.show_success("Opisina arenosella detected in the image!"))
-
-                # Save analysis results
-                self.ai_analyzer.save_analysis(analysis_results, image_path)
-
-                # Use AI results for database
-                ai_health_status = analysis_results['disease_name']
-                ai_confidence = analysis_results['overall_confidence']
-                ai_leaf_type = analysis_results['leaf_name']
-
-                # Save to database with AI results (with error reporting)
-                scan_id, db_error = save_scan_with_error(
-                    user_id=self.current_user_id,
-                    leaf_type=ai_leaf_type,
-                    health_status=ai_health_status,
-                    confidence=ai_confidence,
-                    image_path=image_path
-                )
+                phash = dhash_image(image) if image is not None else dhash_file(image_path)
+                duplicates = find_near_duplicate_scans(phash, user_id=user_id, limit=1)
+                duplicate = duplicates[0] if duplicates else None
+            except Exception as e:
+                print(f"Error checking for duplicate scans: {e}")
+
+            # Re-use the analysis saved for a near-identical earlier shot; this
+            # photo's own quality and leaf colours are still checked against it
+            analysis_results = None
+            if duplicate:
+                if image is not None:
+                    analysis_results = analyzer.reuse_duplicate_analysis(duplicate, image)
+                else:
+                    decoded, decode_info = analyzer.decode_image(image_path)
+                    if decoded is not None:
+                        analysis_results = analyzer.reuse_duplicate_analysis(duplicate, decoded, decode_info['scale'])
+            reused = analysis_results is not None
+            if analysis_results is None:
+                if image is not None:
+                    # Analyse the in-memory frame, no disk round trip
+                    analysis_results = analyzer.analyze_array(image, source=image_path, on_progress=on_progress)
+                else:
+                    # Perform AI analysis (heavy work)
+                    analysis_results = analyzer.analyze_leaf(image_path, on_progress=on_progress)
+
+            # The scan record points at the image file, so it must exist by now
+            if pending_write is not None:
+                pending_write.result()
+
+            # Photos rejected by the pre-gate are not recorded as scans
+            gate_result = analysis_results.get('pre_gate')
+            if gate_result and not gate_result['ready']:
+                return {'retake': gate_result}
+
+            # Nothing is recorded for scans cancelled while they were analysed
+            if job.cancelled:
+                return None
+
+            if duplicate:
+                # Shown with the result either way, so the user can compare the two shots
+                analysis_results['near_duplicate_of'] = {
+                    'scan_id': duplicate[0],
+                    'image_path': duplicate[1],
+                    'hamming_distance': duplicate[2],
+                    'analysis_reused': reused
+                }
+
+            # Save to database with AI results (with error reporting)
+            scan_id, db_error = save_scan_with_error(
+                user_id=user_id,
+                leaf_type=analysis_results['leaf_name'],
+                health_status=analysis_results['disease_name'],
+                confidence=analysis_results['overall_confidence'],
+                image_path=image_path
+            )
+            if scan_id and phash is not None:
+                set_scan_phash(scan_id, phash)
 
-                def show_results(dt):
-                    if scan_id:
-                        self.show_ai_analysis_results(analysis_results, scan_id)
-                    else:
-                        self.show_error(f"Failed to save scan: {db_error}")
+            # Save analysis results, indexed by the new scan
+            analyzer.save_analysis(analysis_results, image_path, scan_id=scan_id)
 
-                Clock.schedule_once(show_results)
+            return {'analysis': analysis_results, 'scan_id': scan_id, 'db_error': db_error}
 
-            except Exception as e:
-                Clock.schedule_once(lambda dt: self.show_error(f"Error processing scan: {e}"))
+        try:
+            job = self.analysis_scheduler.submit(analyze, on_result=self.show_scan_outcome,
+                                                 on_error=self.show_scan_error)
+        except QueueFullError:
+            self.show_error("Still analysing earlier scans, please wait a moment")
+            return None
+
+        # One progress popup covers every queued scan
+        if self.analysis_scheduler.pending <= 1 or not hasattr(self, 'progress_popup'):
+            self.show_ai_analysis_progress()
+        return job
+
+    def dismiss_scan_progress(self):
+        """Close the shared progress popup once no scan job is left to analyse"""
+        if hasattr(self, 'progress_popup') and not self.analysis_scheduler.pending:
+            self.progress_popup.dismiss()
+
+    def show_scan_outcome(self, outcome):
+        """Show a finished scan job's result (UI thread, in submission order)"""
+        self.dismiss_scan_progress()
+
+        gate_result = outcome.get('retake')
+        if gate_result:
+            self.show_error(f"Please retake the photo: {', '.join(gate_result['problems'])}")
+            return
+
+        analysis_results = outcome['analysis']
+
+        # Check for Opisina arenosella detection
+        if analysis_results.get('disease_name', '').strip().lower() == 'opisina arenosella':
+            self.show_success("Opisina arenosella detected in the image!")
+
+        if outcome['scan_id']:
+            self.show_ai_analysis_results(analysis_results, outcome['scan_id'])
+        else:
+            self.show_error(f"Failed to save scan: {outcome['db_error']}")
 
-        threading.Thread(target=background_task).start()
+    def show_scan_error(self, error):
+        """Report a scan job that raised (UI thread)"""
+        self.dismiss_scan_progress()
+        self.show_error(f"Error processing scan: {error}")
 
     def show_ai_analysis_progress(self):
         """Show AI analysis progress popup"""
         progress_layout = BoxLayout(orientation='vertical', spacing=10, padding=20)
         progress_layout.add_widget(Label(text="🤖 AI Analysis in Progress...", font_size="18sp"))
         progress_layout.add_widget(Label(text="Analyzing leaf image for disease detection", font_size="14sp"))
-        progress_layout.add_widget(Label(text="Please wait...", font_size="12sp"))
+        
+        # Filled in stage by stage as partial results arrive
+        self.progress_details = Label(text="", font_size="14sp")
+        progress_layout.add_widget(self.progress_details)
+        self.progress_status = Label(text="Please wait...", font_size="12sp")
+        progress_layout.add_widget(self.progress_status)
         
         self.progress_popup = Popup(
             title="AI Analysis",
@@ -704,11 +866,40 @@ class HomeScreen(Screen):
         )
         self.progress_popup.open()
 
+    def update_ai_analysis_progress(self, stage, partial):
+        """Show what is known so far while the remaining analysis stages run"""
+        if not hasattr(self, 'progress_details'):
+            return
+        
+        lines = []
+        if 'disease_name' in partial:
+            lines.append(f"🔍 Diagnosis: {partial['disease_name']} ({partial['disease_confidence']:.0%})")
+        if 'image_quality' in partial:
+            lines.append(f"📸 Image quality: {partial['image_quality'].get('quality_level', 'Unknown')}")
+        if 'color_analysis' in partial:
+            lines.append(f"🎨 Color health: {partial['color_analysis'].get('color_health', 'Unknown')}")
+        if 'texture_analysis' in partial:
+            lines.append(f"🔍 Texture: {partial['texture_analysis'].get('texture_pattern', 'Unknown')}")
+        if 'disease_patterns' in partial:
+            found = [name.replace('_', ' ') for name, pattern in partial['disease_patterns'].items()
+                     if isinstance(pattern, dict) and pattern.get('detected')]
+            lines.append(f"🦠 Patterns: {', '.join(found) if found else 'none found'}")
+        self.progress_details.text = "\n".join(lines)
+        
+        stage_messages = {
+            'quality': "Running disease model...",
+            'model': "Checking leaf colors...",
+            'colors': "Analyzing texture...",
+            'texture': "Looking for disease patterns...",
+            'patterns': "Preparing recommendations...",
+            'recommendations': "Saving scan..."
+        }
+        self.progress_status.text = stage_messages.get(stage, "Please wait...")
+
     def show_ai_analysis_results(self, analysis_results, scan_id):
         """Show detailed AI analysis results"""
-        # Close progress popup
-        if hasattr(self, 'progress_popup'):
-            self.progress_popup.dismiss()
+        # Close the progress popup unless later scans are still being analysed
+        self.dismiss_scan_progress()
         
         # Create results layout
         results_layout = BoxLayout(orientation='vertical', spacing=10, padding=20)
@@ -731,6 +922,15 @@ class HomeScreen(Screen):
         """
         content_layout.add_widget(Label(text=disease_text, size_hint_y=None, height=80))
         
+        # Near-duplicate of an earlier scan
+        if 'near_duplicate_of' in analysis_results:
+            duplicate = analysis_results['near_duplicate_of']
+            if duplicate.get('analysis_reused', True):
+                duplicate_text = f"♻️ Near-duplicate of Scan #{duplicate['scan_id']} (analysis reused)"
+            else:
+                duplicate_text = f"🔁 Looks like Scan #{duplicate['scan_id']} (analysed again)"
+            content_layout.add_widget(Label(text=duplicate_text, size_hint_y=None, height=30))
+        
         # Leaf Type
         leaf_text = f"""
 🌿 Leaf Type:
@@ -993,8 +1193,11 @@ class HomeScreen(Screen):
             # Show progress
             self.show_ai_analysis_progress()
             
-            # Perform disease pattern detection
-            patterns = self.ai_analyzer.detect_disease_patterns(self.last_captured_image)
+            # Generic and coconut pattern detection share the captured image's planes
+            features = self.ai_analyzer.compute_features(['pattern_detection', 'disease_patterns'],
+                                                         self.get_last_captured_pyramid())
+            patterns = dict(features['pattern_detection'])
+            patterns.update(features['disease_patterns'])
             
             # Close progress
             if hasattr(self, 'progress_popup'):
@@ -1015,7 +1218,8 @@ class HomeScreen(Screen):
         try:
             self.show_ai_analysis_progress()
             
-            nutrients = self.ai_analyzer.analyze_nutrient_deficiency(self.last_captured_image)
+            nutrients = self.ai_analyzer.compute_features(['nutrient_deficiency'],
+                                                          self.get_last_captured_pyramid())['nutrient_deficiency']
             
             if hasattr(self, 'progress_popup'):
                 self.progress_popup.dismiss()
@@ -1077,6 +1281,16 @@ class HomeScreen(Screen):
         except Exception as e:
             self.show_error(f"Error enhancing image: {e}")
 
+    def get_last_captured_pyramid(self):
+        """Analysis pyramid for the last captured image, its planes are reused across AI tools"""
+        from analysis.registry import as_pyramid
+
+        pyramid = getattr(self, 'last_captured_pyramid', None)
+        if pyramid is None or pyramid.levels[0] is not self.last_captured_image:
+            pyramid = as_pyramid(self.last_captured_image)
+            self.last_captured_pyramid = pyramid
+        return pyramid
+
     def close_ai_tools(self, instance):
         """Close AI tools popup"""
         if hasattr(self, 'ai_tools_popup'):
@@ -1139,6 +1353,9 @@ class HomeScreen(Screen):
             status = "❌ Deficient" if deficient else "✅ Normal"
             results_text += f"• {description}: {status}\n"
         
+        if 'potassium' in nutrients.get('changed', []):
+            results_text += "\nℹ️ Potassium now compares leaf edges with the centre; earlier versions read the centre only and answered differently here\n"
+        
         results_text += "\n💡 Coconut-specific recommendations:\n"
         results_text += "• Apply balanced coconut fertilizer\n"
         results_text += "• Check soil pH (6.0-7.0 optimal)\n"
@@ -1222,6 +1439,9 @@ class HomeScreen(Screen):
 
     def enhance_image_quality(self, img):
         """Enhance image quality for better analysis"""
+        import cv2
+        import numpy as np
+
         try:
             # Apply basic image enhancement
             enhanced = cv2.convertScaleAbs(img, alpha=1.2, beta=10)  # Increase contrast and brightness
@@ -1289,3 +1509,7 @@ class HomeScreen(Screen):
             self.capture_popup.dismiss()
         if hasattr(self, 'ai_tools_popup'):
             self.ai_tools_popup.dismiss()
+        
+        # Queued and running analyses are dropped, nothing is saved for them
+        if self.analysis_scheduler.cancel_all() and hasattr(self, 'progress_popup'):
+            self.progress_popup.dismiss()
@@ -12,6 +12,7 @@ if sys.platform in ['win32', 'linux', 'darwin']:
     os.environ['KIVY_WINDOW_CENTERED'] = '1'
 
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
@@ -151,5 +152,9 @@ class CocoScanApp(App):
         self.sm = sm
         return sm
 
+    def on_start(self):
+        # Warm up the analyzer once the welcome screen has rendered its first frame
+        Clock.schedule_once(self.sm.get_screen('home').start_analyzer_warmup, 0)
+
 if __name__ == '__main__':
     CocoScanApp().run()
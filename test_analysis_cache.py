@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the CocoScan analysis result cache
+Uses a temporary SQLite file so the app database is untouched
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from database.analysis_cache import AnalysisCache
+
+def write_leaf(path, color=(50, 150, 50)):
+    cv2.imwrite(str(path), np.full((80, 100, 3), color, dtype=np.uint8))
+    return str(path)
+
+def test_cache_hit_for_identical_bytes(tmp_path):
+    """A re-uploaded copy of the same photo is served from the cache"""
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.db"))
+    analyzer = LeafAnalyzer(cache=cache)
+
+    original = write_leaf(tmp_path / "leaf.png")
+    copy = tmp_path / "leaf_upload_copy.png"
+    copy.write_bytes(open(original, 'rb').read())
+
+    first = analyzer.analyze_leaf(original)
+    second = analyzer.analyze_leaf(str(copy))
+
+    assert 'cache_hit' not in first
+    assert second['cache_hit'] is True
+    assert second['disease_name'] == first['disease_name']
+    assert cache.stats()['entries'] == 1
+
+def test_cache_invalidated_by_model_change(tmp_path):
+    """Entries from a different model are never reused"""
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.db"))
+    analyzer = LeafAnalyzer(cache=cache)
+    image = write_leaf(tmp_path / "leaf.png")
+    analyzer.analyze_leaf(image)
+
+    analyzer.model_fingerprint = "retrained-model"
+    assert analyzer.lookup_cached_analysis(image)[0] is None
+    assert cache.invalidate_model("retrained-model") == 1
+
+def test_cache_lru_eviction(tmp_path):
+    """The least recently used entries are dropped past max_entries"""
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.db"), max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, key, "model", {'disease_name': key})
+    cache.get("a")
+    cache.put("c", "c", "model", {'disease_name': "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {'disease_name': "a"}
+    assert cache.stats()['entries'] == 2
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the append-only analysis log
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import gzip
+import json
+
+import numpy as np
+
+from database.analysis_log import AnalysisLog
+
+def make_analysis(i):
+    return {'disease_class': np.int64(i % 5), 'disease_name': f"Class {i}",
+            'overall_confidence': 0.5 + i / 100, 'recommendations': ["check leaf"] * 20}
+
+def test_append_and_random_access(tmp_path):
+    log = AnalysisLog(str(tmp_path / "log"))
+    first = log.append(make_analysis(1), image_path="a.png", scan_id=7)
+    second = log.append(make_analysis(2), image_path="b.png", scan_id=7)
+
+    assert (first, second) == (1, 2)
+    assert log.get_by_scan(7)['disease_name'] == "Class 2"  # latest wins
+    record = log.get_record(first)
+    assert record['image_path'] == "a.png" and record['analysis']['disease_class'] == 1
+    assert log.get_by_scan(99) is None and log.get_record(99) is None
+
+def test_rotation_streaming_and_rebuild(tmp_path):
+    """Small segments rotate; streaming and a rebuilt index see every record"""
+    log = AnalysisLog(str(tmp_path / "log"), max_segment_bytes=400)
+    for i in range(20):
+        log.append(make_analysis(i), scan_id=i)
+
+    assert len(log.segments()) > 1
+    assert [record['scan_id'] for record in log.iter_records()] == list(range(20))
+
+    # Every segment is a plain .jsonl.gz
+    with gzip.open(log.segment_path(log.segments()[0]), 'rt') as f:
+        assert json.loads(f.readline())['record_id'] == 1
+
+    os.remove(os.path.join(log.directory, "index.sqlite"))
+    rebuilt = AnalysisLog(log.directory)
+    assert rebuilt.rebuild_index() == 20
+    assert rebuilt.get_by_scan(13)['disease_name'] == "Class 13"
+    assert rebuilt.stats()['records'] == 20
+
+def test_import_legacy_json_files(tmp_path):
+    legacy = tmp_path / "analysis_results"
+    legacy.mkdir()
+    (legacy / "leaf_analysis_20250713_215746.json").write_text(json.dumps({'disease_name': "Healthy"}, indent=2))
+    (legacy / "leaf2_analysis_20250714_101010.json").write_text('{\n  "disease_class":')  # cut short
+    (legacy / "notes.json").write_text("{}")
+
+    log = AnalysisLog(str(tmp_path / "log"))
+    assert log.import_json_files(str(legacy)) == (1, 0, 1)
+    assert log.import_json_files(str(legacy)) == (0, 1, 1)
+
+    record = log.get_record(1)
+    assert record['source'] == "leaf_analysis_20250713_215746.json"
+    assert record['saved_at'] == "2025-07-13T21:57:46"
+    assert record['analysis'] == {'disease_name': "Healthy"}
+    # Originals stay put unless asked otherwise
+    assert (legacy / "leaf_analysis_20250713_215746.json").exists()
+
+def test_import_removes_originals_only_after_verified_import(tmp_path):
+    legacy = tmp_path / "analysis_results"
+    legacy.mkdir()
+    (legacy / "leaf_analysis_20250713_215746.json").write_text(json.dumps({'disease_name': "Healthy"}))
+    (legacy / "leaf2_analysis_20250714_101010.json").write_text('{\n  "disease_class":')  # cut short
+
+    log = AnalysisLog(str(tmp_path / "log"))
+    assert log.import_json_files(str(legacy)) == (1, 0, 1)
+    # Already imported on the first run: removed now without a second copy
+    (legacy / "leaf3_analysis_20250715_080000.json").write_text(json.dumps({'disease_name': "Rust"}))
+    assert log.import_json_files(str(legacy), remove_originals=True) == (1, 1, 1)
+
+    assert sorted(p.name for p in legacy.iterdir()) == ["leaf2_analysis_20250714_101010.json"]
+    assert log.stats()['records'] == 2
+    assert log.get_record(2)['analysis'] == {'disease_name': "Rust"}
+
+def test_analyzer_reloads_saved_analysis(tmp_path):
+    """Analyses saved for a scan load back by scan id, e.g. for near-duplicate shots"""
+    from ai_leaf_analyzer import LeafAnalyzer
+
+    analyzer = LeafAnalyzer(analysis_log=AnalysisLog(str(tmp_path / "log")))
+    analyzer.save_analysis(make_analysis(3), "leaf.png", scan_id=42)
+
+    assert analyzer.load_analysis(42)['disease_name'] == "Class 3"
+    assert analyzer.load_analysis(43) is None
+
+def test_near_duplicate_reuse_checks_the_new_photo(tmp_path):
+    """Different leaves with near-identical hashes are analysed again, close repeats get their own quality"""
+    import cv2
+    from ai_leaf_analyzer import LeafAnalyzer
+    from analysis.phash import dhash_image, hamming_distance
+
+    def leaf(color):
+        img = np.full((360, 640, 3), (200, 190, 180), dtype=np.uint8)
+        cv2.ellipse(img, (320, 180), (260, 110), 15, 0, 360, color, -1)
+        for x in range(80, 560, 24):
+            cv2.line(img, (x, 120), (x + 40, 240), (20, 90, 30), 2)
+        return img
+
+    green, brown = leaf((40, 150, 60)), leaf((30, 70, 120))
+    distance = hamming_distance(dhash_image(green), dhash_image(brown))
+    assert distance <= 2
+
+    analyzer = LeafAnalyzer(analysis_log=AnalysisLog(str(tmp_path / "log")))
+    saved = analyzer.analyze_array(green)
+    saved['image_quality'] = {'quality_level': "Excellent for Coconut Analysis", 'sharpness': 999.0}
+    analyzer.save_analysis(saved, "green.png", scan_id=1)
+
+    # Same pose, different leaf: the colours disagree, so nothing is reused
+    assert analyzer.reuse_duplicate_analysis((1, "green.png", distance), brown) is None
+    # Farther matches are never reused
+    assert analyzer.reuse_duplicate_analysis((1, "green.png", 3), green) is None
+
+    # A blurred retake of the same leaf reuses the diagnosis but not the quality
+    blurred = cv2.GaussianBlur(green, (0, 0), 4)
+    reused = analyzer.reuse_duplicate_analysis((1, "green.png", 0), blurred)
+    assert reused['disease_name'] == saved['disease_name']
+    assert reused['image_quality'] == analyzer.analyze_array(blurred)['image_quality']
+    assert reused['image_quality']['quality_level'] != "Excellent for Coconut Analysis"
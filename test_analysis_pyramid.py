@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test script for the resolution-capped analysis pyramid
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+
+from analysis.pyramid import AnalysisPyramid
+
+def make_image(height, width):
+    return np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+def test_level_for_max_side():
+    """The smallest level whose long side still covers max_side is picked"""
+    pyramid = AnalysisPyramid(make_image(1080, 1920))
+
+    assert pyramid.level_index_for(None) == 0
+    assert pyramid.level_index_for(1920) == 0
+    assert pyramid.level_index_for(960) == 1
+    assert pyramid.level_index_for(512) == 1  # 960 covers 512, 480 does not
+    assert pyramid.level_index_for(256) == 2
+    assert pyramid.image_for(512).shape[:2] == (540, 960)
+
+    # pyrDown rounds odd sizes up
+    odd = AnalysisPyramid(make_image(721, 1281))
+    assert odd.level_index_for(641) == 1
+    assert odd.image_for(641).shape[:2] == (361, 641)
+
+def test_exact_resize():
+    """exact resizes the chosen level down to max_side, never up"""
+    pyramid = AnalysisPyramid(make_image(1080, 1920))
+
+    assert pyramid.image_for(256, exact=True).shape[:2] == (144, 256)
+    assert pyramid.image_for(4000, exact=True).shape[:2] == (1080, 1920)
+    assert pyramid.image_for(None, exact=True).shape[:2] == (1080, 1920)
+
+def test_contexts_memoized_per_level():
+    pyramid = AnalysisPyramid(make_image(1080, 1920))
+
+    # Sides landing on the same level share one context unless exact
+    assert pyramid.context(512) is pyramid.context(600)
+    assert pyramid.context(512) is not pyramid.context(256)
+    assert pyramid.context(256, exact=True) is pyramid.context(256, exact=True)
+    assert pyramid.context(256, exact=True) is not pyramid.context(256)
+    assert pyramid.context() is pyramid.context(None)
+    assert len(pyramid.levels) == 3
+
+    # Without a leaf roi, roi contexts fall back to the plain level
+    assert pyramid.context(512, roi=True) is pyramid.context(512)
+
+    with pytest.raises(ValueError):
+        AnalysisPyramid(None)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded analysis job scheduler
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import threading
+import time
+
+import pytest
+
+from analysis.scheduler import AnalysisScheduler, QueueFullError, CANCELLED, DONE, FAILED
+
+def test_results_delivered_in_submission_order():
+    """Jobs finishing out of order still reach the consumer in order"""
+    delivered = []
+    scheduler = AnalysisScheduler(workers=4, max_queued=10)
+    delays = [0.2, 0.05, 0.15, 0.0, 0.1]
+
+    jobs = [scheduler.submit(lambda job, delay=delay, i=i: time.sleep(delay) or i, on_result=delivered.append)
+            for i, delay in enumerate(delays)]
+    for job in jobs:
+        assert job.wait(5)
+
+    assert delivered == [0, 1, 2, 3, 4]
+    assert [job.job_id for job in jobs] == [1, 2, 3, 4, 5]
+    assert scheduler.pending == 0
+    scheduler.shutdown()
+
+def test_backpressure_and_coalescing():
+    release = threading.Event()
+    blocker = lambda job: release.wait(5)
+
+    scheduler = AnalysisScheduler(workers=1, max_queued=2)
+    running = scheduler.submit(blocker)
+    while running.state != 'running':
+        time.sleep(0.01)
+    scheduler.submit(blocker)
+    scheduler.submit(blocker)
+    with pytest.raises(QueueFullError):
+        scheduler.submit(blocker)
+    release.set()
+    scheduler.shutdown()
+
+    release.clear()
+    coalescing = AnalysisScheduler(workers=1, max_queued=1, overflow='drop_oldest')
+    coalescing.submit(blocker)
+    time.sleep(0.05)
+    dropped = coalescing.submit(lambda job: 'old')
+    newest = coalescing.submit(lambda job: 'new')
+    release.set()
+    assert newest.wait(5)
+    assert dropped.state == CANCELLED
+    assert newest.state == DONE and newest.result == 'new'
+    coalescing.shutdown()
+
+def test_cancel_running_and_queued_jobs():
+    """Cancelled jobs never deliver; errors go to on_error"""
+    delivered, errors = [], []
+    started = threading.Event()
+
+    def slow(job):
+        started.set()
+        while not job.cancelled:
+            time.sleep(0.01)
+        return 'late'
+
+    def broken(job):
+        raise ValueError("bad image")
+
+    scheduler = AnalysisScheduler(workers=1, max_queued=5)
+    running = scheduler.submit(slow, on_result=delivered.append)
+    queued = scheduler.submit(lambda job: 'queued', on_result=delivered.append)
+    failing = scheduler.submit(broken, on_error=errors.append)
+    started.wait(5)
+
+    assert scheduler.cancel_all() == 3
+    assert failing.wait(5)
+    assert running.state == CANCELLED and queued.state == CANCELLED
+    assert delivered == [] and errors == []
+
+    failing = scheduler.submit(broken, on_error=errors.append)
+    assert failing.wait(5)
+    assert failing.state == FAILED and str(errors[0]) == "bad image"
+    assert scheduler.cancel(failing.job_id) is False
+    scheduler.shutdown()
+
+def test_slow_deliver_hook_keeps_order():
+    """A worker stalled in the deliver hook does not let later jobs overtake it"""
+    delivered = []
+    calls = []
+    second_done = threading.Event()
+
+    def deliver(callback):
+        calls.append(1)
+        if len(calls) == 1:
+            # The other worker finishes job 2 while job 1 is being delivered
+            second_done.wait(1)
+            time.sleep(0.1)
+        callback()
+
+    scheduler = AnalysisScheduler(workers=2, max_queued=10, deliver=deliver)
+    first = scheduler.submit(lambda job: 1, on_result=delivered.append)
+    second = scheduler.submit(lambda job: time.sleep(0.05) or second_done.set() or 2, on_result=delivered.append)
+    assert first.wait(5) and second.wait(5)
+
+    assert delivered == [1, 2]
+    scheduler.shutdown()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for image loading: in-memory analysis, background writes
+and reduced-scale JPEG decoding
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.image_io import BackgroundImageWriter
+
+def test_analyze_array_matches_file_analysis(tmp_path):
+    """A frame analysed in memory gives the same features as its PNG on disk"""
+    frame = np.full((120, 160, 3), (50, 150, 50), dtype=np.uint8)
+    cv2.circle(frame, (80, 60), 20, (30, 200, 220), -1)
+
+    writer = BackgroundImageWriter()
+    path = writer.write(str(tmp_path / "captures" / "leaf.png"), frame).result(timeout=10)
+    writer.shutdown()
+
+    analyzer = LeafAnalyzer()
+    from_memory = analyzer.analyze_array(frame, source="camera")
+    from_disk = analyzer.analyze_leaf(path)
+
+    assert os.path.exists(path)
+    for key in ('color_analysis', 'texture_analysis', 'disease_patterns', 'image_quality'):
+        assert from_memory[key] == from_disk[key]
+
+def test_analyze_array_rejects_bad_input():
+    """Non-BGR input raises when asked to, otherwise falls back"""
+    analyzer = LeafAnalyzer()
+    try:
+        analyzer.analyze_array(np.zeros((10, 10), dtype=np.uint8), raise_errors=True)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert 'disease_name' in analyzer.analyze_array(None)
+
+def test_large_jpeg_uses_reduced_decode(tmp_path):
+    """Big JPEG uploads are decoded at the largest scale still covering the analysis"""
+    photo = np.full((2000, 3000, 3), (50, 150, 50), dtype=np.uint8)
+    jpeg = str(tmp_path / "upload.jpg")
+    png = str(tmp_path / "upload.png")
+    cv2.imwrite(jpeg, photo)
+    cv2.imwrite(png, photo)
+
+    # Only colours, patterns and the model set the decode target, quality follows
+    analyzer = LeafAnalyzer()
+    assert analyzer.get_decode_max_side() == 512
+
+    decoded = analyzer.analyze_leaf(jpeg)
+    assert decoded['decode'] == {'scale': 4, 'source_size': [3000, 2000], 'decoded_size': [750, 500]}
+    assert decoded['image_quality']['sharpness_scale'] == 4.0
+    assert analyzer.analyze_leaf(png)['decode']['scale'] == 1
+
+    full_resolution = LeafAnalyzer(analysis_resolutions={'quality': {'decode': True}})
+    assert full_resolution.get_decode_max_side() is None
+    assert full_resolution.analyze_leaf(jpeg)['decode']['scale'] == 1
+
+def test_reduced_decode_keeps_quality_levels(tmp_path):
+    """Sharpness thresholds follow the decode scale, so blur is judged as at full resolution"""
+    texture = np.random.default_rng(0).integers(0, 256, (500, 750, 3), dtype=np.uint8)
+    photo = cv2.resize(texture, (3000, 2000), interpolation=cv2.INTER_CUBIC)
+    reduced = LeafAnalyzer(segment_leaf=False)
+    full_resolution = LeafAnalyzer(segment_leaf=False, analysis_resolutions={'quality': {'decode': True}})
+
+    for sigma, level in ((0, "Excellent for Coconut Analysis"), (6, "Poor - Retake Photo")):
+        path = str(tmp_path / f"blur{sigma}.jpg")
+        cv2.imwrite(path, cv2.GaussianBlur(photo, (0, 0), sigma) if sigma else photo)
+        assert reduced.analyze_leaf(path)['image_quality']['quality_level'] == level
+        assert full_resolution.analyze_leaf(path)['image_quality']['quality_level'] == level
+
+def test_quality_uses_full_resolution_centre_crop():
+    """Frames analysed in memory are measured at capture resolution, on a centre crop"""
+    frame = np.random.default_rng(1).integers(0, 256, (1500, 2000, 3), dtype=np.uint8)
+    analysis = LeafAnalyzer(segment_leaf=False).analyze_array(frame)
+
+    crop = cv2.cvtColor(frame[238:1262, 488:1512], cv2.COLOR_BGR2GRAY)
+    assert analysis['analysis_resolution']['quality'] == [1024, 1024]
+    assert analysis['image_quality']['sharpness'] == float(cv2.Laplacian(crop, cv2.CV_64F).var())
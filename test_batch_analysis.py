@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Test script for CocoScan batch analysis
+Runs a small batch through the process pool, including an unreadable file
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.phash import dhash_image
+
+def test_analyze_batch(tmp_path):
+    """Every path comes back once, with per-item errors for bad files"""
+    paths = []
+    for i, color in enumerate([[50, 150, 50], [50, 200, 200], [50, 100, 150]]):
+        path = str(tmp_path / f"leaf_{i}.png")
+        cv2.imwrite(path, np.full((120, 160, 3), color, dtype=np.uint8))
+        paths.append(path)
+
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    paths.append(str(broken))
+
+    results = list(LeafAnalyzer().analyze_batch(paths, workers=2, chunksize=2))
+
+    assert sorted(item.path for item in results) == sorted(paths)
+    for item in results:
+        if item.path == str(broken):
+            assert item.result is None
+            assert "Could not load image" in item.error
+            assert item.phash is None
+        else:
+            assert item.error is None
+            assert item.result['coconut_specific'] is True
+            # Hashed in the worker from the pixels it decoded
+            assert item.phash == dhash_image(cv2.imread(item.path))
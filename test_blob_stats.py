@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for connected-component blob statistics
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.blobs import blob_stats
+from analysis.context import FeatureContext
+
+def test_blob_stats_vectors():
+    """Areas, boxes and centroids come back per blob, filters are vectorized"""
+    mask = np.zeros((100, 200), dtype=np.uint8)
+    mask[10:20, 10:20] = 255          # 100 px
+    mask[50:80, 100:140] = 255        # 1200 px
+    mask[90, 190] = 255               # 1 px noise
+
+    blobs = blob_stats(mask)
+    assert blobs.count == 3
+    assert sorted(blobs.areas.tolist()) == [1, 100, 1200]
+
+    big = blobs.filter(min_area=50)
+    assert big.count == 2
+    assert big.largest() == {'area': 1200, 'bbox': [100, 50, 40, 30], 'centroid': [119.5, 64.5]}
+    assert big.size_histogram() == {'<=50': 0, '51-100': 1, '101-250': 0, '251-500': 0,
+                                    '501-1000': 0, '1001-5000': 1, '>5000': 0}
+
+def test_spot_counts_match_contours():
+    """Blob counts agree with the old findContours pass on separated spots"""
+    rng = np.random.default_rng(4)
+    img = np.full((400, 400, 3), (40, 150, 60), dtype=np.uint8)
+    for _ in range(25):
+        center = (int(rng.integers(20, 380)), int(rng.integers(20, 380)))
+        cv2.circle(img, center, int(rng.integers(3, 12)), (15, 15, 15), -1)
+
+    ctx = FeatureContext(img)
+    contours, _ = cv2.findContours(ctx.mask('dark_spot'), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Pixel areas run slightly above polygon areas, compare well clear of the cut-off
+    expected = len([c for c in contours if cv2.contourArea(c) > 80])
+    assert LeafAnalyzer().get_spot_blobs(ctx, min_area=90).count == expected
+
+    stats = LeafAnalyzer().detect_disease_patterns(img)['blob_statistics']
+    assert stats['spots']['count'] == LeafAnalyzer().detect_spots(ctx)
+    assert stats['lesions']['largest'] is None
+
+def test_blob_thresholds_follow_resolution():
+    """Spots and lesions are counted the same on a capture and on its half-size level"""
+    img = np.full((800, 800, 3), (40, 150, 60), dtype=np.uint8)
+    for row in range(4):
+        for col in range(4):
+            x, y = 100 + col * 180, 60 + row * 180
+            cv2.circle(img, (x, y), 6, (15, 15, 15), -1)             # spot, ~113 px
+            cv2.circle(img, (x + 40, y), 2, (15, 15, 15), -1)        # speck, ~13 px
+            # Lesion split by a 2 px gap that closing joins
+            cv2.rectangle(img, (x - 20, y + 40), (x - 1, y + 55), (30, 140, 200), -1)
+            cv2.rectangle(img, (x + 2, y + 40), (x + 20, y + 55), (30, 140, 200), -1)
+
+    analyzer = LeafAnalyzer()
+    full = FeatureContext(img)
+    half = FeatureContext(cv2.resize(img, (400, 400), interpolation=cv2.INTER_AREA), scale=2.0)
+
+    assert analyzer.detect_spots(full) == analyzer.detect_spots(half) == 16
+    assert analyzer.detect_lesions(full) == analyzer.detect_lesions(half) == 16
+    # Unscaled, the half-size spots fall under the 50 px cut-off
+    assert half.blobs('dark_spot').filter(50).count == 0
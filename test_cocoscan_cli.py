@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the cocoscan command line tool
+Scans a directory headlessly and reruns it over rejected photos
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+def test_scan_cli_streams_jsonl(tmp_path):
+    """The headless scanner writes one JSON line per image"""
+    import json
+    from cocoscan import main
+
+    images_dir = tmp_path / "images" / "block_a"
+    images_dir.mkdir(parents=True)
+    for i in range(3):
+        cv2.imwrite(str(images_dir / f"leaf_{i}.jpg"), np.full((90, 120, 3), [50, 150, 50], dtype=np.uint8))
+    (images_dir / "notes.txt").write_text("not an image")
+
+    output = tmp_path / "scans.jsonl"
+    exit_code = main(['scan', str(tmp_path / "images"), '--workers', '2', '--output', str(output)])
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert exit_code == 0
+    assert len(rows) == 3
+    assert all(row['error'] is None and row['result']['disease_name'] for row in rows)
+    assert all(isinstance(row['phash'], int) for row in rows)
+
+def test_scan_cli_skips_rejected_images_on_rerun(tmp_path, monkeypatch):
+    """Photos the pre-gate rejects are remembered, so a rerun does not decode them again"""
+    import database.db
+    from cocoscan import scan_directory
+
+    monkeypatch.setattr(database.db, 'get_db_path', lambda: str(tmp_path / "scans.db"))
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    cv2.imwrite(str(images_dir / "blank.png"), np.full((360, 640, 3), 128, dtype=np.uint8))
+
+    output = str(tmp_path / "scans.jsonl")
+    assert scan_directory(str(images_dir), workers=1, output=output, save_db=True) == (1, 0, 0)
+    assert database.db.get_scanned_image_paths() == {str(images_dir / "blank.png")}
+    assert database.db.get_scanned_image_paths(include_rejected=False) == set()
+
+    # The rejected photo is skipped, not analysed again
+    assert scan_directory(str(images_dir), workers=1, output=output, save_db=True) == (0, 0, 1)
+
+    # Unless rejections are retried; one that passes now is saved as a scan
+    leaf = np.full((360, 640, 3), (40, 150, 60), dtype=np.uint8)
+    for x in range(0, 640, 16):
+        cv2.line(leaf, (x, 0), (x + 80, 360), (20, 90, 30), 2)
+    cv2.imwrite(str(images_dir / "blank.png"), leaf)
+    assert scan_directory(str(images_dir), workers=1, output=output, save_db=True, retry_rejected=True) == (1, 0, 0)
+    assert database.db.get_scanned_image_paths(include_rejected=False) == {str(images_dir / "blank.png")}
+    assert database.db.clear_rejected_images() == 0
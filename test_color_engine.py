@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for the CocoScan colour label-map engine
+Checks the single-pass classifier against per-class cv2.inRange masks
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from analysis.color_lut import ColorLabelMap, COLOR_RANGES
+from analysis.context import FeatureContext
+
+def random_hsv(seed, shape=(61, 47)):
+    """Random HSV image covering the full OpenCV hue range"""
+    rng = np.random.default_rng(seed)
+    hsv = np.empty(shape + (3,), dtype=np.uint8)
+    hsv[:, :, 0] = rng.integers(0, 180, size=shape)
+    hsv[:, :, 1:] = rng.integers(0, 256, size=shape + (2,))
+    return hsv
+
+def test_label_map_matches_inrange():
+    """Every class mask and count equals the cv2.inRange result"""
+    label_map = ColorLabelMap()
+    hsv = random_hsv(11)
+    labels = label_map.classify(hsv)
+    counts = label_map.counts(labels)
+
+    for name, (lower, upper) in COLOR_RANGES.items():
+        expected = cv2.inRange(hsv, np.array(lower), np.array(upper))
+        assert np.array_equal(label_map.mask(labels, name), expected), name
+        assert counts[name] == np.sum(expected > 0), name
+
+def test_label_map_wide_class_set():
+    """More than 16 classes fall back to 32-bit labels"""
+    ranges = {f"hue_{i}": ([i * 9, 0, 0], [i * 9 + 8, 255, 255]) for i in range(20)}
+    label_map = ColorLabelMap(ranges)
+    assert label_map.dtype == np.uint32
+
+    hsv = random_hsv(5)
+    counts = label_map.counts(label_map.classify(hsv))
+    assert sum(counts.values()) == hsv.shape[0] * hsv.shape[1]
+
+def test_feature_context_shares_planes():
+    """Context planes are computed once and reused"""
+    img = np.full((32, 32, 3), [50, 150, 50], dtype=np.uint8)
+    ctx = FeatureContext(img)
+
+    assert ctx.hsv is ctx.hsv
+    assert ctx.mask('healthy_green') is ctx.mask('healthy_green')
+    assert ctx.ratio('healthy_green') == 1.0
+    assert set(ctx.ratios()) == set(COLOR_RANGES)
+
+if __name__ == "__main__":
+    test_label_map_matches_inrange()
+    test_label_map_wide_class_set()
+    test_feature_context_shares_planes()
+    print("✅ Colour label-map engine tests passed")
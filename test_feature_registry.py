@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for the feature registry dependency graph
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+import pytest
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.pyramid import AnalysisPyramid
+from analysis.registry import FeatureRegistry, build_default_registry
+
+def make_leaf():
+    img = np.full((480, 640, 3), (200, 190, 180), dtype=np.uint8)
+    cv2.ellipse(img, (320, 240), (250, 160), 0, 0, 360, (40, 150, 60), -1)
+    cv2.circle(img, (250, 200), 30, (30, 200, 220), -1)
+    cv2.circle(img, (400, 280), 12, (15, 15, 15), -1)
+    return img
+
+def test_only_requested_nodes_run():
+    """Shared inputs run once, unrelated nodes never run"""
+    calls = []
+    registry = FeatureRegistry()
+
+    @registry.feature('base')
+    def base(analyzer):
+        calls.append('base')
+        return 2
+
+    registry.register('double', ('base',), lambda analyzer, value: calls.append('double') or value * 2)
+    registry.register('square', ('base',), lambda analyzer, value: calls.append('square') or value ** 2)
+    registry.register('unused', ('base',), lambda analyzer, value: calls.append('unused'))
+
+    assert registry.compute(['double', 'square'], None) == {'double': 4, 'square': 4}
+    assert sorted(calls) == ['base', 'double', 'square']
+
+    # Provided values are not recomputed
+    calls.clear()
+    assert registry.compute(['double'], None, provided={'base': 5}) == {'double': 10}
+    assert calls == ['double']
+
+def test_unknown_and_cyclic_features():
+    registry = FeatureRegistry()
+    registry.register('a', ('b',), lambda analyzer, b: b)
+    registry.register('b', ('a',), lambda analyzer, a: a)
+
+    with pytest.raises(ValueError):
+        registry.compute(['a'], None)
+    with pytest.raises(KeyError):
+        registry.compute(['missing'], None)
+    with pytest.raises(ValueError):
+        registry.register('a', (), lambda analyzer: None)
+
+def test_default_registry_resolves_minimal_graph():
+    """Nutrient analysis needs only the full-image labels, not the scan pipeline"""
+    levels = build_default_registry().resolve(['nutrient_deficiency'], {'pyramid': None})
+    assert [name for level in levels for name in level] == ['context:full', 'labels:full', 'nutrient_deficiency']
+
+def test_pipeline_output_unchanged_by_workers():
+    """Sequential and concurrent execution give the same features"""
+    analyzer = LeafAnalyzer()
+    img = make_leaf()
+    results = analyzer.get_coconut_simulated_analysis()
+
+    enhanced = analyzer.enhance_coconut_analysis(results, img, None)
+    assert enhanced['coconut_specific'] is True
+    assert enhanced['leaf_roi']['found'] is True
+
+    names = ['image_quality', 'color_analysis', 'texture_analysis', 'disease_patterns', 'region_health']
+    parallel = analyzer.compute_features(names, AnalysisPyramid(img), provided={'model_results': results}, workers=4)
+    for name in names:
+        assert parallel[name] == enhanced[name]
+
+def test_progressive_stages_report_diagnosis_early():
+    """Partial results grow stage by stage and end in the full analysis"""
+    analyzer = LeafAnalyzer()
+    reported = []
+
+    analysis = analyzer.analyze_array(make_leaf(), on_progress=lambda stage, partial: reported.append((stage, partial)))
+
+    stages = [stage for stage, _ in reported]
+    assert stages == ['quality', 'model', 'colors', 'texture', 'patterns', 'recommendations']
+    assert 'disease_name' not in reported[0][1] and 'image_quality' in reported[0][1]
+    assert 'disease_name' in reported[1][1] and 'texture_analysis' not in reported[1][1]
+
+    final = reported[-1][1]
+    assert final['coconut_specific'] is True
+    assert set(final) == set(analysis) - {'timings'}
+
+    # A failing callback does not break the analysis
+    def broken(stage, partial):
+        raise RuntimeError("popup gone")
+    assert 'recommendations' in analyzer.analyze_array(make_leaf(), on_progress=broken)
+
+def test_concurrent_contexts_share_pyramid_levels():
+    """Without segmentation the context nodes build pyramid levels concurrently"""
+    analyzer = LeafAnalyzer(segment_leaf=False)
+    img = cv2.resize(make_leaf(), (4000, 3000))
+    results = analyzer.get_coconut_simulated_analysis()
+    names = ['analysis_resolution', 'color_analysis', 'texture_analysis']
+    expected = analyzer.compute_features(names, AnalysisPyramid(img), provided={'model_results': results})
+
+    for _ in range(5):
+        pyramid = AnalysisPyramid(img)
+        parallel = analyzer.compute_features(names, pyramid, provided={'model_results': results}, workers=8)
+        assert parallel == expected
+        assert [level.shape[:2] for level in pyramid.levels] == [(3000, 4000), (1500, 2000), (750, 1000), (375, 500)]
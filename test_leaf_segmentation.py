@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script for leaf segmentation
+A synthetic leaf on a soil and sky background
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.segmentation import segment_leaf
+
+def leaf_photo():
+    photo = np.zeros((480, 640, 3), dtype=np.uint8)
+    photo[:200] = (230, 190, 150)   # sky
+    photo[200:] = (60, 90, 120)     # soil
+    cv2.ellipse(photo, (320, 260), (180, 90), 0, 0, 360, (40, 150, 60), -1)
+    # Dark lesions inside the leaf stay part of the leaf
+    for center in [(260, 250), (380, 280)]:
+        cv2.circle(photo, center, 15, (20, 30, 40), -1)
+    return photo
+
+def test_segment_leaf_mask_and_bbox():
+    """The ROI hugs the leaf and fills interior lesions"""
+    photo = leaf_photo()
+    roi = segment_leaf(photo)
+
+    x0, y0, x1, y1 = roi.crop_box(photo.shape)
+    assert abs(x0 - 140) <= 6 and abs(x1 - 500) <= 6
+    assert abs(y0 - 170) <= 6 and abs(y1 - 350) <= 6
+
+    expected = np.pi * 180 * 90 / photo[:, :, 0].size
+    assert abs(roi.coverage - expected) < 0.02
+
+def test_no_leaf_falls_back_to_full_frame():
+    """Frames without vegetation are analysed whole"""
+    assert segment_leaf(np.full((240, 320, 3), 128, dtype=np.uint8)) is None
+
+def test_ratios_are_over_leaf_pixels():
+    """Background no longer dilutes the colour ratios"""
+    photo = leaf_photo()
+    segmented = LeafAnalyzer().analyze_array(photo)
+    whole = LeafAnalyzer(segment_leaf=False).analyze_array(photo)
+
+    assert segmented['leaf_roi']['found'] is True
+    assert whole['leaf_roi'] == {'found': False}
+    assert segmented['color_analysis']['healthy_green_ratio'] > 0.9
+    assert whole['color_analysis']['healthy_green_ratio'] < 0.3
+    assert segmented['analysis_resolution']['colors'][1] < whole['analysis_resolution']['colors'][1]
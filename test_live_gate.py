@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the live camera quality gate
+A synthetic video file stands in for the camera preview
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from analysis.live_gate import FrameQualityGate, KivyCameraFrameSource, VideoFileFrameSource, iter_frame_quality
+
+CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images',
+                       'leaf_capture_20250713_225953_1280x720.png')
+
+def leaf_frame(seed):
+    """Sharp green frame with vein-like texture"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((360, 640, 3), (40, 150, 60), dtype=np.uint8)
+    for _ in range(40):
+        x = int(rng.integers(0, 640))
+        cv2.line(frame, (x, 0), (x + 80, 360), (20, 90, 30), 2)
+    return frame
+
+def write_video(path, frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 10, (640, 360))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+def test_gate_flags_blurry_dark_and_empty_frames(tmp_path):
+    """Good frames pass, blurred, dark and leafless frames are rejected"""
+    good = leaf_frame(0)
+    blurry = cv2.GaussianBlur(good, (31, 31), 0)
+    dark = (good * 0.05).astype(np.uint8)
+    empty = np.full_like(good, 128)
+    video = write_video(tmp_path / "preview.avi", [good, blurry, dark, empty])
+
+    source = VideoFileFrameSource(video)
+    results = list(iter_frame_quality(source, FrameQualityGate()))
+    source.close()
+
+    assert len(results) == 4
+    assert results[0]['ready'], results[0]
+    assert 'too blurry' in results[1]['problems']
+    assert 'too dark' in results[2]['problems']
+    assert 'no leaf in frame' in results[3]['problems']
+    assert not any(result['ready'] for result in results[1:])
+
+class FakeTexture:
+    """Bottom-up RGBA pixels like a Kivy camera texture"""
+
+    def __init__(self, frame):
+        self.size = (frame.shape[1], frame.shape[0])
+        self.pixels = np.ascontiguousarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)[::-1]).tobytes()
+
+class FakeCamera:
+    def __init__(self, frame):
+        self.texture = FakeTexture(frame)
+
+def test_gate_judges_capture_resolution_blur():
+    """A capture blurred past the Fair sharpness level is rejected on the thumbnail too"""
+    capture = cv2.imread(CAPTURE)
+    blurred = cv2.GaussianBlur(capture, (0, 0), 2)
+    # Only sharpness is under test, the capture shows little of the leaf
+    gate = FrameQualityGate(min_leaf_coverage=0.0)
+
+    # At capture resolution the blurred frame is far below min_sharpness,
+    # while its thumbnail alone scores well above it
+    assert cv2.Laplacian(cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var() < gate.min_sharpness
+    result = gate.check(blurred)
+    assert result['sharpness'] > gate.min_sharpness
+    assert result['problems'] == ['too blurry']
+    assert gate.check(capture)['ready']
+
+    # Frames decimated by the camera source are judged the same way
+    for frame, ready in ((capture, True), (blurred, False)):
+        source = KivyCameraFrameSource(FakeCamera(frame), gate.max_side)
+        small = source.read()
+        assert source.scale == 2 and small.shape[:2] == (206, 425)
+        assert gate.check(small, source.scale)['ready'] is ready
+
+def test_video_source_loops(tmp_path):
+    """A looping video source keeps producing frames like a camera"""
+    video = write_video(tmp_path / "loop.avi", [leaf_frame(1), leaf_frame(2)])
+    source = VideoFileFrameSource(video, loop=True)
+    frames = [source.read() for _ in range(5)]
+    source.close()
+    assert all(frame is not None for frame in frames)
+
+def test_analyzer_pre_gate_short_circuits_junk():
+    """Junk photos get a retake result, good ones record the gate decision"""
+    from ai_leaf_analyzer import LeafAnalyzer
+
+    analyzer = LeafAnalyzer(pre_gate=True)
+    junk = analyzer.analyze_array(np.full((360, 640, 3), 128, dtype=np.uint8))
+    leaf = analyzer.analyze_array(leaf_frame(3))
+
+    assert junk['disease_name'] == 'Retake Photo'
+    assert 'image_quality' not in junk
+    assert junk['pre_gate']['ready'] is False
+    assert leaf['pre_gate']['ready'] is True
+    assert 'image_quality' in leaf
+
+    # Sharpness is judged at capture resolution, not on the 256px thumbnail
+    capture = cv2.imread(CAPTURE)
+    lenient = LeafAnalyzer(pre_gate={'min_leaf_coverage': 0.0})
+    assert lenient.analyze_array(capture)['pre_gate']['ready'] is True
+    blurred = lenient.analyze_array(cv2.GaussianBlur(capture, (0, 0), 2))
+    assert blurred['pre_gate']['problems'] == ['too blurry']
+
+    # Thresholds are configurable and part of the analyzer fingerprint
+    strict = LeafAnalyzer(pre_gate={'min_sharpness': 1e9})
+    assert strict.analyze_array(leaf_frame(3))['pre_gate']['problems'] == ['too blurry']
+    assert strict.get_analyzer_fingerprint() != analyzer.get_analyzer_fingerprint()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for perceptual hashing and near-duplicate scan lookup
+Uses a temporary SQLite file so the app database is untouched
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+import database.db as db
+from analysis.phash import dhash_image, dhash_file, hamming_distance, split_hash, chunk_neighbours
+
+def make_leaf(seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((240, 320, 3), dtype=np.uint8)
+    for _ in range(12):
+        center = (int(rng.integers(0, 320)), int(rng.integers(0, 240)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(img, center, int(rng.integers(10, 60)), color, -1)
+    return img
+
+def test_dhash_tolerates_small_changes():
+    """Re-shot or re-encoded frames hash close, different leaves far apart"""
+    img = make_leaf(1)
+    brighter = cv2.convertScaleAbs(img, alpha=1.05, beta=8)
+    resized = cv2.resize(img, (160, 120), interpolation=cv2.INTER_AREA)
+
+    base = dhash_image(img)
+    assert hamming_distance(base, dhash_image(brighter)) <= 6
+    assert hamming_distance(base, dhash_image(resized)) <= 6
+    assert hamming_distance(base, dhash_image(make_leaf(2))) > 10
+
+def test_chunks_cover_hash():
+    """Chunks reassemble to the hash and neighbours include every 1-bit flip"""
+    value = 0x0123456789ABCDEF
+    chunks = split_hash(value)
+    assert (chunks[0] << 48) | (chunks[1] << 32) | (chunks[2] << 16) | chunks[3] == value
+    assert len(set(chunk_neighbours(chunks[0], 1))) == 17
+
+def test_find_near_duplicate_scans(tmp_path, monkeypatch):
+    """Only scans within the Hamming radius are returned, closest first"""
+    monkeypatch.setattr(db, 'get_db_path', lambda: str(tmp_path / "scans.db"))
+    db.init_db()
+
+    paths = []
+    for name, img in [('a', make_leaf(1)), ('b', make_leaf(2))]:
+        path = str(tmp_path / f"{name}.png")
+        cv2.imwrite(path, img)
+        paths.append(path)
+
+    hashes = [dhash_file(path) for path in paths]
+    scan_ids = [db.save_scan(1, 'Coconut', 'Healthy', 0.9, image_path=path) for path in paths]
+    for scan_id, phash in zip(scan_ids, hashes):
+        assert db.set_scan_phash(scan_id, phash)
+
+    # Flip a few bits spread over every chunk
+    query = hashes[0] ^ (1 << 3) ^ (1 << 20) ^ (1 << 40) ^ (1 << 63)
+    matches = db.find_near_duplicate_scans(query, max_distance=6)
+    assert [match[0] for match in matches] == [scan_ids[0]]
+    assert matches[0][2] == 4
+
+    # Same-user filter and batch inserts share the index
+    assert db.find_near_duplicate_scans(query, user_id=2) == []
+    db.save_scans_batch([{'user_id': 2, 'leaf_type': 'Coconut', 'health_status': 'Healthy',
+                          'confidence': 0.8, 'image_path': paths[0], 'phash': hashes[0]}])
+    assert len(db.find_near_duplicate_scans(query, user_id=2)) == 1
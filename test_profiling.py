@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for per-stage analysis instrumentation
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.profiling import STAGE_HISTOGRAMS, StageHistograms, set_profiling, start_timings
+
+def make_leaf(tmp_path):
+    img = np.full((480, 640, 3), (200, 190, 180), dtype=np.uint8)
+    cv2.ellipse(img, (320, 240), (250, 160), 0, 0, 360, (40, 150, 60), -1)
+    path = str(tmp_path / "leaf.png")
+    cv2.imwrite(path, img)
+    return path
+
+def test_stages_attached_and_aggregated(tmp_path):
+    """Each stage reports wall and calling-thread CPU time and feeds the global histograms"""
+    path = make_leaf(tmp_path)
+    STAGE_HISTOGRAMS.reset()
+
+    analysis = LeafAnalyzer().analyze_leaf(path)
+    timings = analysis['timings']
+    for stage in ('total', 'decode', 'leaf_roi', 'color_analysis', 'texture_analysis', 'disease_patterns'):
+        assert timings[stage]['wall_ms'] >= 0
+        assert timings[stage]['thread_cpu_ms'] >= 0
+    assert timings['total']['wall_ms'] >= timings['decode']['wall_ms']
+
+    summary = STAGE_HISTOGRAMS.summary()
+    assert summary['total']['count'] == 1
+    assert summary['texture_analysis']['p95_ms'] >= summary['texture_analysis']['mean_ms']
+
+def test_profiling_switch_and_memory(tmp_path):
+    path = make_leaf(tmp_path)
+    STAGE_HISTOGRAMS.reset()
+    try:
+        set_profiling(False)
+        assert 'timings' not in LeafAnalyzer().analyze_leaf(path)
+        assert STAGE_HISTOGRAMS.summary() == {}
+
+        set_profiling(True, trace_memory=True)
+        timings = start_timings()
+        with timings.stage('allocate'):
+            block = bytearray(4 * 1024 * 1024)
+        del block
+        assert timings.to_dict()['allocate']['peak_kb'] >= 4096
+
+        # A nested stage's peak still counts towards the enclosing one
+        timings = start_timings()
+        with timings.stage('outer'):
+            with timings.stage('inner'):
+                block = bytearray(8 * 1024 * 1024)
+                del block
+            with timings.stage('after'):
+                pass
+        stages = timings.to_dict()
+        assert stages['inner']['peak_kb'] >= 8192
+        assert stages['outer']['peak_kb'] >= 8192
+        assert stages['after']['peak_kb'] < 1024
+    finally:
+        set_profiling(True)
+
+def test_histogram_percentiles():
+    histograms = StageHistograms(bounds=(1, 10, 100, float('inf')))
+    for wall_ms in [0.5] * 90 + [50] * 10:
+        histograms.record('stage', wall_ms, wall_ms)
+    summary = histograms.summary()['stage']
+    assert summary['count'] == 100
+    assert summary['p50_ms'] == 1
+    assert summary['p95_ms'] == 100
+    assert summary['max_ms'] == 50
+
+def test_cpu_time_is_the_calling_threads():
+    """Work handed to another thread shows in wall time, not in thread_cpu_ms"""
+    import threading
+
+    def spin():
+        end = time.perf_counter() + 0.1
+        while time.perf_counter() < end:
+            pass
+
+    timings = start_timings()
+    with timings.stage('handed_off'):
+        worker = threading.Thread(target=spin)
+        worker.start()
+        worker.join()
+    stage = timings.to_dict()['handed_off']
+    assert stage['wall_ms'] >= 100
+    assert stage['thread_cpu_ms'] < 50
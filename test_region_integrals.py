@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for summed-area table region queries
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.context import FeatureContext
+from analysis.integral import MaskIntegral, RegionRatios
+
+def test_integral_matches_pixel_sums():
+    """Region and grid sums equal direct pixel counts"""
+    rng = np.random.default_rng(7)
+    mask = np.where(rng.random((97, 131)) > 0.6, 255, 0).astype(np.uint8)
+    integral = MaskIntegral(mask)
+
+    for _ in range(50):
+        fx0, fx1 = sorted(rng.random(2))
+        fy0, fy1 = sorted(rng.random(2))
+        x0, y0, x1, y1 = integral.box((fx0, fy0, fx1, fy1))
+        assert integral.sum((fx0, fy0, fx1, fy1)) == np.count_nonzero(mask[y0:y1, x0:x1])
+
+    grid = integral.grid_sums(4, 5)
+    assert grid.sum() == np.count_nonzero(mask)
+    ratios = RegionRatios(mask.shape).grid_ratios(integral, 4, 5)
+    assert abs(ratios[0, 0] - np.count_nonzero(mask[:24, :26]) / (24 * 26.0)) < 1e-12
+
+def test_named_regions_and_bands():
+    """Tip, base and the edge band are sums over their fractions of the image"""
+    mask = np.zeros((120, 90), dtype=np.uint8)
+    mask[:40] = 255        # top third
+    mask[60:, 20:30] = 255  # stripe reaching the base
+    integral = MaskIntegral(mask)
+    regions = RegionRatios(mask.shape)
+
+    assert integral.sum('tip') == 40 * 90
+    assert integral.sum('base') == 40 * 10
+    assert integral.sum('edge') == integral.sum('full') - integral.sum('centre')
+    assert regions.ratio(integral, 'tip') == 1.0
+    assert regions.ratio(integral, 'edge') == regions.edge_ratio(integral, 'centre')
+
+def test_potassium_needs_edge_yellowing():
+    """Yellow margins flag potassium, a yellow centre does not"""
+    yellow = (30, 200, 220)
+    green = (40, 150, 60)
+    analyzer = LeafAnalyzer()
+
+    margins = np.full((200, 200, 3), yellow, dtype=np.uint8)
+    margins[50:150, 50:150] = green
+    centre = np.full((200, 200, 3), green, dtype=np.uint8)
+    centre[50:150, 50:150] = yellow
+
+    assert analyzer.detect_potassium_deficiency(FeatureContext(margins)) is True
+    assert analyzer.detect_potassium_deficiency(FeatureContext(centre)) is False
+
+    # Both answers differ from the old centre-only test, and say so
+    for img in (margins, centre):
+        assert analyzer.analyze_nutrient_deficiency(FeatureContext(img))['changed'] == ['potassium']
+
+def test_potassium_edge_rule_keeps_capture_diagnoses():
+    """No capture in images/ changes its potassium answer, and saved scan analyses never held it"""
+    import cv2
+    from analysis.pyramid import AnalysisPyramid
+    from analysis.registry import COCONUT_ANALYSIS_FEATURES
+
+    analyzer = LeafAnalyzer()
+    images_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+    for name in sorted(os.listdir(images_dir)):
+        ctx = AnalysisPyramid(cv2.imread(os.path.join(images_dir, name))).context()
+        nutrients = analyzer.analyze_nutrient_deficiency(ctx)
+        assert nutrients['potassium'] == analyzer.detect_centre_potassium_deficiency(ctx), name
+        assert 'changed' not in nutrients
+
+    assert 'nutrient_deficiency' not in COCONUT_ANALYSIS_FEATURES
+
+def test_region_health_grid_respects_roi():
+    """Cells outside the leaf are empty, the rest get a health label"""
+    img = np.full((90, 90, 3), (40, 150, 60), dtype=np.uint8)
+    roi = np.zeros((90, 90), dtype=np.uint8)
+    roi[:, :60] = 255
+
+    health = LeafAnalyzer().analyze_region_health(FeatureContext(img, roi=roi), rows=3, cols=3)
+    assert health['grid'][1][2] is None
+    assert health['grid'][1][0]['color_health'] == "Healthy Coconut Green"
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact LeafResult model
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import pickle
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.results import LeafResult, NUMERIC_NAMES, numeric_matrix, pack_results, unpack_results
+from analysis.serialization import dumps_result
+from database.analysis_log import AnalysisLog
+
+def make_leaf():
+    img = np.full((240, 320, 3), (200, 190, 180), dtype=np.uint8)
+    cv2.ellipse(img, (160, 120), (125, 80), 0, 0, 360, (40, 150, 60), -1)
+    cv2.circle(img, (130, 100), 15, (30, 200, 220), -1)
+    return img
+
+def plain(result):
+    """Result with numpy values turned into their JSON types"""
+    return json.loads(dumps_result(result))
+
+def test_round_trip_dict_and_bytes():
+    """to_dict, to_bytes and pickling all reproduce the analyzer result, minus timings"""
+    analysis = LeafAnalyzer().analyze_array(make_leaf())
+    analysis['disease_class'] = np.int64(3)
+    analysis['color_analysis']['yellowing_ratio'] = np.float64(0.25)
+    analysis['region_health']['grid'][0][0] = None  # no leaf pixels in the cell
+    expected = plain({key: value for key, value in analysis.items() if key != 'timings'})
+
+    compact = LeafResult.from_dict(analysis)
+    assert isinstance(analysis['disease_class'], np.int64)  # input untouched
+    assert compact.disease_class == 3 and compact.yellowing_ratio == 0.25
+    assert compact.texture_pattern == analysis['texture_analysis']['texture_pattern']
+    assert compact.recommendations == tuple(analysis['recommendations'])
+    assert compact.region_health == expected['region_health']
+    assert set(compact.rest) == {'leaf_roi', 'analysis_resolution'}
+    assert compact.rest['leaf_roi'] == {'bbox': analysis['leaf_roi']['bbox']}
+
+    assert plain(compact.to_dict()) == expected
+    assert LeafResult.from_bytes(compact.to_bytes()).to_dict() == expected
+    assert pickle.loads(pickle.dumps(compact)) == compact
+
+def test_compact_size():
+    """Grids, texts and labels leave only a small JSON rest; batches share strings"""
+    analysis = LeafAnalyzer().analyze_array(make_leaf())
+    compact = LeafResult.from_dict(analysis)
+
+    assert len(compact.rest_json) < 200
+    assert len(compact.to_bytes()) < len(dumps_result(analysis)) / 3
+
+    # Recommendation and region label strings are stored once per batch
+    single = len(pack_results([analysis]))
+    assert len(pack_results([analysis] * 10)) - single < 9 * len(compact.to_bytes()) * 0.7
+
+    # Grids of any other shape stay in the rest untouched
+    odd = {'region_health': {'rows': 3, 'cols': 3, 'grid': []}, 'recommendations': ["ok", 3]}
+    assert LeafResult.from_dict(odd).rest == odd
+    assert unpack_results(pack_results([odd]))[0].to_dict() == odd
+
+def test_partial_results_and_matrix():
+    """Missing fields stay missing and show up as NaN in the feature matrix"""
+    retake = {'disease_class': None, 'disease_name': 'Retake Photo', 'overall_confidence': 0.0,
+              'pre_gate': {'ready': False, 'problems': ['too dark']}}
+    full = LeafAnalyzer().analyze_array(make_leaf())
+
+    results = unpack_results(pack_results([retake, full]))
+    assert results[0].to_dict() == retake
+    assert results[0].disease_class is None and results[0].sharpness is None
+
+    matrix = numeric_matrix(results)
+    assert matrix.shape == (2, len(NUMERIC_NAMES))
+    sharpness = NUMERIC_NAMES.index('sharpness')
+    assert np.isnan(matrix[0, sharpness]) and matrix[1, sharpness] == full['image_quality']['sharpness']
+
+def test_save_analysis_with_numpy_values(tmp_path):
+    """save_analysis writes results that still carry numpy scalars"""
+    analyzer = LeafAnalyzer(analysis_log=AnalysisLog(str(tmp_path / "log")))
+    analysis = {'disease_class': np.int64(2), 'disease_confidence': np.float32(0.5)}
+    record_id = analyzer.save_analysis(analysis, "leaf.png")
+    assert analyzer.analysis_log.get_record(record_id)['analysis'] == {'disease_class': 2, 'disease_confidence': 0.5}
+
+def test_compact_batch(tmp_path):
+    path = str(tmp_path / "leaf.png")
+    cv2.imwrite(path, make_leaf())
+    items = list(LeafAnalyzer().analyze_batch([path], workers=1, compact=True))
+    assert isinstance(items[0].result, LeafResult)
+    assert items[0].result.coconut_specific is True
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script for CocoScan TFLite inference
+Builds a tiny model locally (mean colour -> dense -> softmax) as a fixture
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.tflite_model import TFLiteModel, load_interpreter_class
+
+def build_tiny_model(path, weights, bias, size=32):
+    """Write a float TFLite model with a dynamic batch dimension"""
+    schema = pytest.importorskip("ai_edge_litert.schema_py_generated")
+    import flatbuffers
+
+    def buffer(array=None):
+        buf = schema.BufferT()
+        if array is not None:
+            buf.data = np.frombuffer(np.ascontiguousarray(array).tobytes(), dtype=np.uint8)
+        return buf
+
+    def tensor(name, shape, buffer_index, tensor_type=schema.TensorType.FLOAT32, signature=None):
+        t = schema.TensorT()
+        t.name, t.shape, t.buffer, t.type = name, list(shape), buffer_index, tensor_type
+        t.shapeSignature = signature
+        return t
+
+    buffers = [buffer(), buffer(), buffer(np.array([1, 2], dtype=np.int32)), buffer(), buffer(weights.astype(np.float32)),
+               buffer(bias.astype(np.float32)), buffer(), buffer()]
+    classes = weights.shape[0]
+    tensors = [
+        tensor("image", [1, size, size, 3], 1, signature=[-1, size, size, 3]),
+        tensor("axes", [2], 2, schema.TensorType.INT32),
+        tensor("mean", [1, 3], 3, signature=[-1, 3]),
+        tensor("weights", [classes, 3], 4),
+        tensor("bias", [classes], 5),
+        tensor("logits", [1, classes], 6, signature=[-1, classes]),
+        tensor("probabilities", [1, classes], 7, signature=[-1, classes]),
+    ]
+
+    codes = []
+    for builtin in (schema.BuiltinOperator.MEAN, schema.BuiltinOperator.FULLY_CONNECTED, schema.BuiltinOperator.SOFTMAX):
+        code = schema.OperatorCodeT()
+        code.builtinCode = builtin
+        code.deprecatedBuiltinCode = builtin
+        codes.append(code)
+
+    def operator(opcode, inputs, outputs, options_type, options):
+        op = schema.OperatorT()
+        op.opcodeIndex, op.inputs, op.outputs = opcode, inputs, outputs
+        op.builtinOptionsType, op.builtinOptions = options_type, options
+        return op
+
+    reducer = schema.ReducerOptionsT()
+    reducer.keepDims = False
+    softmax = schema.SoftmaxOptionsT()
+    softmax.beta = 1.0
+
+    subgraph = schema.SubGraphT()
+    subgraph.tensors = tensors
+    subgraph.inputs, subgraph.outputs = [0], [6]
+    subgraph.operators = [
+        operator(0, [0, 1], [2], schema.BuiltinOptions.ReducerOptions, reducer),
+        operator(1, [2, 3, 4], [5], schema.BuiltinOptions.FullyConnectedOptions, schema.FullyConnectedOptionsT()),
+        operator(2, [5], [6], schema.BuiltinOptions.SoftmaxOptions, softmax),
+    ]
+
+    model = schema.ModelT()
+    model.version = 3
+    model.operatorCodes = codes
+    model.subgraphs = [subgraph]
+    model.buffers = buffers
+
+    builder = flatbuffers.Builder(1024)
+    builder.Finish(model.Pack(builder), file_identifier=b"TFL3")
+    with open(path, 'wb') as f:
+        f.write(builder.Output())
+
+@pytest.fixture
+def tiny_model_path(tmp_path):
+    if load_interpreter_class() is None:
+        pytest.skip("No TFLite runtime installed")
+    # Class 0 (healthy) follows the green channel, class 1 (yellowing) the red one
+    weights = np.zeros((8, 3), dtype=np.float32)
+    weights[0] = [0, 20, 0]
+    weights[1] = [20, 0, 0]
+    path = str(tmp_path / "tiny.tflite")
+    build_tiny_model(path, weights, np.zeros(8))
+    return path
+
+def test_tflite_model_predicts_batches(tiny_model_path):
+    """One persistent interpreter serves single images and batches"""
+    model = TFLiteModel(tiny_model_path, num_threads=1)
+    assert model.input_size == (32, 32)
+
+    green = np.zeros((1, 32, 32, 3), dtype=np.float32)
+    green[..., 1] = 1.0
+    red = np.zeros((1, 32, 32, 3), dtype=np.float32)
+    red[..., 0] = 1.0
+
+    probabilities = model.predict(np.concatenate([green, red, green]))
+    assert probabilities.shape == (3, 8)
+    assert np.allclose(probabilities.sum(axis=1), 1.0, atol=1e-5)
+    assert list(np.argmax(probabilities, axis=1)) == [0, 1, 0]
+    assert np.argmax(model.predict(red)[0]) == 1
+
+def test_analyzer_uses_tflite_model(tiny_model_path, tmp_path):
+    """analyze_leaf maps real model output onto the coconut diseases"""
+    import cv2
+
+    analyzer = LeafAnalyzer(model_path=tiny_model_path, num_threads=1)
+    assert analyzer.model_loaded
+
+    # Yellow in BGR: strong red and green channels, red dominant
+    image_path = str(tmp_path / "leaf.png")
+    cv2.imwrite(image_path, np.full((64, 64, 3), [0, 120, 250], dtype=np.uint8))
+
+    results = analyzer.analyze_leaf(image_path)
+    assert results['model_used'] == 'coconut_tflite'
+    assert results['disease_name'] == "Lethal Yellowing"
+    assert isinstance(results['disease_class'], int)
+
+def test_background_warmup_primes_model(tiny_model_path):
+    """The readiness future resolves to an analyzer with a loaded model"""
+    from analysis.warmup import AnalyzerWarmup
+
+    warmup = AnalyzerWarmup({'model_path': tiny_model_path, 'num_threads': 1})
+    assert not warmup.ready
+
+    analyzer = warmup.get(timeout=30)
+    assert warmup.ready
+    assert analyzer.model_loaded
+    assert warmup.get() is analyzer
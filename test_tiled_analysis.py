@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for tiled analysis of large images
+A small synthetic mosaic is tiled finely so tile borders cut through spots
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from ai_leaf_analyzer import LeafAnalyzer
+from analysis.context import FeatureContext
+from analysis.tiled import ArrayTileSource, analyze_tiled, iter_tiles
+
+def make_mosaic():
+    mosaic = np.full((300, 420, 3), (40, 150, 60), dtype=np.uint8)
+    mosaic[:, 300:] = (30, 200, 220)  # yellowing block on the right
+    # Dark spots centred on and around the 64px tile borders
+    for center in [(64, 64), (128, 30), (200, 190), (250, 256), (280, 128)]:
+        cv2.circle(mosaic, center, 9, (15, 15, 15), -1)
+    return mosaic
+
+def test_tiled_matches_whole_image():
+    """Merged tile statistics equal the whole-image analysis"""
+    mosaic = make_mosaic()
+    analyzer = LeafAnalyzer()
+
+    tiled = analyze_tiled(analyzer, ArrayTileSource(mosaic), tile_size=64, overlap=16, workers=2)
+    whole = analyze_tiled(analyzer, ArrayTileSource(mosaic), tile_size=1024, overlap=0, workers=1)
+    colors = analyzer.analyze_coconut_colors(mosaic)
+
+    assert tiled['tiles'] == 5 * 7
+    for key in ('healthy_green_ratio', 'yellowing_ratio', 'browning_ratio', 'necrosis_ratio'):
+        assert abs(tiled['color_analysis'][key] - colors[key]) < 1e-9
+    assert tiled['color_analysis']['color_health'] == colors['color_health']
+
+    # Each spot is counted once even where a tile border cuts through it
+    assert whole['disease_patterns']['spots_detected'] == analyzer.detect_spots(FeatureContext(mosaic)) == 5
+    assert tiled['disease_patterns']['spots_detected'] == 5
+
+def test_blobs_wider_than_overlap_counted_once():
+    """Blobs spanning several tiles are joined across tile borders, not split per tile"""
+    mosaic = np.full((300, 420, 3), (40, 150, 60), dtype=np.uint8)
+    cv2.rectangle(mosaic, (20, 100), (399, 109), (15, 15, 15), -1)  # 380x10 streak
+    cv2.line(mosaic, (70, 150), (250, 290), (15, 15, 15), 3)  # diagonal crack
+    cv2.circle(mosaic, (350, 200), 3, (15, 15, 15), -1)  # below the size limit
+    analyzer = LeafAnalyzer()
+
+    expected = analyzer.detect_spots(FeatureContext(mosaic))
+    assert expected == 2
+    for tile_size, overlap in ((64, 16), (50, 0), (128, 4)):
+        tiled = analyze_tiled(analyzer, ArrayTileSource(mosaic), tile_size=tile_size, overlap=overlap, workers=2)
+        assert tiled['disease_patterns']['spots_detected'] == expected
+
+    # Two blobs meeting only at a tile corner are one 8-connected blob
+    corner = np.full((128, 128, 3), (40, 150, 60), dtype=np.uint8)
+    corner[34:64, 34:64] = (15, 15, 15)
+    corner[64:94, 64:94] = (15, 15, 15)
+    tiled = analyze_tiled(analyzer, ArrayTileSource(corner), tile_size=64, overlap=0, workers=1)
+    assert tiled['disease_patterns']['spots_detected'] == analyzer.detect_spots(FeatureContext(corner)) == 1
+
+def test_health_grid_and_npy_source(tmp_path):
+    """Memory-mapped .npy mosaics give one health cell per tile"""
+    mosaic = make_mosaic()
+    path = str(tmp_path / "mosaic.npy")
+    np.save(path, mosaic)
+
+    results = LeafAnalyzer().analyze_large_image(path, tile_size=100, overlap=8)
+    grid = results['health_grid']
+
+    assert results['image_shape'] == [300, 420]
+    assert len(grid) == 3 and len(grid[0]) == 5
+    assert grid[0][0]['color_health'] == "Healthy Coconut Green"
+    assert grid[0][4]['yellowing_ratio'] > 0.9
+
+def test_tiles_cover_image_once():
+    """Tile cores partition the image"""
+    covered = np.zeros((130, 250), dtype=np.int32)
+    for tile in iter_tiles((130, 250), tile_size=64, overlap=10):
+        y0, y1, x0, x1 = tile['core']
+        covered[y0:y1, x0:x1] += 1
+    assert (covered == 1).all()
+
+def test_tiled_and_pyramid_counts_agree():
+    """Tiles at capture resolution and a reduced pyramid level share one blob threshold"""
+    from analysis.pyramid import AnalysisPyramid
+
+    mosaic = np.full((1024, 1024, 3), (40, 150, 60), dtype=np.uint8)
+    for row in range(5):
+        for col in range(5):
+            x, y = 80 + col * 200, 60 + row * 200
+            cv2.circle(mosaic, (x, y), 7, (15, 15, 15), -1)
+            cv2.circle(mosaic, (x + 50, y), 2, (15, 15, 15), -1)
+            cv2.rectangle(mosaic, (x - 20, y + 50), (x + 20, y + 70), (30, 140, 200), -1)
+    analyzer = LeafAnalyzer()
+
+    tiled = analyze_tiled(analyzer, ArrayTileSource(mosaic), tile_size=256, overlap=16, workers=2)
+    level = AnalysisPyramid(mosaic).context(512)
+    assert level.scale == 2.0
+    assert tiled['disease_patterns']['spots_detected'] == analyzer.detect_spots(level) == 25
+    assert tiled['disease_patterns']['lesions_detected'] == analyzer.detect_lesions(level) == 25